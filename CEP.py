@@ -9,10 +9,16 @@ from evaluation.EvaluationMechanismFactory import (
     EvaluationMechanismTypes,
     EvaluationMechanismFactory,
 )
-from typing import List
+from typing import List, AsyncIterable
 from datetime import datetime
+import asyncio
 from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
 from evaluation.Storage import TreeStorageParameters
+from evaluation.AdaptiveEvaluationMechanism import AdaptiveEvaluationParameters
+from evaluation.ParallelEvaluationMechanismFactory import (
+    ParallelExecutionParameters,
+    ParallelEvaluationMechanismFactory,
+)
 
 
 class PerformanceSpecifications:
@@ -38,18 +44,33 @@ class CEP:
         eval_mechanism_params: EvaluationMechanismParameters = None,
         performance_specs: PerformanceSpecifications = None,
         storage_params: TreeStorageParameters = None,
+        parallel_execution_params: ParallelExecutionParameters = None,
+        adaptive_params: AdaptiveEvaluationParameters = None,
     ):
         """
         Constructor of the class.
+        If parallel execution parameters are specified, the evaluation is distributed between several worker processes.
+        If adaptive evaluation parameters are specified, the evaluation tree is periodically re-optimized according to
+        the statistics of the incoming events.
         """
         if patterns is None:
             raise Exception("No patterns are provided")
         if len(patterns) > 1:
             raise NotImplementedError("Multi-pattern support is not yet available")
-        self.__eval_mechanism = EvaluationMechanismFactory.build_single_pattern_eval_mechanism(
-            eval_mechanism_type, eval_mechanism_params, patterns[0], storage_params
-        )
+        if parallel_execution_params is None:
+            self.__eval_mechanism = EvaluationMechanismFactory.build_single_pattern_eval_mechanism(
+                eval_mechanism_type, eval_mechanism_params, patterns[0], storage_params, adaptive_params
+            )
+        else:
+            self.__eval_mechanism = ParallelEvaluationMechanismFactory.build_parallel_eval_mechanism(
+                parallel_execution_params,
+                lambda: EvaluationMechanismFactory.build_single_pattern_eval_mechanism(
+                    eval_mechanism_type, eval_mechanism_params, patterns[0], storage_params, adaptive_params
+                ),
+                patterns[0],
+            )
 
+        self.__is_parallel = parallel_execution_params is not None
         self.__pattern_matches = None
         self.__performance_specs = performance_specs
 
@@ -63,6 +84,27 @@ class CEP:
         self.__eval_mechanism.eval(event_stream, self.__pattern_matches)
         return (datetime.now() - start).total_seconds()
 
+    def run_async(self, events: AsyncIterable):
+        """
+        Returns an asynchronous generator applying the evaluation mechanism on an asynchronous iterable of events (e.g.,
+        a live feed) and yielding the pattern matches as soon as they are detected:
+            async for match in cep.run_async(live_events):
+                ...
+        The events are evaluated in the calling thread, and the control is returned to the event loop after each event.
+        Matches detected this way are not added to the output stream returned by get_pattern_match_stream.
+        """
+        if self.__is_parallel:
+            raise Exception("Asynchronous execution is not supported for parallel execution modes")
+        return self.__run_async(events)
+
+    async def __run_async(self, events: AsyncIterable):
+        async for event in events:
+            for match in self.__eval_mechanism.handle_event(event):
+                yield match
+            await asyncio.sleep(0)
+        for match in self.__eval_mechanism.flush_pending_matches():
+            yield match
+
     def get_pattern_match(self):
         """
         Returns one match from the output stream.
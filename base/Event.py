@@ -1,6 +1,34 @@
 from base.DataFormatter import DataFormatter
 
 
+class EventPayload(dict):
+    """
+    The attributes of an event, memoizing the values extracted from them by attribute getters. Since the same event may
+    participate in many partial matches, each getter of the pattern condition is invoked at most once per event. The
+    getters are therefore assumed to have no side effects.
+    """
+    __slots__ = ("__extracted_values",)
+
+    def __init__(self, attributes: dict):
+        super().__init__(attributes)
+        self.__extracted_values = {}
+
+    def get_attribute(self, getattr_func: callable):
+        """
+        Returns the value extracted from this payload by the given getter, invoking it only on the first request.
+        """
+        try:
+            return self.__extracted_values[getattr_func]
+        except KeyError:
+            value = getattr_func(self)
+            self.__extracted_values[getattr_func] = value
+            return value
+
+    def __reduce__(self):
+        # the memoized values are keyed by getters which typically cannot be pickled, hence they are not transferred
+        return EventPayload, (dict(self),)
+
+
 class Event:
     """
     This class represents a single primitive event received from an input stream. It may contain arbitrary attributes
@@ -8,6 +36,7 @@ class Event:
     attributes using an appropriate data formatter.
     """
     def __init__(self, raw_data: str, data_formatter: DataFormatter):
-        self.payload = data_formatter.parse_event(raw_data)
+        payload = data_formatter.parse_event(raw_data)
+        self.payload = EventPayload(payload) if type(payload) == dict else payload
         self.event_type = data_formatter.get_event_type(self.payload)
         self.timestamp = data_formatter.get_event_timestamp(self.payload)
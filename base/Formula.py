@@ -1,5 +1,7 @@
 from abc import ABC  # Abstract Base Class
 import copy
+from time import perf_counter
+from base.Event import EventPayload
 
 
 class Term(ABC):
@@ -36,6 +38,7 @@ class AtomicTerm(Term):
 class IdentifierTerm(Term):
     """
     A term of a formula representing a single variable (e.g., in "x*2 < y + 7" the atomic terms are x and y).
+    If the variable is bound to an event payload, the value extracted by the getter is memoized by the payload.
     """
     def __init__(self, name: str, getattr_func: callable):
         self.name = name
@@ -46,7 +49,10 @@ class IdentifierTerm(Term):
     def eval(self, binding: dict = None):
         if not type(binding) == dict or self.name not in binding:
             raise NameError("Name %s is not bound to a value" % self.name)
-        return self.getattr_func(binding[self.name])
+        value = binding[self.name]
+        if type(value) == EventPayload:
+            return value.get_attribute(self.getattr_func)
+        return self.getattr_func(value)
 
     def get_term_of(self, names: set):
         if self.name in names:
@@ -153,6 +159,17 @@ class Formula(ABC):
     def get_formula_of(self, names: set):
         pass
 
+    def get_residual_formula_of(self, names: set, evaluated_names: list):
+        """
+        Returns the part of the formula referring only to the given names, excluding the parts referring only to one of
+        the given subsets of these names (e.g., as they were already evaluated on these subsets), or None if nothing is
+        left.
+        """
+        formula = self.get_formula_of(names)
+        if formula is None or any(self.get_formula_of(subset) is not None for subset in evaluated_names):
+            return None
+        return formula
+
     def simplify_formula(self, lhs_vars: set, rhs_vars: set, priorities: dict = {}):
         """
         Returns a simplified formula where the lhs term consist only of lhs_vars, 
@@ -450,9 +467,106 @@ class BinaryLogicOpFormula(Formula):  # AND: A < B AND C < D
             self.formula_to_sort_by.right_term,
         )
 
+class _Conjunct:
+    """
+    A conjunct of a conjunction formula along with the statistics observed on its evaluations.
+    """
+    def __init__(self, formula: Formula):
+        self.formula = formula
+        self.evals_num = 0
+        self.failures_num = 0
+        self.timed_evals_num = 0
+        self.total_time = 0.0
+
+    def get_rank(self):
+        """
+        Returns the expected evaluation time per failure of this conjunct. The conjuncts of the lowest ranks are the
+        cheapest to filter out a binding with, hence they are to be evaluated first.
+        """
+        if self.evals_num == 0 or self.timed_evals_num == 0:
+            # no statistics yet - evaluated first in order to be measured
+            return 0.0
+        if self.failures_num == 0:
+            return float("inf")
+        cost = self.total_time / self.timed_evals_num
+        return cost * self.evals_num / self.failures_num
+
+    def age(self):
+        """
+        Halves the weight of the statistics observed so far, such that the order adapts to changes in the data.
+        """
+        self.evals_num //= 2
+        self.failures_num //= 2
+        self.timed_evals_num //= 2
+        self.total_time /= 2
+
+
 class AndFormula(BinaryLogicOpFormula):  # AND: A < B AND C < D
+    """
+    A conjunction of two formulas. Upon the first evaluation, nested conjunctions are flattened into a list of
+    conjuncts, which are evaluated with short-circuiting. The conjuncts are periodically reordered by their observed
+    selectivity and evaluation time, such that the ones most likely to fail at the lowest cost are evaluated first.
+    """
+    # the conjuncts are reordered once in this number of evaluations
+    REORDER_INTERVAL = 1024
+    # the evaluation time of the conjuncts is measured once in this number of evaluations
+    TIMING_INTERVAL = 16
+
     def __init__(self, left_formula: Formula, right_formula: Formula):
         super().__init__(left_formula, right_formula, lambda x, y: x and y)
+        self.__conjuncts = None
+        self.__evals_num = 0
+
+    def eval(self, binding: dict = None):
+        if self.__conjuncts is None:
+            self.__conjuncts = [_Conjunct(formula) for formula in self.__get_conjuncts()]
+        self.__evals_num += 1
+        if self.__evals_num % AndFormula.TIMING_INTERVAL == 0:
+            if self.__evals_num % AndFormula.REORDER_INTERVAL == 0:
+                self.__reorder_conjuncts()
+            return self.__eval_timed(binding)
+        for conjunct in self.__conjuncts:
+            conjunct.evals_num += 1
+            if not conjunct.formula.eval(binding):
+                conjunct.failures_num += 1
+                return False
+        return True
+
+    def get_conjuncts(self):
+        """
+        Returns the formulas of this conjunction, in their current order of evaluation.
+        """
+        if self.__conjuncts is None:
+            return list(self.__get_conjuncts())
+        return [conjunct.formula for conjunct in self.__conjuncts]
+
+    def __eval_timed(self, binding: dict):
+        for conjunct in self.__conjuncts:
+            start = perf_counter()
+            result = conjunct.formula.eval(binding)
+            conjunct.total_time += perf_counter() - start
+            conjunct.timed_evals_num += 1
+            conjunct.evals_num += 1
+            if not result:
+                conjunct.failures_num += 1
+                return False
+        return True
+
+    def __reorder_conjuncts(self):
+        self.__conjuncts.sort(key=lambda conjunct: conjunct.get_rank())
+        for conjunct in self.__conjuncts:
+            conjunct.age()
+
+    def __get_conjuncts(self):
+        """
+        A generator for the formulas of this conjunction, excluding the nested conjunctions, which are replaced by
+        their own formulas.
+        """
+        for formula in (self.left_formula, self.right_formula):
+            if isinstance(formula, AndFormula):
+                yield from formula.__get_conjuncts()
+            else:
+                yield formula
 
     def get_formula_of(self, names: set):
         right_formula = self.right_formula.get_formula_of(names)
@@ -465,6 +579,17 @@ class AndFormula(BinaryLogicOpFormula):  # AND: A < B AND C < D
             return right_formula
         return None
 
+    def get_residual_formula_of(self, names: set, evaluated_names: list):
+        right_formula = self.right_formula.get_residual_formula_of(names, evaluated_names)
+        left_formula = self.left_formula.get_residual_formula_of(names, evaluated_names)
+        if left_formula is not None and right_formula is not None:
+            return AndFormula(left_formula, right_formula)
+        if left_formula:
+            return left_formula
+        if right_formula:
+            return right_formula
+        return None
+
     def __repr__(self):
         return "{} AND {}".format(self.left_formula, self.right_formula)
 
@@ -1,7 +1,9 @@
 from base.Formula import Formula
-from base.PatternStructure import PatternStructure
+from base.PatternStructure import PatternStructure, SeqOperator, AndOperator, OrOperator, KleeneClosureOperator, \
+    NegationOperator, QItem
 from datetime import timedelta
 from misc.StatisticsTypes import StatisticsTypes
+from misc.ConsumptionPolicy import ConsumptionPolicy
 
 
 class Pattern:
@@ -9,15 +11,18 @@ class Pattern:
     A pattern has several fields:
     - a structure represented by a tree of operators over the primitive events (e.g., SEQ(A,B*, AND(C, NOT(D), E)));
     - a condition to be satisfied by the primitive events (might consist of multiple nested conditions);
-    - a time window for the pattern matches to occur within.
+    - a time window for the pattern matches to occur within;
+    - optionally, a consumption policy restricting the combinations of events reported as matches (see
+      ConsumptionPolicy). By default, all of them are reported.
     A pattern can also carry statistics with it, in order to enable advanced
     tree construction mechanisms - this is hopefully a temporary hack.
     """
     def __init__(self, pattern_structure: PatternStructure, pattern_matching_condition: Formula = None,
-                 time_window: timedelta = timedelta.max):
+                 time_window: timedelta = timedelta.max, consumption_policy: ConsumptionPolicy = None):
         self.structure = pattern_structure
         self.condition = pattern_matching_condition
         self.window = time_window
+        self.consumption_policy = consumption_policy
         self.statistics_type = StatisticsTypes.NO_STATISTICS
         self.statistics = None
 
@@ -25,6 +30,98 @@ class Pattern:
         self.statistics_type = statistics_type
         self.statistics = statistics
 
+    def get_disjunct_patterns(self):
+        """
+        Returns a pattern for each argument of a disjunction pattern, sharing the condition and the time window of this
+        pattern. A single event is represented as a conjunction of itself.
+        The statistics of a disjunction pattern refer to the distinct events of all its arguments (see
+        get_primitive_items), and each disjunct pattern is given their projection on its own events.
+        """
+        disjuncts = [Pattern(structure, self.condition, self.window, self.consumption_policy)
+                     for structure in self.__get_disjunct_structures()]
+        if self.statistics_type != StatisticsTypes.NO_STATISTICS:
+            indices = {(item.event_type, item.name): i for i, item in enumerate(self.get_primitive_items())}
+            for disjunct in disjuncts:
+                disjunct.set_statistics(self.statistics_type, self.__project_statistics(
+                    [indices[(item.event_type, item.name)] for item in disjunct.get_primitive_items()]))
+        return disjuncts
+
+    def get_primitive_items(self):
+        """
+        Returns the primitive event evaluated by each argument of this pattern, in the order of the arguments: the
+        argument itself, the event it negates or the event its Kleene closure is applied to. The statistics of a
+        pattern (e.g., its selectivity matrix and arrival rates) refer to these events.
+        For a disjunction pattern, the distinct events of all its arguments are returned in the order of their first
+        appearance, as the events of the same type and name are shared by the arguments.
+        """
+        if self.structure.get_top_operator() == OrOperator:
+            items = {}
+            for structure in self.__get_disjunct_structures():
+                for arg in structure.args:
+                    item = Pattern.__get_primitive_item(arg)
+                    items.setdefault((item.event_type, item.name), item)
+            return list(items.values())
+        return [Pattern.__get_primitive_item(arg) for arg in self.structure.args]
+
+    def get_primitive_condition_of(self, names: set):
+        """
+        Returns the part of the condition of this pattern referring only to the given primitive events (see
+        get_primitive_items), or None if there is no such condition. A condition on a Kleene closure refers to a run of
+        events rather than to a single event, hence it is ignored.
+        """
+        if self.condition is None:
+            return None
+        structures = self.__get_disjunct_structures() if self.structure.get_top_operator() == OrOperator \
+            else [self.structure]
+        closure_names = {arg.arg.name for structure in structures for arg in structure.args
+                         if isinstance(arg, KleeneClosureOperator)}
+        if not closure_names.isdisjoint(names):
+            return None
+        return self.condition.get_formula_of(names)
+
+    def __get_disjunct_structures(self):
+        return [arg if isinstance(arg, (SeqOperator, AndOperator)) else AndOperator([arg])
+                for arg in self.structure.args]
+
+    def __project_statistics(self, indices: list):
+        """
+        Returns the statistics of this pattern restricted to the primitive events at the given indices.
+        """
+        if self.statistics_type == StatisticsTypes.ARRIVAL_RATES:
+            return [self.statistics[i] for i in indices]
+        if self.statistics_type == StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
+            selectivity_matrix, arrival_rates = self.statistics
+            return [[selectivity_matrix[i][j] for j in indices] for i in indices], [arrival_rates[i] for i in indices]
+        # the frequencies are given per event type
+        return self.statistics
+
+    @staticmethod
+    def __get_primitive_item(arg: PatternStructure):
+        if isinstance(arg, (NegationOperator, KleeneClosureOperator)):
+            arg = arg.arg
+        if isinstance(arg, (SeqOperator, AndOperator)):
+            # a nested operator is evaluated as a single argument, which per-event statistics cannot describe
+            raise NotImplementedError("Statistics are not supported for patterns containing nested operators")
+        if not isinstance(arg, QItem):
+            raise NotImplementedError("Statistics are not supported for the pattern argument %s" % (arg,))
+        return arg
+
+    def has_negation(self):
+        """
+        Returns True if the structure of this pattern contains a negated event.
+        """
+        return Pattern.__has_negation(self.structure)
+
+    @staticmethod
+    def __has_negation(structure: PatternStructure):
+        if isinstance(structure, NegationOperator):
+            return True
+        if isinstance(structure, (SeqOperator, AndOperator, OrOperator)):
+            return any(Pattern.__has_negation(arg) for arg in structure.args)
+        if isinstance(structure, KleeneClosureOperator):
+            return Pattern.__has_negation(structure.arg)
+        return False
+
     def __repr__(self):
         return "Pattern is {} with condition {} and time window is {}".format(
             self.structure, self.condition, self.window
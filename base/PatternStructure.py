@@ -49,10 +49,28 @@ class SeqOperator(PatternStructure):
 
 
 class KleeneClosureOperator(PatternStructure):
-    def __init__(self, arg: PatternStructure):
+    """
+    Matches any nonempty set of occurrences of its argument within the time window, whose size is between min_size and
+    max_size (unbounded if max_size is None). The name of the argument is bound to the list of the matched payloads.
+    """
+    def __init__(self, arg: PatternStructure, min_size: int = 1, max_size: int = None):
+        if min_size < 1 or (max_size is not None and max_size < min_size):
+            raise Exception("Invalid Kleene closure size bounds")
         self.arg = arg
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def __repr__(self):
+        return "KC({}, {}, {})".format(self.arg, self.min_size, self.max_size)
 
 
 class NegationOperator(PatternStructure):
+    """
+    Matches the absence of its argument: in a sequence, between the events preceding and following it, and in a
+    conjunction, during the match.
+    """
     def __init__(self, arg: PatternStructure):
         self.arg = arg
+
+    def __repr__(self):
+        return "NOT({})".format(self.arg)
@@ -0,0 +1,205 @@
+"""
+This file contains the implementation of an evaluation mechanism periodically adapting its evaluation tree to the
+statistics of the incoming events.
+"""
+from copy import copy
+from datetime import timedelta
+
+from base.Event import Event
+from base.Pattern import Pattern
+from base.PatternStructure import OrOperator
+from evaluation.EvaluationMechanism import EvaluationMechanism
+from evaluation.EvaluationMechanismBuilder import EvaluationMechanismBuilder
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.IOUtils import Stream
+from misc.Statistics import calculate_bushy_tree_cost_function
+from misc.StatisticsCollector import StatisticsCollector
+from misc.StatisticsTypes import StatisticsTypes
+
+
+class AdaptiveEvaluationParameters:
+    """
+    Parameters for adaptive evaluation include the frequency of re-optimization attempts (in terms of event time),
+    the minimal relative cost reduction justifying the replacement of the evaluation tree, and the parameters of
+    the statistics collection (see StatisticsCollector).
+    """
+    def __init__(self, reoptimization_interval: timedelta, statistics_window: timedelta, gain_threshold: float = 0.1,
+                 max_samples_per_type: int = 100, decay_factor: float = 0.5):
+        self.reoptimization_interval = reoptimization_interval
+        self.statistics_window = statistics_window
+        self.gain_threshold = gain_threshold
+        self.max_samples_per_type = max_samples_per_type
+        self.decay_factor = decay_factor
+
+
+class AdaptiveTreeBasedEvaluationMechanism(EvaluationMechanism):
+    """
+    A tree-based evaluation mechanism collecting statistics on the incoming events and periodically recomputing the
+    evaluation tree using the given tree builder. The new tree replaces the current one if its expected cost is lower by
+    at least the given gain threshold.
+    To preserve the correctness for partial matches in flight, the replaced tree keeps processing the incoming events
+    until its time window drains, reporting only the matches starting before the replacement took place, while the new
+    tree reports all the matches starting afterwards.
+    If the pattern contains negated events, a match may be blocked by an event occurring up to a time window before its
+    earliest event, which the new tree has not received, or up to two time windows after it. In this case, the replaced
+    tree also reports the matches starting during the first time window after the replacement, and keeps processing
+    the events for two more time windows, after which the matches it still holds are released.
+    The collected statistics are applied to a private copy of the given pattern, which is left unchanged.
+    The events are assumed to arrive in the ascending order of their timestamps.
+    """
+    def __init__(self, pattern: Pattern, tree_builder: EvaluationMechanismBuilder,
+                 storage_params: TreeStorageParameters, adaptive_params: AdaptiveEvaluationParameters):
+        if pattern.window == timedelta.max:
+            raise Exception("Adaptive evaluation requires a bounded time window")
+        if pattern.consumption_policy is not None and pattern.consumption_policy.is_restrictive():
+            # the replaced tree and the new one would apply the policy independently of each other
+            raise Exception("Consumption policies are not supported by adaptive evaluation")
+        # the statistics collected during the evaluation are set on this copy rather than on the given pattern
+        pattern = copy(pattern)
+        self.__pattern = pattern
+        self.__tree_builder = tree_builder
+        self.__storage_params = storage_params
+        self.__reoptimization_interval = adaptive_params.reoptimization_interval
+        self.__gain_threshold = adaptive_params.gain_threshold
+        self.__statistics_collector = StatisticsCollector(pattern, adaptive_params.statistics_window,
+                                                          adaptive_params.max_samples_per_type,
+                                                          adaptive_params.decay_factor)
+        if pattern.statistics_type == StatisticsTypes.NO_STATISTICS:
+            # no statistics are available yet, start with the tree following the pattern-specified order
+            self.__tree_structure = self.__create_tree_structure(TrivialLeftDeepTreeBuilder())
+        else:
+            self.__tree_structure = self.__create_tree_structure(tree_builder)
+        self.__eval_mechanism = TreeBasedEvaluationMechanism(pattern, self.__tree_structure, storage_params)
+        self.__draining_eval_mechanism = None
+        self.__replacement_timestamp = None
+        # the matches starting before the ownership timestamp are reported by the draining tree
+        self.__ownership_delay = pattern.window if pattern.has_negation() else timedelta(0)
+        self.__ownership_timestamp = None
+        self.__draining_period = self.__ownership_delay + (2 * pattern.window if pattern.has_negation()
+                                                           else pattern.window)
+        self.__pending_tree_structure = None
+        self.__next_reoptimization_timestamp = None
+        self.__last_timestamp = None
+        self.__replacements_count = 0
+
+    def get_replacements_count(self):
+        """
+        Returns the number of times the evaluation tree was replaced so far.
+        """
+        return self.__replacements_count
+
+    def eval(self, events: Stream, matches: Stream):
+        for event in events:
+            for match in self.handle_event(event):
+                matches.add_item(match)
+        for match in self.flush_pending_matches():
+            matches.add_item(match)
+        matches.close()
+
+    def handle_event(self, event: Event):
+        self.__statistics_collector.handle_event(event)
+        self.__try_reoptimize(event)
+
+        new_matches = []
+        if self.__draining_eval_mechanism is not None:
+            if event.timestamp - self.__replacement_timestamp >= self.__draining_period:
+                # no match reported by the replaced tree can contain this event or any later one, or be blocked by
+                # them - hence, the matches it holds can be released
+                new_matches.extend(self.__get_owned_matches(self.__draining_eval_mechanism.flush_pending_matches(),
+                                                            True))
+                self.__draining_eval_mechanism = None
+            else:
+                new_matches.extend(self.__get_owned_matches(self.__draining_eval_mechanism.handle_event(event), True))
+        new_matches.extend(self.__get_owned_matches(self.__eval_mechanism.handle_event(event), False))
+        self.__last_timestamp = event.timestamp
+        return new_matches
+
+    def flush_pending_matches(self):
+        new_matches = []
+        if self.__draining_eval_mechanism is not None:
+            new_matches = self.__get_owned_matches(self.__draining_eval_mechanism.flush_pending_matches(), True)
+        new_matches.extend(self.__get_owned_matches(self.__eval_mechanism.flush_pending_matches(), False))
+        return new_matches
+
+    def __get_owned_matches(self, matches: list, by_replaced_tree: bool):
+        """
+        Returns the given matches reported either by the replaced tree or by the current one, according to the
+        timestamps of their earliest events.
+        """
+        if self.__ownership_timestamp is None:
+            return matches
+        return [match for match in matches
+                if (min(e.timestamp for e in match.events) < self.__ownership_timestamp) == by_replaced_tree]
+
+    def __try_reoptimize(self, event: Event):
+        """
+        Recomputes the evaluation tree once in a re-optimization interval and replaces the current tree if the new one
+        is sufficiently cheaper. The replacement only takes place at an event whose timestamp is strictly greater than
+        the one of the previous event, such that the events preceding the replacement are exactly those with earlier
+        timestamps. Only a single replaced tree may be draining at any time.
+        """
+        if self.__next_reoptimization_timestamp is None:
+            self.__next_reoptimization_timestamp = event.timestamp + self.__reoptimization_interval
+            return
+        if self.__pending_tree_structure is None:
+            if event.timestamp < self.__next_reoptimization_timestamp or self.__draining_eval_mechanism is not None:
+                return
+            self.__next_reoptimization_timestamp = event.timestamp + self.__reoptimization_interval
+            self.__pending_tree_structure = self.__find_better_tree_structure()
+            if self.__pending_tree_structure is None:
+                return
+        if event.timestamp <= self.__last_timestamp:
+            return
+        self.__draining_eval_mechanism = self.__eval_mechanism
+        self.__replacement_timestamp = event.timestamp
+        self.__ownership_timestamp = event.timestamp + self.__ownership_delay
+        self.__tree_structure = self.__pending_tree_structure
+        self.__pending_tree_structure = None
+        self.__eval_mechanism = TreeBasedEvaluationMechanism(self.__pattern, self.__tree_structure,
+                                                             self.__storage_params)
+        self.__replacements_count += 1
+
+    def __find_better_tree_structure(self):
+        """
+        Creates a new tree structure according to the current statistics. Returns it if its expected cost is lower than
+        the one of the current tree by at least the gain threshold, and None otherwise.
+        """
+        self.__statistics_collector.apply_statistics(self.__pattern)
+        new_tree_structure = self.__create_tree_structure(self.__tree_builder)
+        if new_tree_structure == self.__tree_structure:
+            return None
+        current_cost = self.__get_cost(self.__tree_structure)
+        new_cost = self.__get_cost(new_tree_structure)
+        if current_cost == 0 or (current_cost - new_cost) / current_cost < self.__gain_threshold:
+            return None
+        return new_tree_structure
+
+    def __get_cost(self, tree_structure):
+        """
+        Returns the expected cost of the given tree structure according to the current statistics. The tree of a
+        disjunction pattern consists of a separate tree for each argument, whose cost is calculated using the
+        statistics of its own events, and the total cost is the sum of these costs.
+        """
+        window = self.__pattern.window.total_seconds()
+        if self.__pattern.structure.get_top_operator() != OrOperator:
+            selectivity_matrix, arrival_rates = self.__pattern.statistics
+            return calculate_bushy_tree_cost_function(tree_structure, selectivity_matrix, arrival_rates, window)
+        cost = 0
+        for disjunct, disjunct_tree_structure in zip(self.__pattern.get_disjunct_patterns(), tree_structure):
+            selectivity_matrix, arrival_rates = disjunct.statistics
+            cost += calculate_bushy_tree_cost_function(disjunct_tree_structure, selectivity_matrix, arrival_rates,
+                                                       window)
+        return cost
+
+    def __create_tree_structure(self, tree_builder: EvaluationMechanismBuilder):
+        """
+        Creates a tree structure for the pattern using the given builder. The statistics of a disjunction pattern refer
+        to the distinct events of all its arguments, hence they are projected on the events of each argument, whose
+        tree structure is created separately.
+        """
+        if self.__pattern.structure.get_top_operator() != OrOperator:
+            return tree_builder.create_tree_structure(self.__pattern)
+        return tuple(tree_builder.create_tree_structure(disjunct)
+                     for disjunct in self.__pattern.get_disjunct_patterns())
@@ -6,11 +6,12 @@ from typing import List
 from evaluation.EvaluationMechanismBuilder import EvaluationMechanismBuilder
 from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
 from base.Pattern import Pattern
-from misc.Utils import get_all_disjoint_sets
+from base.PatternStructure import OrOperator
+from evaluation.CostModel import ExtendedCostModelParameters, ExtendedCostModel
+from evaluation.Storage import TreeStorageParameters
 from misc.Statistics import calculate_bushy_tree_cost_function, MissingStatisticsException
 from misc.StatisticsTypes import StatisticsTypes
 from evaluation.LeftDeepTreeBuilders import GreedyLeftDeepTreeBuilder
-from itertools import combinations
 
 
 class BushyTreeBuilder(EvaluationMechanismBuilder):
@@ -18,12 +19,21 @@ class BushyTreeBuilder(EvaluationMechanismBuilder):
     An abstract class for left-deep tree builders.
     """
     def build_single_pattern_eval_mechanism(self, pattern: Pattern, storage_params):
+        tree_structure = self.create_tree_structure(pattern)
+        return TreeBasedEvaluationMechanism(pattern, tree_structure, storage_params)
+
+    def create_tree_structure(self, pattern: Pattern):
+        """
+        Returns the structure of the bushy evaluation tree created by this builder for the given pattern.
+        The structure of a disjunction pattern consists of the structures of its arguments.
+        """
+        if pattern.structure.get_top_operator() == OrOperator:
+            return tuple(self.create_tree_structure(disjunct) for disjunct in pattern.get_disjunct_patterns())
         if pattern.statistics_type == StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
             (selectivityMatrix, arrivalRates) = pattern.statistics
         else:
             raise MissingStatisticsException()
-        tree_structure = self._find_tree(selectivityMatrix, arrivalRates, pattern.window.total_seconds())
-        return TreeBasedEvaluationMechanism(pattern, tree_structure, storage_params)
+        return self._find_tree(selectivityMatrix, arrivalRates, pattern.window.total_seconds())
 
     def build_multi_pattern_eval_mechanism(self, patterns: List[Pattern]):
         raise Exception("Unsupported")
@@ -35,45 +45,133 @@ class BushyTreeBuilder(EvaluationMechanismBuilder):
 
 class DynamicProgrammingBushyTreeBuilder(BushyTreeBuilder):
     """
-    Creates a left-deep tree using a dynamic programming algorithm.
+    Creates a bushy tree using a dynamic programming algorithm.
+    If extended cost model parameters are given, the tree minimizing the extended cost model (see evaluation.CostModel)
+    for the given storage parameters is created instead of the one minimizing the number of partial matches.
     """
+    def __init__(self, cost_model_params: ExtendedCostModelParameters = None,
+                 storage_params: TreeStorageParameters = None):
+        self.__cost_model_params = cost_model_params
+        self.__storage_params = storage_params
+
+    def create_tree_structure(self, pattern: Pattern):
+        if self.__cost_model_params is None or pattern.structure.get_top_operator() == OrOperator:
+            # the trees of the disjuncts of a disjunction pattern are created by the calls made for each of them
+            return super().create_tree_structure(pattern)
+        cost_model = ExtendedCostModel(pattern, self.__storage_params, self.__cost_model_params)
+        (selectivityMatrix, arrivalRates) = pattern.statistics
+        return DynamicProgrammingBushyTreeBuilder.find_tree_by_cost_model(cost_model, selectivityMatrix, arrivalRates,
+                                                                         pattern.window.total_seconds())
+
     @staticmethod
     def _find_tree(selectivity_matrix: List[List[float]], arrival_rates: List[int], window: int):
+        """
+        The cost of a tree is the sum of the partial match numbers of its nodes, and the partial match number of a node
+        only depends on the set of leaves below it. Hence, the cheapest tree over a subset of the leaves is obtained by
+        joining the cheapest trees over the two parts of its best split.
+        The subsets are represented as bitmasks, and for each subset its partial match number, its optimal cost and its
+        best split are stored, such that each split is evaluated in O(1). Each split is only considered once, as the
+        part containing the lowest item of the subset.
+        """
         args_num = len(selectivity_matrix)
         if args_num == 1:
-            return [0]
+            return 0
+
+        subsets_num = 1 << args_num
+        pm_sizes = [1.0] * subsets_num
+        costs = [0.0] * subsets_num
+        best_splits = [0] * subsets_num
+        for subset in range(1, subsets_num):
+            lowest_bit = subset & -subset
+            lowest_item = lowest_bit.bit_length() - 1
+            rest = subset ^ lowest_bit
+            pm_size = pm_sizes[rest] * selectivity_matrix[lowest_item][lowest_item] * \
+                arrival_rates[lowest_item] * window
+            remaining = rest
+            while remaining:
+                bit = remaining & -remaining
+                pm_size *= selectivity_matrix[lowest_item][bit.bit_length() - 1]
+                remaining ^= bit
+            pm_sizes[subset] = pm_size
+            if rest == 0:
+                # a leaf
+                costs[subset] = pm_size
+                continue
+            # iterate over the proper subsets of rest, each defining a split whose first part contains the lowest item
+            best_cost, best_split = costs[lowest_bit] + costs[rest], lowest_bit
+            part = (rest - 1) & rest
+            while part:
+                first_part = part | lowest_bit
+                first_cost = costs[first_part]
+                # costs are positive, so a first part at least as expensive as the best split cannot improve it
+                if first_cost < best_cost:
+                    split_cost = first_cost + costs[subset ^ first_part]
+                    if split_cost < best_cost:
+                        best_cost, best_split = split_cost, first_part
+                part = (part - 1) & rest
+            costs[subset] = best_cost + pm_size
+            best_splits[subset] = best_split
+        return DynamicProgrammingBushyTreeBuilder.__build_tree(subsets_num - 1, best_splits)
 
-        items = frozenset(range(args_num))
-        # Save subsets' optimal topologies, the cost and the left to add items.
-        sub_trees = {frozenset({i}): (i,
-                                      calculate_bushy_tree_cost_function(i, selectivity_matrix, arrival_rates, window),
-                                      items.difference({i}))
-                     for i in items}
+    @staticmethod
+    def find_tree_by_cost_model(cost_model: ExtendedCostModel, selectivity_matrix: List[List[float]],
+                                arrival_rates: List[int], window: int):
+        """
+        The same as _find_tree, except that the cost of a node depends on its split, and is therefore calculated for
+        each split separately.
+        """
+        args_num = len(selectivity_matrix)
+        if args_num == 1:
+            return 0
+
+        subsets_num = 1 << args_num
+        pm_sizes = [1.0] * subsets_num
+        costs = [0.0] * subsets_num
+        best_splits = [0] * subsets_num
+        for subset in range(1, subsets_num):
+            lowest_bit = subset & -subset
+            lowest_item = lowest_bit.bit_length() - 1
+            rest = subset ^ lowest_bit
+            pm_size = pm_sizes[rest] * selectivity_matrix[lowest_item][lowest_item] * \
+                arrival_rates[lowest_item] * window
+            remaining = rest
+            while remaining:
+                bit = remaining & -remaining
+                pm_size *= selectivity_matrix[lowest_item][bit.bit_length() - 1]
+                remaining ^= bit
+            pm_sizes[subset] = pm_size
+            if rest == 0:
+                costs[subset] = cost_model.get_leaf_cost(lowest_item)
+                continue
+            best_cost, best_split = None, None
+            part = rest
+            while True:
+                part = (part - 1) & rest
+                first_part = part | lowest_bit
+                first_cost = costs[first_part]
+                # costs are non-negative, so a first part at least as expensive as the best split cannot improve it
+                if best_cost is None or first_cost < best_cost:
+                    second_part = subset ^ first_part
+                    split_cost = first_cost + costs[second_part] + cost_model.get_join_cost(
+                        first_part, second_part, pm_sizes[first_part], pm_sizes[second_part], pm_size)
+                    if best_cost is None or split_cost < best_cost:
+                        best_cost, best_split = split_cost, first_part
+                if part == 0:
+                    break
+            costs[subset] = best_cost
+            best_splits[subset] = best_split
+        return DynamicProgrammingBushyTreeBuilder.__build_tree(subsets_num - 1, best_splits)
 
-        # for each subset of size i, find optimal topology for these subsets according to size (i-1) subsets.
-        for i in range(2, args_num + 1):
-            for tSubset in combinations(items, i):
-                subset = frozenset(tSubset)
-                disjoint_sets_iter = get_all_disjoint_sets(subset)  # iterator for all disjoint splits of a set.
-                # use first option as speculative best.
-                set1_, set2_ = next(disjoint_sets_iter)
-                tree1_, _, _ = sub_trees[set1_]
-                tree2_, _, _ = sub_trees[set2_]
-                new_tree_ = (tree1_, tree2_)
-                new_cost_ = calculate_bushy_tree_cost_function(new_tree_, selectivity_matrix, arrival_rates, window)
-                new_left_ = items.difference({subset})
-                sub_trees[subset] = new_tree_, new_cost_, new_left_
-                # find the best topology based on previous topologies for smaller subsets.
-                for set1, set2 in disjoint_sets_iter:
-                    tree1, _, _ = sub_trees[set1]
-                    tree2, _, _ = sub_trees[set2]
-                    new_tree = (tree1, tree2)
-                    new_cost = calculate_bushy_tree_cost_function(new_tree, selectivity_matrix, arrival_rates, window)
-                    _, cost, left = sub_trees[subset]
-                    # if new subset's topology is better, then update to it.
-                    if new_cost < cost:
-                        sub_trees[subset] = new_tree, new_cost, left
-        return sub_trees[items][0]  # return the best topology (index 0 at tuple) for items - the set of all arguments.
+    @staticmethod
+    def __build_tree(subset: int, best_splits: List[int]):
+        """
+        Builds the optimal tree structure over the given subset according to the stored best splits.
+        """
+        if subset & (subset - 1) == 0:
+            return subset.bit_length() - 1
+        first_part = best_splits[subset]
+        return (DynamicProgrammingBushyTreeBuilder.__build_tree(first_part, best_splits),
+                DynamicProgrammingBushyTreeBuilder.__build_tree(subset ^ first_part, best_splits))
 
 
 class ZStreamTreeBuilder(BushyTreeBuilder):
@@ -0,0 +1,179 @@
+"""
+This file contains an extended cost model of evaluation trees. Unlike the cost functions of misc.Statistics, which
+only count the expected partial matches, it estimates the work performed by the tree nodes, taking into account the
+type of their storage and the cost of evaluating their conditions.
+"""
+from math import log2
+from typing import List
+
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator
+from evaluation.Storage import TreeStorageParameters
+from misc.Statistics import get_predicate_costs, MissingStatisticsException
+from misc.StatisticsTypes import StatisticsTypes
+
+# the fraction of the stored partial matches retrieved by a sequence node from a storage sorted by timestamps
+SEQUENCE_ORDER_SELECTIVITY = 0.5
+
+
+class ExtendedCostModelParameters:
+    """
+    Parameters of the extended cost model include the predicate cost matrix (see misc.Statistics.get_predicate_costs
+    and misc.Statistics.calculate_predicate_costs), the cost of creating a partial match and the cost of accessing a
+    stored one. If no predicate costs are given, each atomic condition costs 1.
+    """
+    def __init__(self, predicate_costs: List[List[float]] = None, partial_match_cost: float = 1.0,
+                 storage_access_cost: float = 1.0):
+        self.predicate_costs = predicate_costs
+        self.partial_match_cost = partial_match_cost
+        self.storage_access_cost = storage_access_cost
+
+    def __repr__(self):
+        return "ExtendedCostModelParameters(%s, %s, %s)" % (self.predicate_costs, self.partial_match_cost,
+                                                            self.storage_access_cost)
+
+
+class ExtendedCostModel:
+    """
+    Estimates the work performed by an evaluation tree of a pattern during a time window as the sum of the costs of its
+    nodes:
+    - a leaf evaluates its condition on each arriving event and creates a partial match for each event satisfying it.
+    - an internal node retrieves from the storage of each of its subtrees the candidates for pairing with each new
+      partial match of the other subtree, evaluates its condition on each candidate pair and creates a partial match
+      for each pair satisfying it.
+    The condition of an internal node consists of all the conditions referring to its events only, and is evaluated
+    as a whole. If the storage is not sorted, all the stored partial matches are candidates. A sorted storage is
+    accessed using a binary search, followed by a scan of the candidates satisfying the sorting condition, which is
+    assumed to be the most selective sortable condition between the subtrees (or the order of a sequence).
+    The subsets of events are represented as bitmasks.
+    """
+    def __init__(self, pattern: Pattern, storage_params: TreeStorageParameters = None,
+                 cost_model_params: ExtendedCostModelParameters = None):
+        if pattern.statistics_type != StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
+            raise MissingStatisticsException()
+        if cost_model_params is None:
+            cost_model_params = ExtendedCostModelParameters()
+        self.__selectivity_matrix, self.__arrival_rates = pattern.statistics
+        self.__window = pattern.window.total_seconds()
+        self.__predicate_costs = cost_model_params.predicate_costs
+        if self.__predicate_costs is None:
+            self.__predicate_costs = get_predicate_costs(pattern)
+        self.__partial_match_cost = cost_model_params.partial_match_cost
+        self.__storage_access_cost = cost_model_params.storage_access_cost
+        self.__sorting_selectivities = None
+        if storage_params is not None and storage_params.sort_storage:
+            self.__sorting_selectivities = self.__get_sorting_selectivities(pattern)
+        self.__condition_costs = {0: 0.0}
+
+    def get_leaf_cost(self, item: int):
+        """
+        Returns the cost of the leaf of the given event.
+        """
+        arrivals_num = self.__arrival_rates[item] * self.__window
+        pm_size = arrivals_num * self.__selectivity_matrix[item][item]
+        return arrivals_num * self.__predicate_costs[item][item] + pm_size * self.__partial_match_cost
+
+    def get_join_cost(self, left_subset: int, right_subset: int, left_pm_size: float, right_pm_size: float,
+                      pm_size: float):
+        """
+        Returns the cost of an internal node joining the given disjoint subsets of events, given the partial match
+        numbers of its subtrees and of the node itself.
+        """
+        candidates_num = left_pm_size * right_pm_size
+        access_cost = self.__storage_access_cost
+        sorting_selectivity = self.__get_sorting_selectivity(left_subset, right_subset)
+        if sorting_selectivity is not None:
+            candidates_num *= sorting_selectivity
+            access_cost *= 1 + left_pm_size * log2(right_pm_size + 1) + right_pm_size * log2(left_pm_size + 1)
+        else:
+            access_cost *= candidates_num
+        return access_cost + candidates_num * self.__get_condition_cost(left_subset | right_subset) + \
+            pm_size * self.__partial_match_cost
+
+    def get_tree_cost(self, tree: tuple or int):
+        """
+        Returns the cost of the given tree structure.
+        """
+        _, _, cost = self.__get_subtree_cost(tree)
+        return cost
+
+    def get_order_cost(self, order: List[int]):
+        """
+        Returns the cost of the left-deep tree specified by the given order.
+        """
+        tree = order[0]
+        for item in order[1:]:
+            tree = (tree, item)
+        return self.get_tree_cost(tree)
+
+    def __get_subtree_cost(self, tree: tuple or int):
+        """
+        Returns the subset of the events of the given subtree, its partial match number and its cost.
+        """
+        if type(tree) == int:
+            pm_size = self.__arrival_rates[tree] * self.__window * self.__selectivity_matrix[tree][tree]
+            return 1 << tree, pm_size, self.get_leaf_cost(tree)
+        left_subset, left_pm_size, left_cost = self.__get_subtree_cost(tree[0])
+        right_subset, right_pm_size, right_cost = self.__get_subtree_cost(tree[1])
+        pm_size = left_pm_size * right_pm_size
+        for left_item in _get_items(left_subset):
+            for right_item in _get_items(right_subset):
+                pm_size *= self.__selectivity_matrix[left_item][right_item]
+        join_cost = self.get_join_cost(left_subset, right_subset, left_pm_size, right_pm_size, pm_size)
+        return left_subset | right_subset, pm_size, left_cost + right_cost + join_cost
+
+    def __get_condition_cost(self, subset: int):
+        """
+        Returns the cost of evaluating the conditions referring to the given subset of events only.
+        """
+        if subset not in self.__condition_costs:
+            lowest_bit = subset & -subset
+            lowest_item = lowest_bit.bit_length() - 1
+            self.__condition_costs[subset] = self.__get_condition_cost(subset ^ lowest_bit) + \
+                sum(self.__predicate_costs[lowest_item][item] for item in _get_items(subset))
+        return self.__condition_costs[subset]
+
+    def __get_sorting_selectivity(self, left_subset: int, right_subset: int):
+        """
+        Returns the fraction of the stored partial matches retrieved from a sorted storage, or None if the storage of
+        the node is not sorted.
+        """
+        if self.__sorting_selectivities is None:
+            return None
+        selectivities = [self.__sorting_selectivities[left_item][right_item]
+                         for left_item in _get_items(left_subset) for right_item in _get_items(right_subset)
+                         if self.__sorting_selectivities[left_item][right_item] is not None]
+        return min(selectivities) if len(selectivities) > 0 else None
+
+    def __get_sorting_selectivities(self, pattern: Pattern):
+        """
+        Returns a matrix whose (i, j) entry is the fraction of the partial matches of the j-th event retrieved for the
+        i-th one if the storage is sorted by a condition between them, or None if there is no such condition.
+        A sequence node is always sorted by the timestamps of the events.
+        """
+        args = pattern.get_primitive_items()
+        args_num = len(args)
+        if pattern.structure.get_top_operator() == SeqOperator:
+            return [[SEQUENCE_ORDER_SELECTIVITY if i != j else None for j in range(args_num)] for i in range(args_num)]
+        conditions_nums = get_predicate_costs(pattern)
+        sorting_selectivities = [[None for _ in range(args_num)] for _ in range(args_num)]
+        for i in range(args_num):
+            for j in range(i):
+                if conditions_nums[i][j] == 0:
+                    continue
+                formula = pattern.get_primitive_condition_of({args[i].name, args[j].name})
+                if formula.simplify_formula({args[i].name}, {args[j].name}) is not None:
+                    sorting_selectivities[i][j] = sorting_selectivities[j][i] = self.__selectivity_matrix[i][j]
+        return sorting_selectivities
+
+
+def _get_items(subset: int):
+    """
+    Returns the events contained in the given subset.
+    """
+    items = []
+    while subset:
+        bit = subset & -subset
+        items.append(bit.bit_length() - 1)
+        subset ^= bit
+    return items
@@ -1,4 +1,5 @@
 from abc import ABC
+from base.Event import Event
 from misc.IOUtils import Stream
 
 
@@ -9,3 +10,17 @@ class EvaluationMechanism(ABC):
     """
     def eval(self, events: Stream, matches: Stream):
         pass
+
+    def handle_event(self, event: Event):
+        """
+        Processes a single event and returns the list of pattern matches detected as a result of its arrival.
+        Only required to be implemented by evaluation mechanisms supporting push-based (e.g., asynchronous) evaluation.
+        """
+        raise NotImplementedError()
+
+    def flush_pending_matches(self):
+        """
+        Returns the pattern matches held by this mechanism until the arrival of future events, once it is known that no
+        more events will arrive. To be invoked by push-based evaluation at the end of the input.
+        """
+        return []
@@ -3,11 +3,15 @@ from enum import Enum
 
 from base.Pattern import Pattern
 from evaluation.BushyTreeBuilders import DynamicProgrammingBushyTreeBuilder, ZStreamTreeBuilder, ZStreamOrdTreeBuilder
+from evaluation.CostModel import ExtendedCostModelParameters
 from evaluation.IterativeImprovement import IterativeImprovementType
 from evaluation.LeftDeepTreeBuilders import IterativeImprovementInitType, TrivialLeftDeepTreeBuilder, \
     AscendingFrequencyTreeBuilder, GreedyLeftDeepTreeBuilder, IterativeImprovementLeftDeepTreeBuilder, \
     DynamicProgrammingLeftDeepTreeBuilder
 from evaluation.Storage import TreeStorageParameters
+from evaluation.AdaptiveEvaluationMechanism import AdaptiveEvaluationParameters, AdaptiveTreeBasedEvaluationMechanism
+from evaluation.PlanCache import PlanCache
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
 
 
 class EvaluationMechanismTypes(Enum):
@@ -36,20 +40,55 @@ class IterativeImprovementEvaluationMechanismParameters(EvaluationMechanismParam
     """
     Parameters for evaluation mechanism builders based on local search include the number of search steps, the
     choice of the neighborhood (step) function, and the way to generate the initial state.
+    Optionally, multiple independent searches can be performed in parallel worker processes, in which case the
+    cheapest result is used. If a seed is specified, the result is reproducible.
     """
     def __init__(self, step_limit: int,
                  ii_type: IterativeImprovementType = IterativeImprovementType.SWAP_BASED,
-                 init_type: IterativeImprovementInitType = IterativeImprovementInitType.RANDOM):
+                 init_type: IterativeImprovementInitType = IterativeImprovementInitType.RANDOM,
+                 restarts_num: int = 1, workers_num: int = None, seed: int = None):
         super().__init__(EvaluationMechanismTypes.LOCAL_SEARCH_LEFT_DEEP_TREE)
         self.ii_type = ii_type
         self.init_type = init_type
         self.step_limit = step_limit
+        self.restarts_num = restarts_num
+        self.workers_num = workers_num
+        self.seed = seed
+
+
+class CostModelEvaluationMechanismParameters(EvaluationMechanismParameters):
+    """
+    Parameters for the dynamic programming builders, making them minimize the extended cost model (see
+    evaluation.CostModel) instead of the number of partial matches. The storage parameters of the evaluation mechanism
+    are taken into account.
+    """
+    def __init__(self, eval_mechanism_type: EvaluationMechanismTypes,
+                 cost_model_params: ExtendedCostModelParameters = None):
+        if eval_mechanism_type not in (EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_LEFT_DEEP_TREE,
+                                       EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_BUSHY_TREE):
+            raise Exception("The extended cost model is only supported by the dynamic programming builders")
+        super().__init__(eval_mechanism_type)
+        self.cost_model_params = cost_model_params if cost_model_params is not None else ExtendedCostModelParameters()
 
 
 class EvaluationMechanismFactory:
     """
     Creates an evaluation mechanism given its specification.
+    If a plan cache is set, the tree structures are taken from it whenever possible instead of being created anew.
     """
+    __plan_cache = None
+
+    @staticmethod
+    def set_plan_cache(plan_cache: PlanCache):
+        """
+        Sets the plan cache to be used for all subsequently created evaluation mechanisms, or disables the caching if
+        None is given.
+        """
+        EvaluationMechanismFactory.__plan_cache = plan_cache
+
+    @staticmethod
+    def get_plan_cache():
+        return EvaluationMechanismFactory.__plan_cache
 
     @staticmethod
     def build_single_pattern_eval_mechanism(
@@ -57,10 +96,19 @@ class EvaluationMechanismFactory:
         eval_mechanism_params: EvaluationMechanismParameters,
         pattern: Pattern,
         storage_params: TreeStorageParameters,
+        adaptive_params: AdaptiveEvaluationParameters = None,
     ):
-        return EvaluationMechanismFactory.__create_eval_mechanism_builder(
-            eval_mechanism_type, eval_mechanism_params
-        ).build_single_pattern_eval_mechanism(pattern, storage_params)
+        builder = EvaluationMechanismFactory.__create_eval_mechanism_builder(eval_mechanism_type, eval_mechanism_params,
+                                                                            storage_params)
+        if adaptive_params is not None:
+            return AdaptiveTreeBasedEvaluationMechanism(pattern, builder, storage_params, adaptive_params)
+        plan_cache = EvaluationMechanismFactory.__plan_cache
+        if plan_cache is not None:
+            builder_key = EvaluationMechanismFactory.__get_builder_key(eval_mechanism_type, eval_mechanism_params,
+                                                                       storage_params)
+            tree_structure = plan_cache.get_tree_structure(pattern, builder, builder_key)
+            return TreeBasedEvaluationMechanism(pattern, tree_structure, storage_params)
+        return builder.build_single_pattern_eval_mechanism(pattern, storage_params)
 
     @staticmethod
     def build_multi_pattern_eval_mechanism(
@@ -74,7 +122,9 @@ class EvaluationMechanismFactory:
 
     @staticmethod
     def __create_eval_mechanism_builder(
-        eval_mechanism_type: EvaluationMechanismTypes, eval_mechanism_params: EvaluationMechanismParameters
+        eval_mechanism_type: EvaluationMechanismTypes,
+        eval_mechanism_params: EvaluationMechanismParameters,
+        storage_params: TreeStorageParameters = None,
     ):
         eval_mechanism_params = EvaluationMechanismFactory.__create_eval_mechanism_parameters(
             eval_mechanism_type, eval_mechanism_params
@@ -87,11 +137,16 @@ class EvaluationMechanismFactory:
             return GreedyLeftDeepTreeBuilder()
         if eval_mechanism_params.type == EvaluationMechanismTypes.LOCAL_SEARCH_LEFT_DEEP_TREE:
             return IterativeImprovementLeftDeepTreeBuilder(
-                eval_mechanism_params.step_limit, eval_mechanism_params.ii_type, eval_mechanism_params.init_type
+                eval_mechanism_params.step_limit, eval_mechanism_params.ii_type, eval_mechanism_params.init_type,
+                eval_mechanism_params.restarts_num, eval_mechanism_params.workers_num, eval_mechanism_params.seed
             )
         if eval_mechanism_params.type == EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_LEFT_DEEP_TREE:
+            if isinstance(eval_mechanism_params, CostModelEvaluationMechanismParameters):
+                return DynamicProgrammingLeftDeepTreeBuilder(eval_mechanism_params.cost_model_params, storage_params)
             return DynamicProgrammingLeftDeepTreeBuilder()
         if eval_mechanism_params.type == EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_BUSHY_TREE:
+            if isinstance(eval_mechanism_params, CostModelEvaluationMechanismParameters):
+                return DynamicProgrammingBushyTreeBuilder(eval_mechanism_params.cost_model_params, storage_params)
             return DynamicProgrammingBushyTreeBuilder()
         if eval_mechanism_params.type == EvaluationMechanismTypes.ZSTREAM_BUSHY_TREE:
             return ZStreamTreeBuilder()
@@ -99,6 +154,22 @@ class EvaluationMechanismFactory:
             return ZStreamOrdTreeBuilder()
         return None
 
+    @staticmethod
+    def __get_builder_key(eval_mechanism_type: EvaluationMechanismTypes,
+                          eval_mechanism_params: EvaluationMechanismParameters,
+                          storage_params: TreeStorageParameters):
+        """
+        Returns a string identifying the builder created for the given type and parameters. The builders using the
+        extended cost model also depend on the storage type.
+        """
+        eval_mechanism_params = EvaluationMechanismFactory.__create_eval_mechanism_parameters(
+            eval_mechanism_type, eval_mechanism_params
+        )
+        key = "%s%s" % (type(eval_mechanism_params).__name__, sorted(vars(eval_mechanism_params).items()))
+        if isinstance(eval_mechanism_params, CostModelEvaluationMechanismParameters):
+            key += "|sort_storage=%s" % (storage_params is not None and storage_params.sort_storage)
+        return key
+
     @staticmethod
     def __create_eval_mechanism_parameters(
         eval_mechanism_type: EvaluationMechanismTypes, eval_mechanism_params: EvaluationMechanismParameters
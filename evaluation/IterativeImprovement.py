@@ -1,4 +1,5 @@
 from datetime import timedelta
+from math import exp
 from typing import List
 
 from misc.Statistics import calculate_left_deep_tree_cost_function
@@ -11,15 +12,26 @@ class IterativeImprovementType(Enum):
     Two types of iterative improvement moves are supported:
     - swap (select two events and swap their locations in the current order)
     - circle (select three events and cycle their locations in the current order)
+    In addition, two local search strategies escaping local minima using swap moves are supported:
+    - simulated annealing (randomly accept cost-increasing moves with a probability decreasing over time)
+    - tabu search (always perform the best move, but avoid undoing recent moves)
     """
     SWAP_BASED = 0
     CIRCLE_BASED = 1
+    SIMULATED_ANNEALING = 2
+    TABU_SEARCH = 3
 
 
 class IterativeImprovement:
     """
     Implements the generic iterative improvement algorithm.
+    Random decisions are taken using the global random module unless a dedicated random generator is set.
     """
+    _random = random
+
+    def set_random_generator(self, random_generator: random.Random):
+        self._random = random_generator
+
     def execute(self, step_limit: int, initial_order: list, selectivity_matrix: List[List[float]],
                 arrival_rates: List[int], time_window: timedelta):
         new_order = initial_order.copy()
@@ -49,8 +61,8 @@ class SwapBasedIterativeImprovement(IterativeImprovement):
     Implements the swap-based iterative improvement algorithm.
     """
     def _movement_generator(self, movement_range: int):
-        i = random.randint(0, movement_range - 1)
-        j = random.randint(i, movement_range - 1)
+        i = self._random.randint(0, movement_range - 1)
+        j = self._random.randint(i, movement_range - 1)
         return i, j
 
     def _movement_function(self, order: list, move: object):
@@ -69,10 +81,10 @@ class CircleBasedIterativeImprovement(IterativeImprovement):
     Implements the circle-based iterative improvement algorithm.
     """
     def _movement_generator(self, movement_range: int):
-        i = random.randint(0, movement_range - 3)
-        j = random.randint(i + 1, movement_range - 2)
-        k = random.randint(j + 1, movement_range - 1)
-        if random.randint(0, 1) == 1:
+        i = self._random.randint(0, movement_range - 3)
+        j = self._random.randint(i + 1, movement_range - 2)
+        k = self._random.randint(j + 1, movement_range - 1)
+        if self._random.randint(0, 1) == 1:
             return i, j, k
         return i, k, j
 
@@ -88,6 +100,131 @@ class CircleBasedIterativeImprovement(IterativeImprovement):
         return k, i, j
 
 
+class LeftDeepCostModel:
+    """
+    Maintains the cost of a left-deep order (see calculate_left_deep_tree_cost_function) along with the partial match
+    numbers of its prefixes, allowing to calculate the cost change caused by rearranging the items in a range of
+    positions without recalculating the whole cost function.
+    As the partial match number of a prefix does not depend on the order of its items, rearranging the items at the
+    positions start to end only affects the prefixes ending at the positions start to end - 1.
+    The order is modified in place by the caller, and the changes must be reported to the model using apply_move.
+    """
+    def __init__(self, order: list, selectivity_matrix: List[List[float]], arrival_rates: List[int],
+                 time_window: timedelta):
+        self.__order = order
+        self.__selectivity_matrix = selectivity_matrix
+        self.__arrival_rates = arrival_rates
+        self.__time_window = time_window
+        self.__pm_sizes = self.__calculate_pm_sizes(0, len(order))
+        self.cost = sum(self.__pm_sizes)
+
+    def get_move_delta(self, start: int, end: int):
+        """
+        Returns the cost change caused by rearranging the items at the positions start to end (start <= end) of the
+        order, along with the new partial match numbers of the affected prefixes.
+        """
+        new_pm_sizes = self.__calculate_pm_sizes(start, end)
+        return sum(new_pm_sizes) - sum(self.__pm_sizes[start:end]), new_pm_sizes
+
+    def apply_move(self, start: int, new_pm_sizes: List[float], delta: float):
+        self.__pm_sizes[start:start + len(new_pm_sizes)] = new_pm_sizes
+        self.cost += delta
+
+    def __calculate_pm_sizes(self, start: int, end: int):
+        """
+        Calculates the partial match numbers of the prefixes ending at the positions start to end - 1 in the same way as
+        calculate_left_deep_tree_cost_function does.
+        """
+        order, selectivity_matrix = self.__order, self.__selectivity_matrix
+        pm_size = self.__pm_sizes[start - 1] if start > 0 else 1
+        pm_sizes = []
+        for i in range(start, end):
+            pm_size *= selectivity_matrix[order[i]][order[i]] * self.__arrival_rates[order[i]] * self.__time_window
+            for j in range(i):
+                pm_size *= selectivity_matrix[order[i]][order[j]]
+            pm_sizes.append(pm_size)
+        return pm_sizes
+
+
+class SimulatedAnnealingIterativeImprovement(SwapBasedIterativeImprovement):
+    """
+    Implements simulated annealing over swap moves. A move increasing the cost by a relative amount of d is accepted
+    with the probability exp(-d / T), where the temperature T decreases geometrically from initial_temperature to
+    final_temperature during the search. The best order encountered is returned.
+    """
+    def __init__(self, initial_temperature: float = 0.1, final_temperature: float = 0.0001):
+        self.__initial_temperature = initial_temperature
+        self.__final_temperature = final_temperature
+
+    def execute(self, step_limit: int, initial_order: list, selectivity_matrix: List[List[float]],
+                arrival_rates: List[int], time_window: timedelta):
+        order = initial_order.copy()
+        cost_model = LeftDeepCostModel(order, selectivity_matrix, arrival_rates, time_window)
+        best_order, best_cost = order.copy(), cost_model.cost
+        temperature = self.__initial_temperature
+        cooling_factor = (self.__final_temperature / self.__initial_temperature) ** (1 / max(step_limit, 1))
+        for step in range(step_limit):
+            i, j = self._movement_generator(len(order))
+            self._movement_function(order, (i, j))
+            delta, new_pm_sizes = cost_model.get_move_delta(i, j)
+            if delta < 0 or (cost_model.cost > 0 and
+                              self._random.random() < exp(-delta / (cost_model.cost * temperature))):
+                cost_model.apply_move(i, new_pm_sizes, delta)
+                if cost_model.cost < best_cost:
+                    best_order, best_cost = order.copy(), cost_model.cost
+            else:
+                self._movement_function(order, self._reverse_move((i, j)))
+            temperature *= cooling_factor
+        return best_order
+
+
+class TabuSearchIterativeImprovement(SwapBasedIterativeImprovement):
+    """
+    Implements tabu search over swap moves. At each step, the best swap among candidates_num random candidates (or
+    among all the swaps if candidates_num is None) is performed, even if it increases the cost. Swapping a pair of
+    items swapped during the last tabu_tenure steps is forbidden, unless it yields a new best order. By default, the
+    tenure is half of the number of items. The best order encountered is returned.
+    """
+    def __init__(self, tabu_tenure: int = None, candidates_num: int = None):
+        self.__tabu_tenure = tabu_tenure
+        self.__candidates_num = candidates_num
+
+    def execute(self, step_limit: int, initial_order: list, selectivity_matrix: List[List[float]],
+                arrival_rates: List[int], time_window: timedelta):
+        order = initial_order.copy()
+        if len(order) < 2:
+            return order
+        cost_model = LeftDeepCostModel(order, selectivity_matrix, arrival_rates, time_window)
+        best_order, best_cost = order.copy(), cost_model.cost
+        tabu_tenure = self.__tabu_tenure if self.__tabu_tenure is not None else max(1, len(order) // 2)
+        tabu_expirations = {}
+        all_moves = [(i, j) for i in range(len(order)) for j in range(i + 1, len(order))]
+        for step in range(step_limit):
+            moves = all_moves if self.__candidates_num is None or self.__candidates_num >= len(all_moves) \
+                else self._random.sample(all_moves, self.__candidates_num)
+            best_move = best_delta = best_pm_sizes = None
+            for i, j in moves:
+                items = frozenset((order[i], order[j]))
+                self._movement_function(order, (i, j))
+                delta, new_pm_sizes = cost_model.get_move_delta(i, j)
+                self._movement_function(order, (i, j))
+                is_tabu = tabu_expirations.get(items, -1) >= step
+                if is_tabu and cost_model.cost + delta >= best_cost:
+                    continue
+                if best_move is None or delta < best_delta:
+                    best_move, best_delta, best_pm_sizes = (i, j), delta, new_pm_sizes
+            if best_move is None:
+                # all the candidate moves are tabu
+                continue
+            i, j = best_move
+            tabu_expirations[frozenset((order[i], order[j]))] = step + tabu_tenure
+            self._movement_function(order, best_move)
+            cost_model.apply_move(i, best_pm_sizes, best_delta)
+            if cost_model.cost < best_cost:
+                best_order, best_cost = order.copy(), cost_model.cost
+        return best_order
+
+
 class IterativeImprovementAlgorithmBuilder:
     """
     A class for creating an iterative improvement algorithm according to the specified type.
@@ -98,4 +235,8 @@ class IterativeImprovementAlgorithmBuilder:
             return SwapBasedIterativeImprovement()
         elif ii_type == IterativeImprovementType.CIRCLE_BASED:
             return CircleBasedIterativeImprovement()
+        elif ii_type == IterativeImprovementType.SIMULATED_ANNEALING:
+            return SimulatedAnnealingIterativeImprovement()
+        elif ii_type == IterativeImprovementType.TABU_SEARCH:
+            return TabuSearchIterativeImprovement()
         return None
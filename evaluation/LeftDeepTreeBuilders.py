@@ -2,6 +2,7 @@
 This file contains the implementations of algorithms constructing a left-deep tree-based evaluation mechanism.
 """
 from enum import Enum
+import multiprocessing
 import random
 from typing import List
 
@@ -9,6 +10,8 @@ from evaluation.IterativeImprovement import IterativeImprovementType, IterativeI
 from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
 from evaluation.EvaluationMechanismBuilder import EvaluationMechanismBuilder
 from base.Pattern import Pattern
+from base.PatternStructure import OrOperator
+from evaluation.CostModel import ExtendedCostModelParameters, ExtendedCostModel
 from misc.Statistics import calculate_left_deep_tree_cost_function, MissingStatisticsException
 from misc.StatisticsTypes import StatisticsTypes
 from misc.Utils import get_order_by_occurrences
@@ -21,10 +24,19 @@ class LeftDeepTreeBuilder(EvaluationMechanismBuilder):
     """
 
     def build_single_pattern_eval_mechanism(self, pattern: Pattern, storage_params: TreeStorageParameters):
-        order = self._create_evaluation_order(pattern)
-        tree_structure = self.__build_tree_from_order(order)
+        tree_structure = self.create_tree_structure(pattern)
         return TreeBasedEvaluationMechanism(pattern, tree_structure, storage_params)
 
+    def create_tree_structure(self, pattern: Pattern):
+        """
+        Returns the structure of the left-deep evaluation tree created by this builder for the given pattern.
+        The structure of a disjunction pattern consists of the structures of its arguments.
+        """
+        if pattern.structure.get_top_operator() == OrOperator:
+            return tuple(self.create_tree_structure(disjunct) for disjunct in pattern.get_disjunct_patterns())
+        order = self._create_evaluation_order(pattern)
+        return self.__build_tree_from_order(order)
+
     def build_multi_pattern_eval_mechanism(self, patterns: List[Pattern]):
         raise Exception("Unsupported")
 
@@ -63,9 +75,11 @@ class AscendingFrequencyTreeBuilder(LeftDeepTreeBuilder):
     def _create_evaluation_order(self, pattern: Pattern):
         if pattern.statistics_type == StatisticsTypes.FREQUENCY_DICT:
             frequency_dict = pattern.statistics
-            order = get_order_by_occurrences(pattern.structure.args, frequency_dict)
-        elif pattern.statistics_type == StatisticsTypes.ARRIVAL_RATES:
-            arrival_rates = pattern.statistics
+            order = get_order_by_occurrences(pattern.get_primitive_items(), frequency_dict)
+        elif pattern.statistics_type in (StatisticsTypes.ARRIVAL_RATES,
+                                         StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES):
+            arrival_rates = pattern.statistics if pattern.statistics_type == StatisticsTypes.ARRIVAL_RATES \
+                else pattern.statistics[1]
             # create an index-arrival rate binding and sort according to arrival rate.
             sorted_order = sorted([(i, arrival_rates[i]) for i in range(len(arrival_rates))], key=lambda x: x[1])
             order = [x for x, y in sorted_order]  # create order from sorted binding.
@@ -135,88 +149,192 @@ class IterativeImprovementInitType(Enum):
 class IterativeImprovementLeftDeepTreeBuilder(LeftDeepTreeBuilder):
     """
     Creates a left-deep tree using the iterative improvement procedure.
+    If restarts_num is greater than 1, the given number of independent searches is performed, distributed between
+    workers_num processes (by default, the number of CPUs), and the cheapest order found is selected. The random
+    generator of the i-th search is seeded with seed + i, such that the result is reproducible if a seed is given.
     """
     def __init__(self, step_limit: int,
                  ii_type: IterativeImprovementType = IterativeImprovementType.SWAP_BASED,
-                 init_type: IterativeImprovementInitType = IterativeImprovementInitType.RANDOM):
-        self.__iterative_improvement = IterativeImprovementAlgorithmBuilder.create_ii_algorithm(ii_type)
+                 init_type: IterativeImprovementInitType = IterativeImprovementInitType.RANDOM,
+                 restarts_num: int = 1, workers_num: int = None, seed: int = None):
+        if restarts_num < 1:
+            raise Exception("At least one local search must be performed")
+        self.__ii_type = ii_type
         self.__initType = init_type
         self.__step_limit = step_limit
+        self.__restarts_num = restarts_num
+        self.__workers_num = workers_num
+        self.__seed = seed
 
     def _create_evaluation_order(self, pattern: Pattern):
         if pattern.statistics_type == StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
             (selectivityMatrix, arrivalRates) = pattern.statistics
         else:
             raise MissingStatisticsException()
-        order = None
-        if self.__initType == IterativeImprovementInitType.RANDOM:
-            order = self.__get_random_order(len(arrivalRates))
-        elif self.__initType == IterativeImprovementInitType.GREEDY:
-            order = GreedyLeftDeepTreeBuilder.calculate_greedy_order(selectivityMatrix, arrivalRates)
-        return self.__iterative_improvement.execute(self.__step_limit, order, selectivityMatrix, arrivalRates,
-                                                    pattern.window.total_seconds())
+        window = pattern.window.total_seconds()
+        if self.__restarts_num == 1 and self.__seed is None:
+            return _run_local_search(self.__step_limit, self.__ii_type, self.__initType, selectivityMatrix,
+                                     arrivalRates, window, None)
+
+        base_seed = self.__seed if self.__seed is not None else random.randrange(2 ** 32)
+        searches = [(self.__step_limit, self.__ii_type, self.__initType, selectivityMatrix, arrivalRates, window,
+                     base_seed + i) for i in range(self.__restarts_num)]
+        workers_num = self.__workers_num if self.__workers_num is not None else multiprocessing.cpu_count()
+        workers_num = min(workers_num, self.__restarts_num)
+        if workers_num > 1:
+            with multiprocessing.Pool(workers_num) as pool:
+                orders = pool.starmap(_run_local_search, searches)
+        else:
+            orders = [_run_local_search(*search) for search in searches]
+        costs = [calculate_left_deep_tree_cost_function(order, selectivityMatrix, arrivalRates, window)
+                 for order in orders]
+        return orders[costs.index(min(costs))]
 
-    @staticmethod
-    def __get_random_order(n: int):
-        """
-        Used for creating an initial order in RANDOM mode.
-        """
-        order = []
-        left = list(range(n))
-        while len(left) > 0:
-            index = random.randint(0, len(left) - 1)
-            order.append(left[index])
-            del left[index]
-        return order
+
+def _run_local_search(step_limit: int, ii_type: IterativeImprovementType, init_type: IterativeImprovementInitType,
+                      selectivity_matrix: List[List[float]], arrival_rates: List[int], window: float, seed: int):
+    """
+    Performs a single local search. If a seed is given, a dedicated random generator seeded with it is used instead
+    of the global one.
+    Defined at the module level to be executable by worker processes.
+    """
+    random_generator = random.Random(seed) if seed is not None else random
+    iterative_improvement = IterativeImprovementAlgorithmBuilder.create_ii_algorithm(ii_type)
+    iterative_improvement.set_random_generator(random_generator)
+    order = None
+    if init_type == IterativeImprovementInitType.RANDOM:
+        order = _get_random_order(len(arrival_rates), random_generator)
+    elif init_type == IterativeImprovementInitType.GREEDY:
+        order = GreedyLeftDeepTreeBuilder.calculate_greedy_order(selectivity_matrix, arrival_rates)
+    return iterative_improvement.execute(step_limit, order, selectivity_matrix, arrival_rates, window)
+
+
+def _get_random_order(n: int, random_generator):
+    """
+    Used for creating an initial order in RANDOM mode.
+    """
+    order = []
+    left = list(range(n))
+    while len(left) > 0:
+        index = random_generator.randint(0, len(left) - 1)
+        order.append(left[index])
+        del left[index]
+    return order
 
 
 class DynamicProgrammingLeftDeepTreeBuilder(LeftDeepTreeBuilder):
     """
     Creates a left-deep tree using a dynamic programming algorithm.
+    If extended cost model parameters are given, the tree minimizing the extended cost model (see evaluation.CostModel)
+    for the given storage parameters is created instead of the one minimizing the number of partial matches.
     """
+    def __init__(self, cost_model_params: ExtendedCostModelParameters = None,
+                 storage_params: TreeStorageParameters = None):
+        self.__cost_model_params = cost_model_params
+        self.__storage_params = storage_params
 
     def _create_evaluation_order(self, pattern: Pattern):
         if pattern.statistics_type == StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
             (selectivityMatrix, arrivalRates) = pattern.statistics
         else:
             raise MissingStatisticsException()
+        if self.__cost_model_params is not None:
+            cost_model = ExtendedCostModel(pattern, self.__storage_params, self.__cost_model_params)
+            return DynamicProgrammingLeftDeepTreeBuilder.find_order_by_cost_model(
+                cost_model, selectivityMatrix, arrivalRates, pattern.window.total_seconds())
         return DynamicProgrammingLeftDeepTreeBuilder.find_order(selectivityMatrix, arrivalRates,
                                                                 pattern.window.total_seconds())
 
     @staticmethod
     def find_order(selectivity_matrix: List[List[float]], arrival_rates: List[int], window: int):
+        """
+        The number of partial matches of a subset of the events does not depend on the order in which they were joined,
+        and the cost of an order is the sum of the partial match numbers of its prefixes. Hence, the cheapest order of a
+        subset is obtained by appending its best last item to the cheapest order of the remaining items.
+        The subsets are represented as bitmasks, and the partial match number of a subset is derived from the one of the
+        subset lacking its lowest item, such that each subset is handled in O(n).
+        """
         args_num = len(selectivity_matrix)
         if args_num == 1:  # boring extreme case
             return [0]
 
-        items = frozenset(range(args_num))
-        # Save subsets' optimal orders, the cost and the left to add items.
-        sub_orders = {frozenset({i}): ([i],
-                                       calculate_left_deep_tree_cost_function([i], selectivity_matrix, arrival_rates,
-                                                                              window),
-                                       items.difference({i}))
-                      for i in items}
-
-        for i in range(2, args_num + 1):
-            # for each subset of size i, we will find the best order for each subset
-            next_orders = {}
-            for subset in sub_orders.keys():
-                order, _, left_to_add = sub_orders[subset]
-                for item in left_to_add:
-                    # calculate for optional order for set of size i
-                    new_subset = frozenset(subset.union({item}))
-                    new_cost = calculate_left_deep_tree_cost_function(order, selectivity_matrix, arrival_rates, window)
-                    # check if it is not the first order for that set
-                    if new_subset in next_orders.keys():
-                        _, t_cost, t_left = next_orders[new_subset]
-                        if new_cost < t_cost:  # check if it is the current best order for that set
-                            new_order = order + [item]
-                            next_orders[new_subset] = new_order, new_cost, t_left
-                    else:  # if it is the first order for that set
-                        new_order = order + [item]
-                        next_orders[new_subset] = new_order, new_cost, left_to_add.difference({item})
-            # update subsets for next iteration
-            sub_orders = next_orders
-        return list(sub_orders.values())[0][
-            0]  # return the order (at index 0 in the tuple) of item 0, the only item in subsets of size n.
+        subsets_num = 1 << args_num
+        pm_sizes = [1.0] * subsets_num
+        costs = [0.0] * subsets_num
+        last_items = [None] * subsets_num
+        for subset in range(1, subsets_num):
+            lowest_bit = subset & -subset
+            lowest_item = lowest_bit.bit_length() - 1
+            rest = subset ^ lowest_bit
+            pm_size = pm_sizes[rest] * selectivity_matrix[lowest_item][lowest_item] * \
+                arrival_rates[lowest_item] * window
+            best_item, best_cost = lowest_item, costs[rest]
+            while rest:
+                bit = rest & -rest
+                item = bit.bit_length() - 1
+                pm_size *= selectivity_matrix[lowest_item][item]
+                if costs[subset ^ bit] < best_cost:
+                    best_item, best_cost = item, costs[subset ^ bit]
+                rest ^= bit
+            pm_sizes[subset] = pm_size
+            costs[subset] = best_cost + pm_size
+            last_items[subset] = best_item
+
+        return DynamicProgrammingLeftDeepTreeBuilder.__build_order(subsets_num - 1, last_items)
 
+    @staticmethod
+    def find_order_by_cost_model(cost_model: ExtendedCostModel, selectivity_matrix: List[List[float]],
+                                 arrival_rates: List[int], window: int):
+        """
+        The same as find_order, except that the cost of joining an item to a prefix depends on both of them, and
+        therefore the cost of each possible last item of a subset is calculated separately.
+        """
+        args_num = len(selectivity_matrix)
+        if args_num == 1:
+            return [0]
+
+        subsets_num = 1 << args_num
+        pm_sizes = [1.0] * subsets_num
+        costs = [0.0] * subsets_num
+        last_items = [None] * subsets_num
+        for subset in range(1, subsets_num):
+            lowest_bit = subset & -subset
+            lowest_item = lowest_bit.bit_length() - 1
+            rest = subset ^ lowest_bit
+            pm_size = pm_sizes[rest] * selectivity_matrix[lowest_item][lowest_item] * \
+                arrival_rates[lowest_item] * window
+            remaining = rest
+            while remaining:
+                bit = remaining & -remaining
+                pm_size *= selectivity_matrix[lowest_item][bit.bit_length() - 1]
+                remaining ^= bit
+            pm_sizes[subset] = pm_size
+            if rest == 0:
+                costs[subset] = cost_model.get_leaf_cost(lowest_item)
+                last_items[subset] = lowest_item
+                continue
+            best_item, best_cost = None, None
+            remaining = subset
+            while remaining:
+                bit = remaining & -remaining
+                prefix = subset ^ bit
+                cost = costs[prefix] + costs[bit] + \
+                    cost_model.get_join_cost(prefix, bit, pm_sizes[prefix], pm_sizes[bit], pm_size)
+                if best_cost is None or cost < best_cost:
+                    best_item, best_cost = bit.bit_length() - 1, cost
+                remaining ^= bit
+            costs[subset] = best_cost
+            last_items[subset] = best_item
+        return DynamicProgrammingLeftDeepTreeBuilder.__build_order(subsets_num - 1, last_items)
+
+    @staticmethod
+    def __build_order(subset: int, last_items: List[int]):
+        """
+        Reconstructs the optimal order of the given subset from its last item backwards.
+        """
+        order = []
+        while subset:
+            order.append(last_items[subset])
+            subset ^= 1 << last_items[subset]
+        order.reverse()
+        return order
@@ -3,12 +3,11 @@ from typing import List, Tuple
 from datetime import timedelta, datetime
 from base.Event import Event
 from base.Formula import Formula, AtomicFormula, TrueFormula
-from evaluation.PartialMatch import PartialMatch
+from evaluation.PartialMatch import PartialMatch, get_first_timestamp, get_last_timestamp, get_payload
 from base.PatternStructure import SeqOperator, QItem
 from misc.Utils import (
     merge,
     merge_according_to,
-    is_sorted,
 )
 from evaluation.Storage import SortedStorage, UnsortedStorage, DefaultStorage, TreeStorageParameters
 
@@ -32,12 +31,25 @@ class InternalNode(Node):
             result += self._right_subtree.get_leaves()
         return result
 
+    def get_subtrees(self):
+        """
+        Returns the left and the right subtrees of this node.
+        """
+        return self._left_subtree, self._right_subtree
+
     def apply_formula(self, formula: Formula):
+        """
+        Only the conditions decided at this node are kept, i.e., the ones referring to events of both subtrees. The
+        conditions referring to the events of a single subtree are evaluated by the lowest node of that subtree
+        containing all of their events (a leaf for the conditions on a single event).
+        """
         names = {item[1].name for item in self._event_defs}
-        condition = formula.get_formula_of(names)
+        left_names = {item[1].name for item in self._left_subtree.get_event_definitions()}
+        right_names = {item[1].name for item in self._right_subtree.get_event_definitions()}
+        condition = formula.get_residual_formula_of(names, [left_names, right_names])
         self._condition = condition if condition else TrueFormula()
-        self._left_subtree.apply_formula(self._condition)
-        self._right_subtree.apply_formula(self._condition)
+        self._left_subtree.apply_formula(formula)
+        self._right_subtree.apply_formula(formula)
 
     def get_event_definitions(self):
         return self._event_defs
@@ -78,31 +90,81 @@ class InternalNode(Node):
 
         self.clean_expired_partial_matches(new_partial_match.last_timestamp)
 
+        if self._selection_state is not None:
+            self.__handle_new_partial_match_by_policy(partial_match_source, other_subtree, new_partial_match,
+                                                      partial_matches_to_compare, first_event_defs, second_event_defs)
+            return
+
         # given a partial match from one subtree, for each partial match
         # in the other subtree we check for new partial matches in this node.
         for partialMatch in partial_matches_to_compare:
             self._try_create_new_match(new_partial_match, partialMatch, first_event_defs, second_event_defs)
 
+    def delay_expiration(self, delay: timedelta):
+        super().delay_expiration(delay)
+        self._left_subtree.delay_expiration(delay)
+        self._right_subtree.delay_expiration(delay)
+
+    def can_combine_partial_matches_of(self, partial_match_source: Node, timestamp: datetime):
+        """
+        A new partial match of a subtree is only combined with the unexpired partial matches of the other subtree.
+        """
+        other_subtree = self._right_subtree if partial_match_source == self._left_subtree else self._left_subtree
+        other_subtree.clean_expired_partial_matches(timestamp)
+        return other_subtree.has_partial_matches()
+
+    def set_selection_state(self, selection_state):
+        super().set_selection_state(selection_state)
+        self._left_subtree.set_selection_state(selection_state)
+        self._right_subtree.set_selection_state(selection_state)
+
+    def __handle_new_partial_match_by_policy(self, partial_match_source: Node, other_subtree: Node,
+                                             new_partial_match: PartialMatch, partial_matches_to_compare,
+                                             first_event_defs: List[Tuple[int, QItem]],
+                                             second_event_defs: List[Tuple[int, QItem]]):
+        """
+        Combines the given new partial match with the partial matches of the other subtree according to the
+        consumption policy of the pattern, and removes the partial matches it makes unreachable: the ones containing
+        consumed events, and under MATCH_NEXT, the ones that were already combined at this node.
+        """
+        if self._selection_state.is_consumed(new_partial_match):
+            partial_match_source.remove_partial_matches([new_partial_match])
+            return
+        unreachable_partial_matches = []
+        for partialMatch in partial_matches_to_compare:
+            if self._selection_state.is_consumed(partialMatch):
+                unreachable_partial_matches.append(partialMatch)
+                continue
+            if self._try_create_new_match(new_partial_match, partialMatch, first_event_defs, second_event_defs) \
+                    and self._selection_state.is_match_next():
+                partial_match_source.remove_partial_matches([new_partial_match])
+                unreachable_partial_matches.append(partialMatch)
+                break
+        if len(unreachable_partial_matches) > 0:
+            other_subtree.remove_partial_matches(unreachable_partial_matches)
+
     def _try_create_new_match(self,
                               first_partial_match: PartialMatch, second_partial_match: PartialMatch,
                               first_event_defs: List[Tuple[int, QItem]], second_event_defs: List[Tuple[int, QItem]]):
         """
         Verifies all the conditions for creating a new partial match and creates it if all constraints are satisfied.
+        Returns True if a new partial match was created and False otherwise.
         """
         # We need this because clean_expired doesn't necessarily clean old partial matches.
         if self._sliding_window != timedelta.max and (
             abs(first_partial_match.last_timestamp - second_partial_match.first_timestamp) > self._sliding_window
             or abs(first_partial_match.first_timestamp - second_partial_match.last_timestamp) > self._sliding_window
         ):
-            return
+            return False
         events_for_new_match = self._merge_events_for_new_match(first_event_defs, second_event_defs,
                                                                 first_partial_match.events, second_partial_match.events)
         # events merged
         if not self._validate_new_match(events_for_new_match):
-            return
+            return False
         self.add_partial_match(PartialMatch(events_for_new_match))
         if self._parent is not None:
             self._parent.handle_new_partial_match(self)
+        return True
 
     def _merge_events_for_new_match(self,
                                     first_event_defs: List[Tuple[int, QItem]],
@@ -123,7 +185,7 @@ class InternalNode(Node):
         Validates the condition stored in this node on the given set of events.
         """
         binding = {
-            self._event_defs[i][1].name: events_for_new_match[i].payload for i in range(len(self._event_defs))
+            self._event_defs[i][1].name: get_payload(events_for_new_match[i]) for i in range(len(self._event_defs))
         }
         return self._condition.eval(binding)
 
@@ -166,10 +228,10 @@ class AndNode(InternalNode):
         if simple_formula is not None:
             left_term, relop, right_term = simple_formula.dismantle()
             left_sorting_key = lambda pm: left_term.eval(
-                {left_event_defs[i][1].name: pm.events[i].payload for i in range(len(pm.events))}
+                {left_event_defs[i][1].name: get_payload(pm.events[i]) for i in range(len(pm.events))}
             )
             right_sorting_key = lambda pm: right_term.eval(
-                {right_event_defs[i][1].name: pm.events[i].payload for i in range(len(pm.events))}
+                {right_event_defs[i][1].name: get_payload(pm.events[i]) for i in range(len(pm.events))}
             )
 
         self._left_subtree.create_storage_unit(storage_params, left_sorting_key, relop, "left")
@@ -181,7 +243,14 @@ class SeqNode(InternalNode):
     An internal node representing a "SEQ" (sequence) operator.
     In addition to checking the time window and condition like the basic node does, SeqNode also verifies the order
     of arrival of the events in the partial matches it constructs.
+    If some arguments of the sequence are nested operators evaluated by several leaves, the given groups map each leaf
+    index to the argument it belongs to, and the order is only verified between the events of different arguments.
     """
+    def __init__(self, sliding_window: timedelta, parent: Node = None, event_defs: List[Tuple[int, QItem]] = None,
+                 left: Node = None, right: Node = None, groups: dict = None):
+        super().__init__(sliding_window, parent, event_defs, left, right)
+        self.__groups = groups
+
     def _set_event_definitions(self,
                                left_event_defs: List[Tuple[int, QItem]], right_event_defs: List[Tuple[int, QItem]]):
         self._event_defs = merge(left_event_defs, right_event_defs, key=lambda x: x[0])
@@ -195,10 +264,47 @@ class SeqNode(InternalNode):
                                   first_event_list, second_event_list, key=lambda x: x[0])
 
     def _validate_new_match(self, events_for_new_match: List[Event]):
-        if not is_sorted(events_for_new_match, key=lambda x: x.timestamp):
+        if self.__groups is None:
+            for i in range(len(events_for_new_match) - 1):
+                if get_last_timestamp(events_for_new_match[i]) > get_first_timestamp(events_for_new_match[i + 1]):
+                    return False
+            if self._selection_state is not None and not self.__validate_contiguity(events_for_new_match):
+                return False
+        elif not self.__validate_groups_order(events_for_new_match):
             return False
         return super()._validate_new_match(events_for_new_match)
 
+    def __validate_contiguity(self, events_for_new_match: List[Event]):
+        """
+        Verifies that the events of consecutive arguments of the sequence are consecutive in the input stream, if
+        required by the consumption policy.
+        """
+        for i in range(len(events_for_new_match) - 1):
+            if self._event_defs[i + 1][0] == self._event_defs[i][0] + 1 and \
+                    not self._selection_state.are_contiguous(events_for_new_match[i], events_for_new_match[i + 1]):
+                return False
+        return True
+
+    def __validate_groups_order(self, events_for_new_match: List[Event]):
+        """
+        Verifies that all the events of each argument precede all the events of the following argument. The events of
+        an argument are contiguous in the partial match.
+        """
+        previous_group_end = None
+        group = first_timestamp = last_timestamp = None
+        for event_def, item in zip(self._event_defs, events_for_new_match):
+            item_group = self.__groups[event_def[0]]
+            if item_group != group:
+                if last_timestamp is not None:
+                    previous_group_end = last_timestamp
+                group, first_timestamp, last_timestamp = item_group, get_first_timestamp(item), get_last_timestamp(item)
+            else:
+                first_timestamp = min(first_timestamp, get_first_timestamp(item))
+                last_timestamp = max(last_timestamp, get_last_timestamp(item))
+            if previous_group_end is not None and previous_group_end > first_timestamp:
+                return False
+        return True
+
     def create_storage_unit(self, storage_params: TreeStorageParameters, sorting_key: callable = None,
                             relation_op=None, equation_side=None, sort_by_first_timestamp=False):
         """
@@ -248,8 +354,18 @@ class SeqNode(InternalNode):
         left_sort_by_first_timestamp = True if left_sort == 0 else False
         right_sort_by_first_timestamp = True if right_sort == 0 else False
         self._left_subtree.create_storage_unit(
-            storage_params, lambda pm: pm.events[left_sort].timestamp, relop, "left", left_sort_by_first_timestamp
+            storage_params, self.__get_timestamp_sorting_key(left_sort), relop, "left", left_sort_by_first_timestamp
         )
         self._right_subtree.create_storage_unit(
-            storage_params, lambda pm: pm.events[right_sort].timestamp, relop, "right", right_sort_by_first_timestamp
+            storage_params, self.__get_timestamp_sorting_key(right_sort), relop, "right", right_sort_by_first_timestamp
         )
+
+    @staticmethod
+    def __get_timestamp_sorting_key(index: int):
+        """
+        Returns a sorting key extracting the timestamp of the item at the given index (0 or -1) of a partial match. The
+        first item is represented by its earliest timestamp and the last item by its latest one.
+        """
+        if index == 0:
+            return lambda pm: get_first_timestamp(pm.events[0])
+        return lambda pm: get_last_timestamp(pm.events[index])
@@ -0,0 +1,81 @@
+from collections import deque
+from datetime import timedelta
+from typing import List
+
+from base.Event import Event
+from base.Formula import Formula
+from base.PatternStructure import KleeneClosureOperator, QItem
+from evaluation.Nodes.Node import Node
+from evaluation.Storage import KleeneClosureStorage, TreeStorageParameters
+
+
+class KleeneClosureNode(Node):
+    """
+    A leaf node responsible for a Kleene closure over a single event type of the pattern.
+    Only the accepted events are stored, and the partial matches (the sets of events within the time window satisfying
+    the condition of the closure) are enumerated lazily by the storage (see KleeneClosureStorage). When an event
+    arrives, only the partial matches containing it are created and propagated to the parent, and only if the parent
+    currently has partial matches to combine them with. Otherwise, they are created when first requested by the
+    parent, upon the arrival of a partial match of the other subtree. If the node is the root of the tree, the partial
+    matches ending at each new event are the matches of the pattern, and are buffered until they are consumed.
+    """
+    def __init__(self, sliding_window: timedelta, leaf_index: int, closure: KleeneClosureOperator, parent: Node):
+        super().__init__(sliding_window, parent)
+        if not isinstance(closure.arg, QItem):
+            raise NotImplementedError("Kleene closure is only supported over primitive events")
+        self.__leaf_index = leaf_index
+        self.__event_name = closure.arg.name
+        self.__event_type = closure.arg.event_type
+        self.__min_size = closure.min_size
+        self.__max_size = closure.max_size
+        self.__unreported_matches = deque()
+
+    def get_leaves(self):
+        return [self]
+
+    def apply_formula(self, formula: Formula):
+        condition = formula.get_formula_of({self.__event_name})
+        if condition is not None:
+            self._condition = condition
+
+    def get_event_definitions(self):
+        return [(self.__leaf_index, QItem(self.__event_type, self.__event_name))]
+
+    def get_event_type(self):
+        """
+        Returns the type of events processed by this leaf.
+        """
+        return self.__event_type
+
+    def handle_event(self, event: Event):
+        """
+        Stores the given event and propagates the new partial matches containing it to the parent.
+        """
+        self.clean_expired_partial_matches(event.timestamp)
+        self._partial_matches.add(event)
+        if self._parent is None:
+            self.__unreported_matches.extend(
+                self._partial_matches.get_partial_matches_ending_at(len(self._partial_matches) - 1))
+            return
+        if not self._parent.can_combine_partial_matches_of(self, event.timestamp):
+            return
+        for pm in self._partial_matches.get_partial_matches_ending_at(len(self._partial_matches) - 1):
+            self._unhandled_partial_matches.put(pm)
+            self._parent.handle_new_partial_match(self)
+
+    def has_partial_matches(self):
+        if self._parent is None:
+            return len(self.__unreported_matches) > 0
+        return super().has_partial_matches()
+
+    def consume_first_partial_match(self):
+        # the storage contains the accepted events rather than partial matches
+        return self.__unreported_matches.popleft()
+
+    def create_storage_unit(self, storage_params: TreeStorageParameters, sorting_key: callable = None,
+                            relation_op=None, equation_side=None, sort_by_first_timestamp=False):
+        self._partial_matches = KleeneClosureStorage(self._sliding_window, self.__min_size, self.__max_size,
+                                                     sorting_key, self.__is_valid)
+
+    def __is_valid(self, events: List[Event]):
+        return self._condition.eval({self.__event_name: [event.payload for event in events]})
@@ -18,12 +18,14 @@ class LeafNode(Node):
         self.__leaf_index = leaf_index
         self.__event_name = leaf_qitem.name
         self.__event_type = leaf_qitem.event_type
+        # leaves of other trees receiving the events accepted by this leaf instead of processing them themselves
+        self.__shared_leaves = []
 
     def get_leaves(self):
         return [self]
 
     def apply_formula(self, formula: Formula):
-        condition = formula.get_formula_of(self.__event_name)
+        condition = formula.get_formula_of({self.__event_name})
         if condition is not None:
             self._condition = condition
 
@@ -36,6 +38,13 @@ class LeafNode(Node):
         """
         return self.__event_type
 
+    def add_shared_leaf(self, leaf):
+        """
+        Registers a leaf of the same event type, name and condition (e.g., in another branch of a disjunction pattern),
+        to which the events accepted by this leaf are passed. The given leaf is not to receive any events directly.
+        """
+        self.__shared_leaves.append(leaf)
+
     def handle_event(self, event: Event):
         """
         Inserts the given event to this leaf.
@@ -48,9 +57,12 @@ class LeafNode(Node):
         if not self._condition.eval(binding):
             return
 
-        self.add_partial_match(PartialMatch([event]))
+        new_partial_match = PartialMatch([event])
+        self.add_partial_match(new_partial_match)
         if self._parent is not None:
             self._parent.handle_new_partial_match(self)
+        for leaf in self.__shared_leaves:
+            leaf.add_external_partial_match(new_partial_match)
 
     def create_storage_unit(self, storage_params: TreeStorageParameters, sorting_key: callable = None,
                             relation_op=None, equation_side=None, sort_by_first_timestamp=False):
@@ -0,0 +1,196 @@
+from datetime import timedelta, datetime
+from typing import List
+
+from base.Formula import Formula, TrueFormula
+from base.PatternStructure import QItem
+from evaluation.Nodes.LeafNode import LeafNode
+from evaluation.Nodes.Node import Node
+from evaluation.PartialMatch import PartialMatch, get_first_timestamp, get_last_timestamp, get_payload
+from evaluation.Storage import SortedStorage, UnsortedStorage, DefaultStorage, TreeStorageParameters
+from misc.Utils import find_partial_match_by_timestamp
+
+
+class NegationNode(Node):
+    """
+    A node filtering the partial matches of its subtree, such that no event of the negated type satisfying the
+    condition occurs within the forbidden time interval of a partial match:
+    - in a sequence, strictly between the arguments preceding and following the negated event in the pattern. If there
+      is no preceding argument, the interval starts a time window before the following one, and if there is no
+      following argument, it ends a time window after the preceding one.
+    - in a conjunction, strictly between the earliest and the latest events of the partial match.
+    The events of the negated type are collected by a dedicated leaf in the order of their arrival, serving as a time
+    index - each partial match is only checked against the events within its interval. The node is placed right above
+    the lowest subtree containing all the events defining the interval and the condition, such that blocked partial
+    matches are pruned before being joined with the rest of the pattern.
+    If the interval ends after the latest event of a partial match, the partial match is held at this node until the
+    interval is over, and is discarded as soon as a blocking event arrives. If such a node is not the root of the tree
+    (e.g., in a nested sequence), the partial matches of the rest of the tree are kept for an additional time window, so
+    that the held partial matches can still be combined with them once released.
+    """
+    def __init__(self, sliding_window: timedelta, parent: Node, negated_index: int, negated_qitem: QItem,
+                 is_sequence: bool, previous_indices: List[int] = None, next_indices: List[int] = None):
+        super().__init__(sliding_window, parent)
+        self.__is_sequence = is_sequence
+        # the leaves of the arguments preceding and following the negated event (a nested operator has several leaves)
+        self.__previous_indices = previous_indices
+        self.__next_indices = next_indices
+        self.__negated_name = negated_qitem.name
+        # without a preceding event, the negated events may precede the partial match by up to two time windows
+        leaf_window = sliding_window
+        if is_sequence and previous_indices is None and sliding_window != timedelta.max:
+            leaf_window = 2 * sliding_window
+        self.__negative_leaf = LeafNode(leaf_window, negated_index, negated_qitem, self)
+        self.__negation_condition = TrueFormula()
+        self.__subtree = None
+        self.__previous_positions = self.__next_positions = None
+        self.__pending_partial_matches = []
+
+    def set_subtree(self, subtree: Node):
+        """
+        Sets the subtree whose partial matches are filtered by this node.
+        """
+        self.__subtree = subtree
+        positions = {event_def[0]: position for position, event_def in enumerate(subtree.get_event_definitions())}
+        if self.__previous_indices is not None:
+            self.__previous_positions = [positions[index] for index in self.__previous_indices]
+        if self.__next_indices is not None:
+            self.__next_positions = [positions[index] for index in self.__next_indices]
+
+    def set_negation_condition(self, formula: Formula):
+        """
+        Sets the condition to be satisfied by a negated event in order to block a partial match. The given formula
+        may refer to the negated event and to the events of the subtree. Only the conditions referring to the negated
+        event are kept, as the partial matches of the subtree already satisfy the rest.
+        """
+        positive_names = {event_def[1].name for event_def in self.get_event_definitions()}
+        names = positive_names | {self.__negated_name}
+        condition = formula.get_residual_formula_of(names, [positive_names]) if formula is not None else None
+        self.__negation_condition = condition if condition is not None else TrueFormula()
+        self.__negative_leaf.apply_formula(formula if formula is not None else TrueFormula())
+
+    def get_leaves(self):
+        return self.__subtree.get_leaves() + [self.__negative_leaf]
+
+    def apply_formula(self, formula: Formula):
+        self.__subtree.apply_formula(formula)
+
+    def get_event_definitions(self):
+        return self.__subtree.get_event_definitions()
+
+    def set_selection_state(self, selection_state):
+        super().set_selection_state(selection_state)
+        self.__subtree.set_selection_state(selection_state)
+
+    def delay_expiration(self, delay: timedelta):
+        super().delay_expiration(delay)
+        self.__subtree.delay_expiration(delay)
+        self.__negative_leaf.delay_expiration(delay)
+
+    def may_hold_partial_matches(self):
+        """
+        Returns True if the forbidden interval of a partial match may end after its latest event, in which case the
+        partial match is held at this node (for up to a time window).
+        """
+        return self.__is_sequence and self.__next_indices is None and self._sliding_window != timedelta.max
+
+    def has_pending_partial_matches(self):
+        return len(self.__pending_partial_matches) > 0
+
+    def handle_new_partial_match(self, partial_match_source: Node):
+        new_partial_match = partial_match_source.get_last_unhandled_partial_match()
+        if partial_match_source == self.__negative_leaf:
+            # a negated event arrived - discard the held partial matches it blocks
+            negated_event = new_partial_match.events[0]
+            self.__pending_partial_matches = [pm for pm in self.__pending_partial_matches
+                                              if not self.__is_blocked_by(pm, negated_event)]
+            return
+        self.clean_expired_partial_matches(new_partial_match.last_timestamp)
+        if self.__is_blocked(new_partial_match):
+            return
+        if self.__get_interval_end(new_partial_match) > new_partial_match.last_timestamp:
+            self.__pending_partial_matches.append(new_partial_match)
+            return
+        self.__accept(new_partial_match)
+
+    def release_pending_partial_matches(self, timestamp: datetime = None):
+        """
+        Accepts the held partial matches whose forbidden intervals are over at the given time, or all of them if no
+        time is given (i.e., at the end of the stream).
+        """
+        if len(self.__pending_partial_matches) == 0:
+            return
+        still_pending = []
+        for pm in self.__pending_partial_matches:
+            if timestamp is None or self.__get_interval_end(pm) <= timestamp:
+                self.__accept(pm)
+            else:
+                still_pending.append(pm)
+        self.__pending_partial_matches = still_pending
+
+    def create_storage_unit(self, storage_params: TreeStorageParameters, sorting_key: callable = None,
+                            relation_op=None, equation_side=None, sort_by_first_timestamp=False):
+        if storage_params is None or not storage_params.sort_storage:
+            self._partial_matches = DefaultStorage()
+        elif sorting_key is None:
+            self._partial_matches = UnsortedStorage(storage_params.clean_expired_every)
+        else:
+            self._partial_matches = SortedStorage(sorting_key, relation_op, equation_side,
+                                                  storage_params.clean_expired_every, sort_by_first_timestamp)
+        self.__subtree.create_storage_unit(storage_params)
+        # the negated events must be kept in the order of their timestamps
+        self.__negative_leaf.create_storage_unit(None)
+
+    def __accept(self, pm: PartialMatch):
+        self.add_partial_match(pm)
+        if self._parent is not None:
+            self._parent.handle_new_partial_match(self)
+
+    def __is_blocked(self, pm: PartialMatch):
+        """
+        Returns True if a stored negated event blocks the given partial match.
+        """
+        start, end = self.__get_interval_start(pm), self.__get_interval_end(pm)
+        negated_events = self.__negative_leaf.get_partial_matches(None)
+        index = find_partial_match_by_timestamp(negated_events, start)
+        while index < len(negated_events) and negated_events[index].first_timestamp < end:
+            if self.__is_blocked_by(pm, negated_events[index].events[0]):
+                return True
+            index += 1
+        return False
+
+    def __is_blocked_by(self, pm: PartialMatch, negated_event):
+        if not self.__get_interval_start(pm) < negated_event.timestamp < self.__get_interval_end(pm):
+            return False
+        event_defs = self.get_event_definitions()
+        binding = {event_defs[i][1].name: get_payload(pm.events[i]) for i in range(len(event_defs))}
+        binding[self.__negated_name] = negated_event.payload
+        return self.__negation_condition.eval(binding)
+
+    def __get_interval_start(self, pm: PartialMatch):
+        if not self.__is_sequence:
+            return pm.first_timestamp
+        if self.__previous_positions is not None:
+            return max(get_last_timestamp(pm.events[position]) for position in self.__previous_positions)
+        return _subtract_window(self.__get_next_timestamp(pm), self._sliding_window)
+
+    def __get_interval_end(self, pm: PartialMatch):
+        if not self.__is_sequence:
+            return pm.last_timestamp
+        if self.__next_positions is not None:
+            return self.__get_next_timestamp(pm)
+        return _add_window(self.__get_interval_start(pm), self._sliding_window)
+
+    def __get_next_timestamp(self, pm: PartialMatch):
+        return min(get_first_timestamp(pm.events[position]) for position in self.__next_positions)
+
+
+def _add_window(timestamp: datetime, window: timedelta):
+    if window == timedelta.max:
+        return datetime.max
+    return timestamp + window
+
+
+def _subtract_window(timestamp: datetime, window: timedelta):
+    if window == timedelta.max:
+        return datetime.min
+    return timestamp - window
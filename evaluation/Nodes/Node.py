@@ -19,6 +19,10 @@ class Node(ABC):
         self._condition = TrueFormula()
         # matches that were not yet pushed to the parent for further processing
         self._unhandled_partial_matches = Queue()
+        # the state of the consumption policy of the pattern, if any
+        self._selection_state = None
+        # the time for which the partial matches are kept after the time window is over (see delay_expiration)
+        self._expiration_delay = timedelta(0)
 
     def consume_first_partial_match(self):
         """
@@ -53,7 +57,15 @@ class Node(ABC):
         """
         if self._sliding_window == timedelta.max:
             return
-        self._partial_matches.try_clean_expired_partial_matches(last_timestamp - self._sliding_window)
+        self._partial_matches.try_clean_expired_partial_matches(last_timestamp - self._sliding_window -
+                                                                self._expiration_delay)
+
+    def delay_expiration(self, delay: timedelta):
+        """
+        Keeps the partial matches of this subtree for the given time after they expire, such that they can still be
+        combined with partial matches arriving late (e.g., the ones held by a negation node below the root).
+        """
+        self._expiration_delay = delay
 
     def add_partial_match(self, pm: PartialMatch):
         """
@@ -66,6 +78,36 @@ class Node(ABC):
         if self._parent is not None:
             self._unhandled_partial_matches.put(pm)
 
+    def add_external_partial_match(self, pm: PartialMatch):
+        """
+        Registers a partial match that was created outside of this node (e.g., by a replica of this subtree running in
+        a different process) and propagates it to the parent of this node as if it was created here.
+        """
+        self.clean_expired_partial_matches(pm.last_timestamp)
+        self.add_partial_match(pm)
+        if self._parent is not None:
+            self._parent.handle_new_partial_match(self)
+
+    def remove_partial_matches(self, pms):
+        """
+        Removes the given partial matches from this node, e.g., the ones made unreachable by the consumption policy.
+        """
+        self._partial_matches.remove_partial_matches(pms)
+
+    def can_combine_partial_matches_of(self, partial_match_source, timestamp: datetime):
+        """
+        Returns False if a partial match created by the given child of this node at the given time cannot currently be
+        combined into a new partial match, such that the child may refrain from creating it. The partial matches of a
+        node which are not propagated to its parent are created on demand (see KleeneClosureNode).
+        """
+        return True
+
+    def set_selection_state(self, selection_state):
+        """
+        Sets the state of the consumption policy applied by all nodes in this tree.
+        """
+        self._selection_state = selection_state
+
     def get_partial_matches(self, value_of_new_pm):
         """
         Returns only partial matches that can be a good fit according the the new partial match received
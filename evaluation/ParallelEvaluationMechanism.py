@@ -0,0 +1,442 @@
+"""
+This file contains the implementations of evaluation mechanisms distributing the evaluation of a single pattern between
+multiple worker processes.
+Since pattern conditions are typically defined using lambda expressions which cannot be pickled, the worker processes
+are created using the "fork" start method and inherit their evaluation structures from the parent process.
+Only events and pattern matches are transferred between the processes.
+"""
+import bisect
+import multiprocessing
+from datetime import timedelta, datetime
+from queue import Empty
+from typing import List
+
+from base.Event import Event
+from base.PatternMatch import PatternMatch
+from evaluation.EvaluationMechanism import EvaluationMechanism
+from evaluation.Nodes.Node import Node
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.IOUtils import Stream
+
+
+class _InterProcessInputStream(Stream):
+    """
+    A stream of events received in batches from a multiprocessing queue. A batch of None closes the stream.
+    """
+    def __init__(self, source_queue):
+        super().__init__()
+        self.__source_queue = source_queue
+        self.__current_batch = []
+        self.__current_index = 0
+
+    def __next__(self):
+        while self.__current_index == len(self.__current_batch):
+            self.__current_batch = self.__source_queue.get(block=True)
+            self.__current_index = 0
+            if self.__current_batch is None:
+                self.__current_batch = []
+                raise StopIteration()
+        next_item = self.__current_batch[self.__current_index]
+        self.__current_index += 1
+        return next_item
+
+
+class _InterProcessOutputStream(Stream):
+    """
+    A stream of pattern matches forwarded in batches to a multiprocessing queue.
+    """
+    def __init__(self, target_queue, batch_size: int):
+        super().__init__()
+        self.__target_queue = target_queue
+        self.__batch_size = batch_size
+        self.__current_batch = []
+
+    def add_item(self, item: object):
+        self.__current_batch.append(item)
+        if len(self.__current_batch) >= self.__batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.__current_batch) > 0:
+            self.__target_queue.put(self.__current_batch)
+            self.__current_batch = []
+
+    def close(self):
+        self.flush()
+
+
+def _run_worker(eval_mechanism: EvaluationMechanism, input_queue, output_queue, batch_size: int):
+    """
+    The entry point of a worker process. Applies the given evaluation mechanism on the events arriving via the input
+    queue and sends the detected matches via the output queue, followed by None to signal termination.
+    An exception raised during evaluation is sent instead of the matches in order to be re-raised by the parent.
+    """
+    try:
+        eval_mechanism.eval(_InterProcessInputStream(input_queue), _InterProcessOutputStream(output_queue, batch_size))
+    except Exception as e:
+        output_queue.put(e)
+    finally:
+        output_queue.put(None)
+
+
+def _run_time_slices_worker(slices: list, output_queue):
+    """
+    The entry point of a worker process evaluating a group of time slices. Each slice is given as a tuple of the slice
+    index, an evaluation mechanism, the list of events and the time range owned by the slice. Only the matches whose
+    earliest event belongs to this range are reported, along with the index of the slice, followed by None to signal
+    termination.
+    """
+    try:
+        for slice_index, eval_mechanism, events, start_timestamp, end_timestamp in slices:
+            slice_events = Stream()
+            for event in events:
+                slice_events.add_item(event)
+            slice_events.close()
+            slice_matches = Stream()
+            eval_mechanism.eval(slice_events, slice_matches)
+            owned_matches = []
+            for match in slice_matches:
+                first_timestamp = min(event.timestamp for event in match.events)
+                if start_timestamp <= first_timestamp and (end_timestamp is None or first_timestamp < end_timestamp):
+                    owned_matches.append(match)
+            output_queue.put((slice_index, owned_matches))
+    except Exception as e:
+        output_queue.put(e)
+    finally:
+        output_queue.put(None)
+
+
+class _PartialMatchCollector:
+    """
+    Takes the place of the parent of a subtree evaluated by a worker process and collects the partial matches
+    reported by the subtree root.
+    """
+    def __init__(self):
+        self.partial_matches = []
+
+    def handle_new_partial_match(self, partial_match_source: Node):
+        self.partial_matches.append(partial_match_source.get_last_unhandled_partial_match())
+
+    def can_combine_partial_matches_of(self, partial_match_source: Node, timestamp: datetime):
+        # the partial matches are combined by the parent process
+        return True
+
+
+def _run_subtree_worker(subtree_root: Node, negation_nodes: List[Node], input_queue, output_queue):
+    """
+    The entry point of a worker process evaluating a single subtree of an evaluation tree.
+    The events arrive in batches of (event index, event) pairs. For each batch, a list of (event index, partial matches)
+    pairs is sent back, containing the partial matches created at the subtree root upon the arrival of each event.
+    The partial matches held by the given negation nodes of the subtree are released upon the arrival of each event as
+    in the sequential evaluation, and the ones still held at the end of the stream are sent in a final list, paired
+    with an index following all the events.
+    The worker terminates by sending None (preceded by the raised exception if the evaluation failed).
+    """
+    try:
+        collector = _PartialMatchCollector()
+        subtree_root.set_parent(collector)
+        event_types_listeners = {}
+        for leaf in subtree_root.get_leaves():
+            event_types_listeners.setdefault(leaf.get_event_type(), []).append(leaf)
+        for batch in iter(input_queue.get, None):
+            results = []
+            for event_index, event in batch:
+                if any(negation_node.has_pending_partial_matches() for negation_node in negation_nodes):
+                    # the nodes are released from the bottom up, such that a partial match may pass several of them
+                    for negation_node in reversed(negation_nodes):
+                        negation_node.release_pending_partial_matches(event.timestamp)
+                for leaf in event_types_listeners.get(event.event_type, []):
+                    leaf.handle_event(event)
+                if len(collector.partial_matches) > 0:
+                    results.append((event_index, collector.partial_matches))
+                    collector.partial_matches = []
+            output_queue.put(results)
+        for negation_node in reversed(negation_nodes):
+            negation_node.release_pending_partial_matches()
+        output_queue.put([(None, collector.partial_matches)] if len(collector.partial_matches) > 0 else [])
+    except Exception as e:
+        output_queue.put(e)
+    finally:
+        output_queue.put(None)
+
+
+class ParallelEvaluationMechanism(EvaluationMechanism):
+    """
+    An abstract class for evaluation mechanisms running a set of sequential evaluation mechanisms in worker processes.
+    At most max_pending_batches batches of events are queued for each worker - sending another batch blocks until the
+    worker catches up, such that a slow worker does not accumulate an unbounded backlog of events in memory.
+    """
+    def __init__(self, eval_mechanisms: List[EvaluationMechanism], batch_size: int, max_pending_batches: int = 4):
+        self._eval_mechanisms = eval_mechanisms
+        self._batch_size = batch_size
+        self._max_pending_batches = max_pending_batches
+        self._output_queue = None
+        self._active_workers_num = 0
+
+    def _start_workers(self):
+        """
+        Starts a worker process for each evaluation mechanism and returns the list of their input queues.
+        """
+        context = multiprocessing.get_context("fork")
+        self._output_queue = context.Queue()
+        input_queues = []
+        workers = []
+        for eval_mechanism in self._eval_mechanisms:
+            # the output queue is unbounded, hence a worker never blocks and always drains its input queue
+            input_queue = context.Queue(self._max_pending_batches)
+            worker = context.Process(target=_run_worker,
+                                     args=(eval_mechanism, input_queue, self._output_queue, self._batch_size),
+                                     daemon=True)
+            worker.start()
+            input_queues.append(input_queue)
+            workers.append(worker)
+        self._active_workers_num = len(workers)
+        return input_queues, workers
+
+    def _forward_matches(self, matches: Stream, block: bool):
+        """
+        Moves the matches reported by the workers so far to the given output stream.
+        If block is True, waits until all workers terminate.
+        """
+        while self._active_workers_num > 0:
+            try:
+                message = self._output_queue.get(block=block)
+            except Empty:
+                return
+            if message is None:
+                self._active_workers_num -= 1
+            elif isinstance(message, Exception):
+                raise message
+            else:
+                for match in message:
+                    matches.add_item(match)
+
+
+class PartitionedEvaluationMechanism(ParallelEvaluationMechanism):
+    """
+    Hashes the incoming events by a user-specified partitioning attribute and evaluates each partition in a separate
+    worker process running its own copy of the evaluation mechanism.
+    """
+    def __init__(self, eval_mechanisms: List[EvaluationMechanism], partition_key: callable, batch_size: int,
+                 max_pending_batches: int = 4):
+        super().__init__(eval_mechanisms, batch_size, max_pending_batches)
+        self.__partition_key = partition_key
+
+    def eval(self, events: Stream, matches: Stream):
+        input_queues, workers = self._start_workers()
+        workers_num = len(workers)
+        batches = [[] for _ in range(workers_num)]
+        for event in events:
+            worker_index = hash(self.__partition_key(event.payload)) % workers_num
+            batches[worker_index].append(event)
+            if len(batches[worker_index]) >= self._batch_size:
+                input_queues[worker_index].put(batches[worker_index])
+                batches[worker_index] = []
+                self._forward_matches(matches, block=False)
+
+        for i in range(workers_num):
+            if len(batches[i]) > 0:
+                input_queues[i].put(batches[i])
+            input_queues[i].put(None)
+        self._forward_matches(matches, block=True)
+        for worker in workers:
+            worker.join()
+        matches.close()
+
+
+class TimeSlicedEvaluationMechanism(EvaluationMechanism):
+    """
+    Splits a finite (e.g., historical) stream of events into contiguous time slices and evaluates each slice in a
+    separate worker process. Each slice is extended by the time window of the pattern, such that matches crossing the
+    slice boundary are detected as well. Every match is reported by exactly one slice, namely the one owning the
+    timestamp of its earliest event.
+    If the pattern contains negated events, a match may be blocked by an event occurring up to a time window before
+    its earliest event (a leading negation) or up to two time windows after it (a trailing negation, whose interval
+    starts at the latest event of the match). In this case, each slice is extended accordingly in both directions.
+    The events are assumed to arrive in the ascending order of their timestamps.
+    """
+    def __init__(self, eval_mechanisms: List[EvaluationMechanism], window: timedelta, workers_num: int,
+                 has_negation: bool = False):
+        self.__eval_mechanisms = eval_mechanisms
+        self.__window = window
+        self.__workers_num = workers_num
+        self.__margin_before = window if has_negation else timedelta(0)
+        self.__margin_after = 2 * window if has_negation else window
+
+    def eval(self, events: Stream, matches: Stream):
+        all_events = list(events)
+        slices = self.__create_slices(all_events)
+        context = multiprocessing.get_context("fork")
+        output_queue = context.Queue()
+        workers = []
+        for i in range(min(self.__workers_num, len(slices))):
+            worker = context.Process(target=_run_time_slices_worker,
+                                     args=(slices[i::self.__workers_num], output_queue), daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        # the matches are reported in the order of the slices, regardless of the order of their completion
+        matches_by_slice = {}
+        active_workers_num = len(workers)
+        while active_workers_num > 0:
+            message = output_queue.get(block=True)
+            if message is None:
+                active_workers_num -= 1
+            elif isinstance(message, Exception):
+                raise message
+            else:
+                slice_index, slice_matches = message
+                matches_by_slice[slice_index] = slice_matches
+        for worker in workers:
+            worker.join()
+        for slice_index in sorted(matches_by_slice.keys()):
+            for match in matches_by_slice[slice_index]:
+                matches.add_item(match)
+        matches.close()
+
+    def __create_slices(self, events: List[Event]):
+        """
+        Divides the given events into slices containing a roughly equal number of events. Returns a list of tuples of
+        the form (slice index, evaluation mechanism, slice events, owned range start, owned range end).
+        Slice boundaries are always placed between events with distinct timestamps.
+        """
+        if len(events) == 0:
+            return []
+        slices_num = len(self.__eval_mechanisms)
+        if self.__window == timedelta.max:
+            # no overlap can be guaranteed for an unbounded time window
+            slices_num = 1
+        timestamps = [event.timestamp for event in events]
+        boundaries = [timestamps[0]]
+        for i in range(1, slices_num):
+            boundary = timestamps[i * len(events) // slices_num]
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        slices = []
+        for i in range(len(boundaries)):
+            start_index = bisect.bisect_left(timestamps, boundaries[i] - self.__margin_before)
+            if i + 1 < len(boundaries):
+                end_timestamp = boundaries[i + 1]
+                end_index = bisect.bisect_right(timestamps, end_timestamp + self.__margin_after)
+            else:
+                end_timestamp = None
+                end_index = len(events)
+            slices.append((i, self.__eval_mechanisms[i], events[start_index:end_index], boundaries[i], end_timestamp))
+        return slices
+
+
+class OperatorParallelEvaluationMechanism(EvaluationMechanism):
+    """
+    Evaluates the independent subtrees located at a given depth of an evaluation tree (e.g., a bushy tree) in separate
+    worker processes, while the nodes above them join the partial matches received from the workers.
+    To produce exactly the matches of the sequential evaluation, the partial matches are joined in the order of the
+    events that triggered their creation, and the subtrees are visited from left to right for every such event,
+    which is the order in which the sequential tree processes them.
+    A worker whose subtree contains a negation node holding partial matches receives all the events, as each of them
+    may end the forbidden intervals of the held partial matches, and releases the remaining ones at the end of the
+    stream.
+    """
+    def __init__(self, eval_mechanism: TreeBasedEvaluationMechanism, parallel_depth: int, batch_size: int,
+                 max_batches_in_flight: int = 4):
+        if not isinstance(eval_mechanism, TreeBasedEvaluationMechanism):
+            raise Exception("Operator-level parallelism is only supported for tree-based evaluation mechanisms")
+        if eval_mechanism.get_tree().has_consumption_policy():
+            # the workers would apply the policy to their subtrees without seeing the events and the matches of the
+            # other ones
+            raise Exception("Consumption policies are not supported by operator-level parallel execution")
+        self.__eval_mechanism = eval_mechanism
+        self.__tree = eval_mechanism.get_tree()
+        self.__subtrees = self.__tree.get_subtrees_at_depth(parallel_depth)
+        self.__batch_size = batch_size
+        self.__max_batches_in_flight = max_batches_in_flight
+
+    def eval(self, events: Stream, matches: Stream):
+        if len(self.__subtrees) == 1:
+            # the tree consists of a single leaf - nothing to parallelize
+            self.__eval_mechanism.eval(events, matches)
+            return
+
+        context = multiprocessing.get_context("fork")
+        subtrees_negation_nodes = [self.__get_negation_nodes(subtree) for subtree in self.__subtrees]
+        # a subtree holding partial matches receives all the events, which determine when they are released
+        subtrees_event_types = [None if any(node.may_hold_partial_matches() for node in negation_nodes) else
+                                {leaf.get_event_type() for leaf in subtree.get_leaves()}
+                                for subtree, negation_nodes in zip(self.__subtrees, subtrees_negation_nodes)]
+        input_queues, output_queues, workers = [], [], []
+        for subtree, negation_nodes in zip(self.__subtrees, subtrees_negation_nodes):
+            input_queue, output_queue = context.Queue(), context.Queue()
+            worker = context.Process(target=_run_subtree_worker,
+                                     args=(subtree, negation_nodes, input_queue, output_queue), daemon=True)
+            worker.start()
+            input_queues.append(input_queue)
+            output_queues.append(output_queue)
+            workers.append(worker)
+
+        batches_in_flight = 0
+        batches = [[] for _ in self.__subtrees]
+        for event_index, event in enumerate(events):
+            for i in range(len(self.__subtrees)):
+                if subtrees_event_types[i] is None or event.event_type in subtrees_event_types[i]:
+                    batches[i].append((event_index, event))
+            if event_index % self.__batch_size == self.__batch_size - 1:
+                self.__send_batches(batches, input_queues)
+                batches = [[] for _ in self.__subtrees]
+                batches_in_flight += 1
+                if batches_in_flight > self.__max_batches_in_flight:
+                    self.__join_next_batch(output_queues, matches)
+                    batches_in_flight -= 1
+        self.__send_batches(batches, input_queues)
+        batches_in_flight += 1
+        for input_queue in input_queues:
+            input_queue.put(None)
+        # the last message of each worker before its termination contains the partial matches held until the end of
+        # the stream
+        for _ in range(batches_in_flight + 1):
+            self.__join_next_batch(output_queues, matches)
+        for match in self.__eval_mechanism.flush_pending_matches():
+            matches.add_item(match)
+        for output_queue in output_queues:
+            # consume the termination message of the worker
+            OperatorParallelEvaluationMechanism.__get_worker_message(output_queue)
+        for worker in workers:
+            worker.join()
+        matches.close()
+
+    def __get_negation_nodes(self, subtree: Node):
+        """
+        Returns the negation nodes of the given subtree, each preceding the negation nodes below it.
+        """
+        leaves = set(subtree.get_leaves())
+        return [node for node in self.__tree.get_negation_nodes() if leaves.issuperset(node.get_leaves())]
+
+    @staticmethod
+    def __send_batches(batches: list, input_queues: list):
+        """
+        Sends the next batch of events to each worker. Empty batches are sent as well, to keep the workers in sync.
+        """
+        for i in range(len(batches)):
+            input_queues[i].put(batches[i])
+
+    def __join_next_batch(self, output_queues: list, matches: Stream):
+        """
+        Receives the partial matches created by the workers for their next batch of events, propagates them through
+        the upper part of the tree in the order of the events which created them, and reports the resulting matches.
+        """
+        partial_matches_by_event = {}
+        for i in range(len(output_queues)):
+            results = OperatorParallelEvaluationMechanism.__get_worker_message(output_queues[i])
+            for event_index, partial_matches in results:
+                partial_matches_by_event.setdefault(event_index, []).append((i, partial_matches))
+        for event_index in sorted(partial_matches_by_event.keys()):
+            for subtree_index, partial_matches in partial_matches_by_event[event_index]:
+                for partial_match in partial_matches:
+                    self.__subtrees[subtree_index].add_external_partial_match(partial_match)
+                    for match in self.__tree.get_matches():
+                        matches.add_item(PatternMatch(match))
+
+    @staticmethod
+    def __get_worker_message(output_queue):
+        message = output_queue.get(block=True)
+        if isinstance(message, Exception):
+            raise message
+        return message
@@ -0,0 +1,102 @@
+from enum import Enum
+import multiprocessing
+
+from base.Pattern import Pattern
+from evaluation.ParallelEvaluationMechanism import PartitionedEvaluationMechanism, TimeSlicedEvaluationMechanism, \
+    OperatorParallelEvaluationMechanism
+
+
+class ParallelExecutionModes(Enum):
+    """
+    The various strategies for distributing the evaluation of a pattern between multiple worker processes.
+    """
+    KEY_PARTITIONED = 0
+    TIME_SLICED = 1
+    OPERATOR_PARALLEL = 2
+
+
+class ParallelExecutionParameters:
+    """
+    Parameters for the parallel execution of an evaluation mechanism.
+    """
+    def __init__(self, mode: ParallelExecutionModes, workers_num: int = None):
+        self.mode = mode
+        self.workers_num = workers_num if workers_num is not None else multiprocessing.cpu_count()
+
+
+class KeyPartitionedExecutionParameters(ParallelExecutionParameters):
+    """
+    Parameters for key-partitioned execution include the function extracting the partitioning attribute from an event
+    payload (e.g., lambda x: x["Stock Ticker"]) and the number of events shipped to a worker at once.
+    It is the responsibility of the user to only partition patterns whose matches never contain events with different
+    partitioning keys (e.g., patterns whose condition equates the partitioning attribute across all events).
+    """
+    def __init__(self, partition_key: callable, workers_num: int = None, batch_size: int = 1000):
+        super().__init__(ParallelExecutionModes.KEY_PARTITIONED, workers_num)
+        self.partition_key = partition_key
+        self.batch_size = batch_size
+
+
+class TimeSlicedExecutionParameters(ParallelExecutionParameters):
+    """
+    Parameters for time-sliced execution of a finite stream (e.g., a historical backtest) include the number of time
+    slices to split the stream into. By default, a single slice is created for each worker.
+    """
+    def __init__(self, workers_num: int = None, slices_num: int = None):
+        super().__init__(ParallelExecutionModes.TIME_SLICED, workers_num)
+        self.slices_num = slices_num if slices_num is not None else self.workers_num
+
+
+class OperatorParallelExecutionParameters(ParallelExecutionParameters):
+    """
+    Parameters for operator-level parallel execution include the depth of the evaluation tree at which the subtrees
+    are assigned to worker processes (a depth of 1 evaluates the two subtrees of the root in parallel) and the number of
+    events shipped to the workers at once. The number of workers is determined by the number of subtrees found at the
+    given depth.
+    """
+    def __init__(self, parallel_depth: int = 1, batch_size: int = 100):
+        if parallel_depth < 1:
+            raise Exception("Parallel depth must be at least 1")
+        super().__init__(ParallelExecutionModes.OPERATOR_PARALLEL, 2 ** parallel_depth)
+        self.parallel_depth = parallel_depth
+        self.batch_size = batch_size
+
+
+class ParallelEvaluationMechanismFactory:
+    """
+    Creates a parallel evaluation mechanism given its specification.
+    """
+    @staticmethod
+    def build_parallel_eval_mechanism(parallel_execution_params: ParallelExecutionParameters,
+                                      eval_mechanism_factory: callable, pattern: Pattern):
+        """
+        Builds a parallel evaluation mechanism according to the given parameters. The eval_mechanism_factory
+        argument is a function receiving no arguments and returning a new sequential evaluation mechanism; it is
+        invoked once for each worker requiring its own copy of the evaluation structures.
+        """
+        if parallel_execution_params.mode in (ParallelExecutionModes.KEY_PARTITIONED,
+                                              ParallelExecutionModes.TIME_SLICED) and \
+                pattern.consumption_policy is not None and pattern.consumption_policy.is_restrictive():
+            # the matches discarded by a policy depend on the events and the matches outside the partition or the slice
+            raise Exception("Consumption policies are not supported by %s execution" %
+                            (parallel_execution_params.mode.name.lower().replace("_", "-"),))
+        if parallel_execution_params.mode == ParallelExecutionModes.KEY_PARTITIONED:
+            return PartitionedEvaluationMechanism(
+                [eval_mechanism_factory() for _ in range(parallel_execution_params.workers_num)],
+                parallel_execution_params.partition_key,
+                parallel_execution_params.batch_size,
+            )
+        if parallel_execution_params.mode == ParallelExecutionModes.TIME_SLICED:
+            return TimeSlicedEvaluationMechanism(
+                [eval_mechanism_factory() for _ in range(parallel_execution_params.slices_num)],
+                pattern.window,
+                parallel_execution_params.workers_num,
+                pattern.has_negation(),
+            )
+        if parallel_execution_params.mode == ParallelExecutionModes.OPERATOR_PARALLEL:
+            return OperatorParallelEvaluationMechanism(
+                eval_mechanism_factory(),
+                parallel_execution_params.parallel_depth,
+                parallel_execution_params.batch_size,
+            )
+        raise Exception("Unknown parallel execution mode: %s" % (parallel_execution_params.mode,))
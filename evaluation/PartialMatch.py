@@ -6,13 +6,45 @@ from base.Event import Event
 class PartialMatch:
     """
     A partial match created at some intermediate stage during evaluation.
+    Each item of a partial match is either a primitive event or a nested partial match containing the events bound to
+    a Kleene closure.
     """
     def __init__(self, events: List[Event]):
         self.events = events
-        self.last_timestamp = max(events, key=lambda x: x.timestamp).timestamp
-        self.first_timestamp = min(events, key=lambda x: x.timestamp).timestamp
+        self.last_timestamp = max(get_last_timestamp(item) for item in events)
+        self.first_timestamp = min(get_first_timestamp(item) for item in events)
+
+    def get_primitive_events(self):
+        """
+        Returns the primitive events of this partial match, replacing each nested partial match with its events.
+        """
+        primitive_events = []
+        for item in self.events:
+            if isinstance(item, PartialMatch):
+                primitive_events.extend(item.get_primitive_events())
+            else:
+                primitive_events.append(item)
+        return primitive_events
 
     def __repr__(self):
         return "PartialMatch with events={}, first_timestamp={}, last_timestamp={}".format(
             self.events, self.first_timestamp, self.last_timestamp
         )
+
+
+def get_first_timestamp(item: Event or PartialMatch):
+    return item.first_timestamp if isinstance(item, PartialMatch) else item.timestamp
+
+
+def get_last_timestamp(item: Event or PartialMatch):
+    return item.last_timestamp if isinstance(item, PartialMatch) else item.timestamp
+
+
+def get_payload(item: Event or PartialMatch):
+    """
+    Returns the value bound to the name of the given partial match item in a condition: the payload of a primitive
+    event, or the list of the payloads of the events bound to a Kleene closure.
+    """
+    if isinstance(item, PartialMatch):
+        return [event.payload for event in item.events]
+    return item.payload
@@ -0,0 +1,99 @@
+"""
+This file contains a cache of evaluation tree structures, allowing to skip the tree construction algorithms when a
+pattern is evaluated again with the same statistics.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from base.Pattern import Pattern
+from evaluation.EvaluationMechanismBuilder import EvaluationMechanismBuilder
+from misc.StatisticsCatalog import get_condition_fingerprint
+
+
+class PlanCache:
+    """
+    Stores the tree structures created by the tree builders for the recently evaluated patterns, evicting the least
+    recently used ones once max_size structures are stored.
+    A structure is identified by the structure, the condition fingerprint and the time window of the pattern, by a key
+    identifying the builder (its type and parameters) and by the statistics of the pattern rounded to the given number
+    of significant digits, such that negligible changes in the statistics do not invalidate the cached structures.
+    If a persistence path is specified, the cache is loaded from this file on creation and written back on each change.
+    """
+    def __init__(self, max_size: int = 128, persistence_path: str = None, statistics_precision: int = 3):
+        if max_size < 1:
+            raise Exception("Plan cache size must be positive")
+        self.__max_size = max_size
+        self.__persistence_path = persistence_path
+        self.__statistics_precision = statistics_precision
+        self.__tree_structures = OrderedDict()
+        if persistence_path is not None and os.path.exists(persistence_path):
+            with open(persistence_path) as cache_file:
+                for key, tree_structure in json.load(cache_file):
+                    self.__tree_structures[key] = PlanCache.__list_to_tree_structure(tree_structure)
+            while len(self.__tree_structures) > max_size:
+                self.__tree_structures.popitem(last=False)
+        self.__hits = self.__misses = 0
+
+    def get_tree_structure(self, pattern: Pattern, builder: EvaluationMechanismBuilder, builder_key: str):
+        """
+        Returns the tree structure created by the given builder for the given pattern, invoking the builder only if no
+        such structure is cached.
+        """
+        key = self.__get_key(pattern, builder_key)
+        if key in self.__tree_structures:
+            self.__hits += 1
+            self.__tree_structures.move_to_end(key)
+            return self.__tree_structures[key]
+        self.__misses += 1
+        tree_structure = builder.create_tree_structure(pattern)
+        self.__tree_structures[key] = tree_structure
+        if len(self.__tree_structures) > self.__max_size:
+            self.__tree_structures.popitem(last=False)
+        self.__save()
+        return tree_structure
+
+    def get_hits(self):
+        return self.__hits
+
+    def get_misses(self):
+        return self.__misses
+
+    def __len__(self):
+        return len(self.__tree_structures)
+
+    def __get_key(self, pattern: Pattern, builder_key: str):
+        key = "%s|%s|%s|%s|%s|%s" % (pattern.structure, get_condition_fingerprint(pattern.condition), pattern.window,
+                                     builder_key, pattern.statistics_type.name,
+                                     self.__quantize(pattern.statistics))
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def __quantize(self, statistics):
+        """
+        Rounds all the numbers contained in the given statistics to the configured number of significant digits.
+        """
+        if isinstance(statistics, float):
+            return float("%.*g" % (self.__statistics_precision, statistics))
+        if isinstance(statistics, (list, tuple)):
+            return [self.__quantize(item) for item in statistics]
+        if isinstance(statistics, dict):
+            return sorted((key, self.__quantize(value)) for key, value in statistics.items())
+        return statistics
+
+    def __save(self):
+        if self.__persistence_path is None:
+            return
+        temp_path = self.__persistence_path + ".tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(list(self.__tree_structures.items()), cache_file)
+        os.replace(temp_path, self.__persistence_path)
+
+    @staticmethod
+    def __list_to_tree_structure(tree_structure):
+        """
+        Restores the tuples of a tree structure read from a JSON file, where they are stored as lists.
+        """
+        if type(tree_structure) == int:
+            return tree_structure
+        return tuple(PlanCache.__list_to_tree_structure(subtree) for subtree in tree_structure)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from datetime import timedelta, datetime
+
+from base.Event import Event
+from evaluation.PartialMatch import PartialMatch
+from misc.ConsumptionPolicy import ConsumptionPolicy, SelectionStrategies
+
+
+class SelectionState:
+    """
+    The state required for applying a consumption policy during the evaluation of a single tree: the events consumed
+    by the detected matches and the arrival indices of the events, which are both kept for a time window.
+    """
+    def __init__(self, consumption_policy: ConsumptionPolicy, sliding_window: timedelta):
+        self.__sliding_window = sliding_window
+        self.__match_next = consumption_policy.selection_strategy == SelectionStrategies.MATCH_NEXT
+        self.__match_single = consumption_policy.selection_strategy == SelectionStrategies.MATCH_SINGLE
+        self.__strict_contiguity = consumption_policy.strict_contiguity
+        # both are ordered by the arrival of the events
+        self.__consumed_events = OrderedDict()
+        self.__event_indices = OrderedDict()
+        self.__events_count = 0
+
+    def is_match_next(self):
+        """
+        Returns True if a partial match is to be combined at most once at each node.
+        """
+        return self.__match_next
+
+    def register_event(self, event: Event):
+        """
+        Records the arrival of the given event.
+        """
+        if self.__sliding_window != timedelta.max:
+            self.__remove_expired(self.__consumed_events, event.timestamp - self.__sliding_window)
+            self.__remove_expired(self.__event_indices, event.timestamp - self.__sliding_window)
+        if self.__strict_contiguity:
+            self.__event_indices[event] = self.__events_count
+        self.__events_count += 1
+
+    def is_consumed(self, pm: PartialMatch):
+        """
+        Returns True if the given partial match contains an event consumed by a previously detected match.
+        """
+        if not self.__match_single or len(self.__consumed_events) == 0:
+            return False
+        return any(event in self.__consumed_events for event in pm.get_primitive_events())
+
+    def try_consume(self, events):
+        """
+        Marks the events of a detected match as consumed. Returns False if the match is to be discarded since some of
+        its events were already consumed.
+        """
+        if not self.__match_single:
+            return True
+        if any(event in self.__consumed_events for event in events):
+            return False
+        for event in events:
+            self.__consumed_events[event] = event.timestamp
+        return True
+
+    def are_contiguous(self, first_item: Event or PartialMatch, second_item: Event or PartialMatch):
+        """
+        Returns True if the given partial match items are matched by consecutive events, or if strict contiguity is not
+        required. Only the events within the time window are indexed, which suffices for the partial matches being
+        joined upon the arrival of a new event.
+        """
+        if not self.__strict_contiguity:
+            return True
+        last_event = first_item.events[-1] if isinstance(first_item, PartialMatch) else first_item
+        first_event = second_item.events[0] if isinstance(second_item, PartialMatch) else second_item
+        return self.__event_indices[first_event] == self.__event_indices[last_event] + 1
+
+    @staticmethod
+    def __remove_expired(events: OrderedDict, timestamp: datetime):
+        while len(events) > 0:
+            event = next(iter(events))
+            if event.timestamp >= timestamp:
+                return
+            del events[event]
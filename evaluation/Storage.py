@@ -1,6 +1,6 @@
 from abc import abstractmethod
 from collections.abc import MutableSequence
-from itertools import chain
+from itertools import chain, combinations
 import bisect
 from misc.Utils import get_first_index, get_last_index
 from datetime import datetime, timedelta
@@ -52,6 +52,14 @@ class Storage(MutableSequence):
             return NotImplemented
         return self._container + rhs._container
 
+    def remove_partial_matches(self, pms):
+        """
+        Removes the given partial matches (compared by identity) from the storage. The container is replaced rather
+        than modified, such that the partial matches previously returned by get() can still be safely iterated.
+        """
+        ids = {id(pm) for pm in pms}
+        self._container = [pm for pm in self._container if id(pm) not in ids]
+
     
 
 class SortedStorage(Storage):
@@ -215,6 +223,97 @@ class UnsortedStorage(Storage):
             self._container = list(filter(lambda pm: pm.first_timestamp >= timestamp, self._container))
 
 
+class KleeneClosureStorage(Storage):
+    """
+    This class stores the events accepted by a Kleene closure node. The partial matches of the node are the sets of
+    stored events occurring within the time window whose sizes are within the given bounds and which satisfy the given
+    validity function (the condition of the closure, applied to a list of events). They are enumerated lazily, only
+    when first requested, and the valid ones are cached along with their latest event, such that the condition is
+    evaluated at most once per set.
+    A cached set is represented by a bitmask over the events preceding its latest event (the i-th bit standing for the
+    (i+1)-th preceding event), and the partial matches are only created when they are requested.
+    """
+    def __init__(self, sliding_window: timedelta, min_size: int, max_size: int, key: callable = None,
+                 is_valid: callable = None):
+        self._container = []  # the accepted events, in the order of their arrival
+        # for each stored event, the bitmasks of the valid sets ending at it, or None if they were not yet enumerated
+        self._masks_by_event = []
+        self._key = key if key is not None else (lambda x: x)
+        self._sliding_window = sliding_window
+        self._min_size = min_size
+        self._max_size = max_size
+        self._is_valid = is_valid if is_valid is not None else (lambda events: True)
+
+    def add(self, event):
+        self._container.append(event)
+        self._masks_by_event.append(None)
+
+    def get(self, value):
+        """
+        Returns all the partial matches, as the storage is not sorted.
+        """
+        return chain.from_iterable(self.get_partial_matches_ending_at(index) for index in range(len(self._container)))
+
+    def get_partial_matches_ending_at(self, index: int):
+        """
+        A generator for the valid partial matches whose latest event is the one stored at the given index. Each partial
+        match contains a single item - a nested partial match of its events.
+        """
+        # the stored events are replaced rather than modified upon expiration, hence they can be safely referred to
+        events = self._container
+        for mask in self.__get_valid_masks(index):
+            # a set containing an event which expired after the set was enumerated is skipped
+            if mask.bit_length() <= index:
+                yield PartialMatch([PartialMatch(KleeneClosureStorage.__get_events(events, index, mask))])
+
+    def __get_valid_masks(self, index: int):
+        masks = self._masks_by_event[index]
+        if masks is None:
+            masks = [mask for mask in self.__enumerate_masks(index)
+                     if self._is_valid(KleeneClosureStorage.__get_events(self._container, index, mask))]
+            self._masks_by_event[index] = masks
+        return masks
+
+    def __enumerate_masks(self, index: int):
+        last_event = self._container[index]
+        first_index = index
+        if self._sliding_window != timedelta.max:
+            while first_index > 0 and \
+                    last_event.timestamp - self._container[first_index - 1].timestamp <= self._sliding_window:
+                first_index -= 1
+        else:
+            first_index = 0
+        candidates_num = index - first_index
+        max_size = candidates_num if self._max_size is None else min(candidates_num, self._max_size - 1)
+        for size in range(self._min_size - 1, max_size + 1):
+            # the earlier events are chosen first, as in the order of the events
+            for positions in combinations(range(candidates_num - 1, -1, -1), size):
+                yield sum(1 << position for position in positions)
+
+    @staticmethod
+    def __get_events(events: list, index: int, mask: int):
+        """
+        Returns the events of the set ending at the given index and represented by the given bitmask, in the order of
+        their arrival.
+        """
+        return [events[index - 1 - position] for position in range(mask.bit_length() - 1, -1, -1)
+                if mask >> position & 1] + [events[index]]
+
+    def remove_partial_matches(self, pms):
+        """
+        The partial matches are cached per event rather than stored, hence they are not removed.
+        """
+        pass
+
+    def try_clean_expired_partial_matches(self, timestamp: datetime):
+        count = 0
+        while count < len(self._container) and self._container[count].timestamp < timestamp:
+            count += 1
+        if count > 0:
+            self._container = self._container[count:]
+            self._masks_by_event = self._masks_by_event[count:]
+
+
 class TreeStorageParameters:
     """
     Parameters for the evaluation tree to specify how to store the data.
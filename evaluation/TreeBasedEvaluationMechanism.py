@@ -1,6 +1,9 @@
 from datetime import timedelta, datetime
+from base.Event import Event
 from base.Pattern import Pattern
-from base.PatternStructure import PatternStructure, SeqOperator, AndOperator, QItem
+from base.Formula import Formula
+from base.PatternStructure import PatternStructure, SeqOperator, AndOperator, OrOperator, QItem, \
+    KleeneClosureOperator, NegationOperator
 from misc.IOUtils import Stream
 from typing import List, Tuple
 from base.PatternMatch import PatternMatch
@@ -8,40 +11,375 @@ from evaluation.EvaluationMechanism import EvaluationMechanism
 from evaluation.Nodes.Node import Node
 from evaluation.Nodes.InternalNode import InternalNode, SeqNode, AndNode
 from evaluation.Nodes.LeafNode import LeafNode
+from evaluation.Nodes.KleeneClosureNode import KleeneClosureNode
+from evaluation.Nodes.NegationNode import NegationNode
 from evaluation.Storage import TreeStorageParameters
+from evaluation.SelectionState import SelectionState
+from misc.ConsumptionPolicy import SelectionStrategies
+from misc.Statistics import get_atomic_formulas_num
+
+
+class _OperatorLevel:
+    """
+    The arguments of a sequence or conjunction operator, along with the indices of the leaves evaluating each argument
+    (a nested operator is evaluated by several leaves).
+    """
+    def __init__(self, structure: PatternStructure, first_leaf_index: int):
+        self.args = structure.args
+        self.is_sequence = structure.get_top_operator() == SeqOperator
+        self.leaf_indices = []
+        for arg in self.args:
+            leaves_num = _get_leaves_num(arg)
+            self.leaf_indices.append(list(range(first_leaf_index, first_leaf_index + leaves_num)))
+            first_leaf_index += leaves_num
+        # maps each leaf to the argument it belongs to, unless all the arguments are evaluated by single leaves
+        self.groups = None
+        if any(len(indices) > 1 for indices in self.leaf_indices):
+            self.groups = {leaf_index: i for i, indices in enumerate(self.leaf_indices) for leaf_index in indices}
+
+    def get_leaf_indices(self, index: int):
+        return self.leaf_indices[index] if index is not None else None
+
+
+def _get_leaves_num(structure: PatternStructure):
+    """
+    Returns the number of the leaves evaluating the given pattern structure.
+    """
+    if structure.get_top_operator() in (SeqOperator, AndOperator):
+        return sum(_get_leaves_num(arg) for arg in structure.args)
+    return 1
+
+
+def _get_positive_names(structure: PatternStructure):
+    """
+    Returns the names of the events of the given pattern structure which are not negated.
+    """
+    if structure.get_top_operator() in (SeqOperator, AndOperator):
+        return set().union(*(_get_positive_names(arg) for arg in structure.args))
+    if isinstance(structure, NegationOperator):
+        return set()
+    if isinstance(structure, KleeneClosureOperator):
+        return {structure.arg.name}
+    return {structure.name}
 
 
 class Tree:
     """
     Represents an evaluation tree. Implements the functionality of constructing an actual tree from a "tree structure"
     object returned by a tree builder. Other than that, merely acts as a proxy to the tree root node.
+    A disjunction pattern is evaluated by a separate tree (a branch) for each of its arguments, whose tree structures
+    are given as a tuple. The leaves of the same event type and name are shared across the branches: an event is only
+    dispatched to one of them, which passes the accepted events to the others.
     """
     def __init__(self, tree_structure: tuple, pattern: Pattern, storage_params: TreeStorageParameters):
-        # Note that right now only "flat" sequence patterns and "flat" conjunction patterns are supported
-        self.__root = Tree.__construct_tree(pattern.structure.get_top_operator() == SeqOperator,
-                                            tree_structure, pattern.structure.args, pattern.window)
-        self.__root.apply_formula(pattern.condition)
-        self.__root.create_storage_unit(storage_params)
+        # Note that right now only sequence and conjunction patterns (possibly nested in each other) are supported,
+        # whose arguments are primitive events, Kleene closures over primitive events or negated primitive events, as
+        # well as disjunctions of such patterns
+        if pattern.structure.get_top_operator() == OrOperator:
+            branches = list(zip(pattern.structure.args, tree_structure))
+        else:
+            branches = [(pattern.structure, tree_structure)]
+        self.__negation_nodes = []
+        self.__roots = [self.__construct_branch(structure, branch_tree_structure, pattern, storage_params)
+                        for structure, branch_tree_structure in branches]
+        self.__leaves = Tree.__share_leaves([leaf for root in self.__roots for leaf in root.get_leaves()])
+        self.__selection_state = None
+        if pattern.consumption_policy is not None and pattern.consumption_policy.is_restrictive():
+            if pattern.consumption_policy.strict_contiguity and Tree.__has_nested_operators(pattern.structure):
+                raise NotImplementedError("Strict contiguity is not supported for nested operators")
+            if pattern.consumption_policy.selection_strategy == SelectionStrategies.MATCH_NEXT and \
+                    not all(Tree.__follows_pattern_order(structure, branch_tree_structure)
+                            for structure, branch_tree_structure in branches):
+                # the partial match extended first at each node depends on the order in which the events are joined
+                raise NotImplementedError("MATCH_NEXT is only supported for trees following the pattern order")
+            self.__selection_state = SelectionState(pattern.consumption_policy, pattern.window)
+            for root in self.__roots:
+                root.set_selection_state(self.__selection_state)
+
+    def __construct_branch(self, structure: PatternStructure, tree_structure: tuple or int, pattern: Pattern,
+                           storage_params: TreeStorageParameters):
+        """
+        Constructs the tree evaluating the given pattern structure (not containing disjunctions) and returns its root.
+        """
+        if structure.get_top_operator() not in (SeqOperator, AndOperator):
+            structure = AndOperator([structure])
+        negation_nodes = []
+        root = Tree.__construct_operator_tree(structure, tree_structure, 0, pattern, negation_nodes)
+        root.apply_formula(pattern.condition)
+        for negation_node in negation_nodes:
+            negation_node.set_negation_condition(pattern.condition)
+        root.create_storage_unit(storage_params)
+        if any(negation_node is not root and negation_node.may_hold_partial_matches()
+               for negation_node in negation_nodes):
+            # a partial match held below the root is released up to a time window after its latest event, and is then
+            # combined with the partial matches of the rest of the tree as if it arrived on time
+            root.delay_expiration(pattern.window)
+        self.__negation_nodes.extend(negation_nodes)
+        return root
 
     def get_leaves(self):
-        return self.__root.get_leaves()
+        """
+        Returns the leaves the events are to be dispatched to.
+        """
+        return self.__leaves
+
+    def get_subtrees_at_depth(self, depth: int):
+        """
+        Returns the roots of the subtrees located at the given depth of the tree, from left to right.
+        Leaves located above the given depth are returned as roots of single-node subtrees.
+        """
+        subtrees = list(self.__roots)
+        for _ in range(depth):
+            next_subtrees = []
+            for node in subtrees:
+                if isinstance(node, InternalNode):
+                    next_subtrees.extend(node.get_subtrees())
+                else:
+                    next_subtrees.append(node)
+            subtrees = next_subtrees
+        return subtrees
+
+    def has_consumption_policy(self):
+        """
+        Returns True if the matches detected by this tree are subject to a non-default consumption policy.
+        """
+        return self.__selection_state is not None
+
+    def register_event(self, event: Event):
+        """
+        Records the arrival of the given event, which is required for applying the consumption policy of the pattern.
+        """
+        if self.__selection_state is not None:
+            self.__selection_state.register_event(event)
 
     def get_matches(self):
-        while self.__root.has_partial_matches():
-            yield self.__root.consume_first_partial_match().events
+        for root in self.__roots:
+            while root.has_partial_matches():
+                events = root.consume_first_partial_match().get_primitive_events()
+                # a match containing an event consumed by a previous match is discarded
+                if self.__selection_state is None or self.__selection_state.try_consume(events):
+                    yield events
+
+    def get_negation_nodes(self):
+        """
+        Returns the negation nodes of this tree, each preceding the negation nodes below it.
+        """
+        return self.__negation_nodes
+
+    def has_pending_matches(self):
+        """
+        Returns True if some partial matches are held by negation nodes until their forbidden intervals are over.
+        """
+        return any(negation_node.has_pending_partial_matches() for negation_node in self.__negation_nodes)
+
+    def release_pending_matches(self, timestamp: datetime = None):
+        """
+        Propagates the partial matches held by negation nodes whose forbidden intervals are over at the given time, or
+        all of them if no time is given.
+        """
+        # the nodes are released from the bottom up, such that a partial match may pass several of them at once
+        for negation_node in reversed(self.__negation_nodes):
+            negation_node.release_pending_partial_matches(timestamp)
 
     @staticmethod
-    def __construct_tree(is_sequence: bool, tree_structure: tuple or int, args: List[QItem],
-                         sliding_window: timedelta, parent: Node = None):
+    def __construct_operator_tree(structure: PatternStructure, tree_structure: tuple or int, first_leaf_index: int,
+                                  pattern: Pattern, negation_nodes: List[NegationNode], parent: Node = None):
+        """
+        Constructs the subtree evaluating the given sequence or conjunction operator, where the given tree structure
+        refers to the arguments of the operator. The leaves are numbered in the order of their appearance in the
+        pattern, starting from the given index.
+        """
+        level = _OperatorLevel(structure, first_leaf_index)
+        negative_indices = [i for i in range(len(level.args)) if isinstance(level.args[i], NegationOperator)]
+        positive_structure = Tree.__remove_negative_items(tree_structure, set(negative_indices))
+        if positive_structure is None:
+            raise Exception("A pattern must contain at least one non-negated event")
+        negations = {}
+        for negative_index in negative_indices:
+            if not isinstance(level.args[negative_index].arg, QItem):
+                raise NotImplementedError("Negation is only supported over primitive events")
+            subtree_items, previous_index, next_index = Tree.__place_negation(level, positive_structure,
+                                                                              negative_index, pattern.condition)
+            negations.setdefault(subtree_items, []).append((negative_index, previous_index, next_index))
+        return Tree.__construct_tree(level, positive_structure, pattern, negations, negation_nodes, parent)
+
+    @staticmethod
+    def __construct_tree(level: _OperatorLevel, tree_structure: tuple or int, pattern: Pattern, negations: dict,
+                         negation_nodes: List[NegationNode], parent: Node = None):
+        """
+        Constructs the subtree specified by the given tree structure, placing the negation nodes of the negations
+        assigned to its events on top of it.
+        """
+        negation_chain = []
+        for negative_index, previous_index, next_index in negations.get(Tree.__get_items(tree_structure), []):
+            parent = NegationNode(pattern.window, parent, level.leaf_indices[negative_index][0],
+                                  level.args[negative_index].arg, level.is_sequence,
+                                  level.get_leaf_indices(previous_index), level.get_leaf_indices(next_index))
+            negation_chain.append(parent)
+        negation_nodes.extend(negation_chain)
+        current = Tree.__construct_positive_tree(level, tree_structure, pattern, negations, negation_nodes, parent)
+        for negation_node in reversed(negation_chain):
+            negation_node.set_subtree(current)
+            current = negation_node
+        return current
+
+    @staticmethod
+    def __construct_positive_tree(level: _OperatorLevel, tree_structure: tuple or int, pattern: Pattern,
+                                  negations: dict, negation_nodes: List[NegationNode], parent: Node):
         if type(tree_structure) == int:
-            return LeafNode(sliding_window, tree_structure, args[tree_structure], parent)
-        current = SeqNode(sliding_window, parent) if is_sequence else AndNode(sliding_window, parent)
+            arg = level.args[tree_structure]
+            leaf_index = level.leaf_indices[tree_structure][0]
+            if arg.get_top_operator() in (SeqOperator, AndOperator):
+                # nested operators are evaluated in the order of their arguments
+                nested_structure = Tree.__get_default_tree_structure(len(arg.args))
+                return Tree.__construct_operator_tree(arg, nested_structure, leaf_index, pattern, negation_nodes,
+                                                      parent)
+            if isinstance(arg, KleeneClosureOperator):
+                return KleeneClosureNode(pattern.window, leaf_index, arg, parent)
+            if isinstance(arg, QItem):
+                return LeafNode(pattern.window, leaf_index, arg, parent)
+            raise NotImplementedError("Unsupported nested operator: %s" % (arg,))
+        if level.is_sequence:
+            current = SeqNode(pattern.window, parent, groups=level.groups)
+        else:
+            current = AndNode(pattern.window, parent)
         left_structure, right_structure = tree_structure
-        left = Tree.__construct_tree(is_sequence, left_structure, args, sliding_window, current)
-        right = Tree.__construct_tree(is_sequence, right_structure, args, sliding_window, current)
+        left = Tree.__construct_tree(level, left_structure, pattern, negations, negation_nodes, current)
+        right = Tree.__construct_tree(level, right_structure, pattern, negations, negation_nodes, current)
         current.set_subtrees(left, right)
         return current
 
+    @staticmethod
+    def __has_nested_operators(structure: PatternStructure):
+        """
+        Returns True if the given pattern structure contains a sequence or a conjunction nested in another operator.
+        """
+        args = structure.args if structure.get_top_operator() == OrOperator else [structure]
+        return any(nested_arg.get_top_operator() in (SeqOperator, AndOperator)
+                   for arg in args if arg.get_top_operator() in (SeqOperator, AndOperator) for nested_arg in arg.args)
+
+    @staticmethod
+    def __follows_pattern_order(structure: PatternStructure, tree_structure: tuple or int):
+        """
+        Returns True if the given tree structure is the left-deep tree following the order of the arguments of the
+        given pattern structure (not containing disjunctions).
+        """
+        args_num = len(structure.args) if structure.get_top_operator() in (SeqOperator, AndOperator) else 1
+        return tree_structure == Tree.__get_default_tree_structure(args_num)
+
+    @staticmethod
+    def __get_default_tree_structure(args_num: int):
+        """
+        Returns the structure of the left-deep tree following the order of the given number of arguments.
+        """
+        tree_structure = 0
+        for i in range(1, args_num):
+            tree_structure = (tree_structure, i)
+        return tree_structure
+
+    @staticmethod
+    def __share_leaves(leaves: List[Node]):
+        """
+        Makes the first of the given leaves of each event type and name pass the events it accepts to the other ones,
+        and returns the leaves the events are to be dispatched to.
+        """
+        shared_leaves = {}
+        dispatched_leaves = []
+        for leaf in leaves:
+            if not isinstance(leaf, LeafNode):
+                dispatched_leaves.append(leaf)
+                continue
+            key = (leaf.get_event_type(), leaf.get_event_definitions()[0][1].name)
+            if key in shared_leaves:
+                shared_leaves[key].add_shared_leaf(leaf)
+                continue
+            shared_leaves[key] = leaf
+            dispatched_leaves.append(leaf)
+        return dispatched_leaves
+
+    @staticmethod
+    def __remove_negative_items(tree_structure: tuple or int, negative_indices: set):
+        """
+        Returns the given tree structure without the negated events, or None if no events are left. An internal node
+        left with a single subtree is replaced by this subtree.
+        """
+        if type(tree_structure) == int:
+            return None if tree_structure in negative_indices else tree_structure
+        left, right = (Tree.__remove_negative_items(subtree, negative_indices) for subtree in tree_structure)
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return left, right
+
+    @staticmethod
+    def __get_items(tree_structure: tuple or int):
+        """
+        Returns the set of the events contained in the given tree structure.
+        """
+        if type(tree_structure) == int:
+            return frozenset([tree_structure])
+        return frozenset().union(*(Tree.__get_items(subtree) for subtree in tree_structure))
+
+    @staticmethod
+    def __place_negation(level: _OperatorLevel, positive_structure: tuple or int, negative_index: int,
+                         condition: Formula):
+        """
+        Returns the arguments of the lowest subtree of the given positive tree structure which a negation node of the
+        given negated argument can be placed on top of, along with the indices of the positive arguments preceding and
+        following it in a sequence.
+        The subtree must contain the events defining the forbidden interval of the negated event and the events
+        referred to by the conditions on the negated event. A negation whose interval is not bounded by the events of
+        the pattern is placed at the root, where the partial matches can be held until the interval is over.
+        """
+        positive_indices = Tree.__get_items(positive_structure)
+        previous_index = max((i for i in positive_indices if i < negative_index), default=None)
+        next_index = min((i for i in positive_indices if i > negative_index), default=None)
+        if not level.is_sequence:
+            previous_index = next_index = None
+        if not level.is_sequence or next_index is None:
+            return positive_indices, previous_index, next_index
+        required_indices = {i for i in (previous_index, next_index) if i is not None}
+        required_indices = Tree.__add_condition_items(required_indices, positive_indices, level.args, negative_index,
+                                                      condition)
+        subtree = positive_structure
+        while type(subtree) != int:
+            contained_subtrees = [s for s in subtree if required_indices.issubset(Tree.__get_items(s))]
+            if len(contained_subtrees) == 0:
+                break
+            subtree = contained_subtrees[0]
+        return Tree.__get_items(subtree), previous_index, next_index
+
+    @staticmethod
+    def __add_condition_items(indices: set, positive_indices: frozenset, args: List[PatternStructure],
+                              negative_index: int, condition: Formula):
+        """
+        Extends the given set of positive arguments with the arguments referred to by the conditions on the given
+        negated event. The arguments are added one at a time as long as more conditions become applicable. If a
+        condition refers to several arguments outside the set, all the positive arguments are returned.
+        """
+        def get_names(items):
+            return set().union(*(_get_positive_names(args[i]) for i in items))
+
+        def get_conditions_num(items):
+            return get_atomic_formulas_num(condition.get_formula_of(get_names(items) | negated_name)) - \
+                   get_atomic_formulas_num(condition.get_formula_of(get_names(items)))
+
+        if condition is None:
+            return indices
+        negated_name = {args[negative_index].arg.name}
+        target_conditions_num = get_conditions_num(positive_indices)
+        indices = set(indices)
+        conditions_num = get_conditions_num(indices)
+        while conditions_num < target_conditions_num:
+            candidates = [(get_conditions_num(indices | {i}), i) for i in sorted(positive_indices - indices)]
+            best_conditions_num, best_index = max(candidates, key=lambda candidate: candidate[0])
+            if best_conditions_num == conditions_num:
+                return set(positive_indices)
+            indices.add(best_index)
+            conditions_num = best_conditions_num
+        return indices
+
 
 class TreeBasedEvaluationMechanism(EvaluationMechanism):
     """
@@ -49,23 +387,48 @@ class TreeBasedEvaluationMechanism(EvaluationMechanism):
     """
     def __init__(self, pattern: Pattern, tree_structure: tuple, storage_params: TreeStorageParameters):
         self.__tree = Tree(tree_structure, pattern, storage_params)
-
-    def eval(self, events: Stream, matches: Stream):
-        event_types_listeners = {}
+        self.__event_types_listeners = {}
         # register leaf listeners for event types.
         for leaf in self.__tree.get_leaves():
             event_type = leaf.get_event_type()
-            if event_type in event_types_listeners.keys():
-                event_types_listeners[event_type].append(leaf)
+            if event_type in self.__event_types_listeners.keys():
+                self.__event_types_listeners[event_type].append(leaf)
             else:
-                event_types_listeners[event_type] = [leaf]
+                self.__event_types_listeners[event_type] = [leaf]
 
-        # Send events to listening leaves.
-        for event in events:
-            if event.event_type in event_types_listeners.keys():
-                for leaf in event_types_listeners[event.event_type]:
-                    leaf.handle_event(event)
-                    for match in self.__tree.get_matches():
-                        matches.add_item(PatternMatch(match))
+    def get_tree(self):
+        """
+        Returns the evaluation tree used by this mechanism.
+        """
+        return self.__tree
 
+    def eval(self, events: Stream, matches: Stream):
+        for event in events:
+            for match in self.handle_event(event):
+                matches.add_item(match)
+        for match in self.flush_pending_matches():
+            matches.add_item(match)
         matches.close()
+
+    def handle_event(self, event: Event):
+        new_matches = []
+        self.__tree.register_event(event)
+        # Release the matches whose negated events can no longer arrive.
+        if self.__tree.has_pending_matches():
+            self.__tree.release_pending_matches(event.timestamp)
+            new_matches.extend(PatternMatch(match) for match in self.__tree.get_matches())
+        # Send the event to listening leaves.
+        if event.event_type in self.__event_types_listeners.keys():
+            for leaf in self.__event_types_listeners[event.event_type]:
+                leaf.handle_event(event)
+                for match in self.__tree.get_matches():
+                    new_matches.append(PatternMatch(match))
+        return new_matches
+
+    def flush_pending_matches(self):
+        """
+        Returns the matches held until the end of the forbidden intervals of their negated events. To be invoked when
+        the input stream is exhausted.
+        """
+        self.__tree.release_pending_matches()
+        return [PatternMatch(match) for match in self.__tree.get_matches()]
@@ -0,0 +1,38 @@
+from enum import Enum
+
+
+class SelectionStrategies(Enum):
+    """
+    Strategies for selecting the events participating in the pattern matches:
+    - MATCH_ANY: every combination of events satisfying the pattern is a match (skip-till-any-match).
+    - MATCH_NEXT: a partial match is combined with other partial matches at most once at each tree node, i.e., only
+      with the ones available when it is first combined (skip-till-next-match). Since the result depends on the order
+      in which the events are joined, it is only supported for the left-deep tree following the pattern order (as
+      created by TrivialLeftDeepTreeBuilder).
+    - MATCH_SINGLE: an event participates in at most one full match. Once a match is detected, the partial matches
+      containing its events are discarded.
+    """
+    MATCH_ANY = 0
+    MATCH_NEXT = 1
+    MATCH_SINGLE = 2
+
+
+class ConsumptionPolicy:
+    """
+    Specifies the selection strategy of a pattern and whether the consecutive arguments of a sequence pattern must be
+    matched by consecutive events of the input stream (strict contiguity).
+    """
+    def __init__(self, selection_strategy: SelectionStrategies = SelectionStrategies.MATCH_ANY,
+                 strict_contiguity: bool = False):
+        self.selection_strategy = selection_strategy
+        self.strict_contiguity = strict_contiguity
+
+    def is_restrictive(self):
+        """
+        Returns True if this policy may discard some of the combinations of events satisfying the pattern, i.e., if it
+        differs from the default one.
+        """
+        return self.selection_strategy != SelectionStrategies.MATCH_ANY or self.strict_contiguity
+
+    def __repr__(self):
+        return "ConsumptionPolicy(%s, %s)" % (self.selection_strategy.name, self.strict_contiguity)
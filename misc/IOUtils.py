@@ -1,18 +1,26 @@
 from base.DataFormatter import DataFormatter
 from base.Event import Event
 from queue import Queue
+from threading import Thread
 
 
 class Stream:
     """
     Represents a generic stream of objects.
+    If max_size is positive, the stream is bounded, and adding an item to a full stream blocks until some item is
+    consumed.
+    A stream can be closed with an error (e.g., when its producer fails), which is then raised to its consumer in place
+    of the end of the stream.
     """
-    def __init__(self):
-        self.__stream = Queue()
+    def __init__(self, max_size: int = 0):
+        self.__stream = Queue(max_size)
+        self.__error = None
 
     def __next__(self):
         next_item = self.__stream.get(block=True)  # Blocking get
         if next_item is None:
+            if self.__error is not None:
+                raise self.__error
             raise StopIteration()
         return next_item
 
@@ -22,12 +30,14 @@ class Stream:
     def add_item(self, item: object):
         self.__stream.put(item)
 
-    def close(self):
+    def close(self, error: Exception = None):
+        self.__error = error
         self.__stream.put(None)
 
     def duplicate(self):
         ret = Stream()
         ret.__stream.queue = self.__stream.queue.copy()
+        ret.__error = self.__error
         return ret
 
     def get_item(self):
@@ -46,7 +56,8 @@ class Stream:
         return x
 
 
-def file_input(file_path: str, data_formatter: DataFormatter) -> Stream:
+def file_input(file_path: str, data_formatter: DataFormatter, pipelined: bool = False,
+               max_pending_events: int = 10000) -> Stream:
     """
     Receives a file and returns a stream of events.
     "filepath": the path to the file that is to be read.
@@ -54,7 +65,16 @@ def file_input(file_path: str, data_formatter: DataFormatter) -> Stream:
     * Each line will be a different event
     * Each line will be split on "," and the resulting array will be stored in an "Event",
       and the keys are determined from the given list "KeyMap".
+    If "pipelined" is set, the file is read and parsed by a background ingestion thread and the stream is returned
+    immediately, such that the evaluation can start while the input is still being parsed. In this case the stream is
+    bounded by "max_pending_events" - the ingestion thread is blocked whenever the evaluation falls behind by this
+    many events. Note that a pipelined stream should be consumed directly rather than duplicated.
     """
+    if pipelined:
+        events = Stream(max_pending_events)
+        ingestion_thread = Thread(target=_ingest_file, args=(file_path, data_formatter, events), daemon=True)
+        ingestion_thread.start()
+        return events
     with open(file_path, "r") as f:
         content = f.readlines()
     events = Stream()
@@ -64,6 +84,22 @@ def file_input(file_path: str, data_formatter: DataFormatter) -> Stream:
     return events
 
 
+def _ingest_file(file_path: str, data_formatter: DataFormatter, events: Stream):
+    """
+    The body of an ingestion thread. Parses the given file line by line into the given stream and closes it.
+    If reading or parsing fails, the stream is closed with the error, which is raised to its consumer rather than
+    silently ending the stream.
+    """
+    try:
+        with open(file_path, "r") as f:
+            for line in f:
+                events.add_item(Event(line, data_formatter))
+    except Exception as e:
+        events.close(e)
+        return
+    events.close()
+
+
 def file_output(matches: list, output_file_name: str = 'matches.txt'):
     """
     Writes output matches to a file in the subfolder "Matches".
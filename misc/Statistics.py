@@ -1,42 +1,231 @@
+from bisect import bisect_left
+from datetime import timedelta
+from math import ceil, exp, floor, log
+from random import Random
+from statistics import NormalDist
+from time import perf_counter
 from typing import List
 
-from base.Formula import Formula
+from base.Formula import Formula, AtomicFormula, BinaryLogicOpFormula
 from base.Pattern import Pattern
 from base.PatternStructure import SeqOperator, QItem
 from misc.IOUtils import Stream
+from misc.VectorizedSelectivity import get_vectorized_selectivity
 
 
-def get_condition_selectivity(arg1: QItem, arg2: QItem, formula: Formula, stream: Stream, is_sequence: bool):
+def get_condition_selectivity(arg1: QItem, arg2: QItem, formula: Formula, stream: Stream, is_sequence: bool,
+                              vectorized: bool = True):
     """
     Calculates the selectivity of a given condition between two event types by evaluating it on a given stream.
+    If vectorized is set and NumPy is available, the condition is evaluated over all pairs of events at once whenever
+    possible (see misc.VectorizedSelectivity).
     """
     if formula is None:
         return 1.0
 
+    events1 = []
+    events2 = []
+    for event in stream:
+        if event.event_type == arg1.event_type:
+            events1.append(event)
+        if arg1 != arg2 and event.event_type == arg2.event_type:
+            events2.append(event)
+    if arg1.event_type == arg2.event_type:
+        events2 = events1
+    return _get_selectivity_from_events(arg1, arg2, formula, events1, events2, is_sequence, vectorized)
+
+
+def _get_selectivity_from_events(arg1: QItem, arg2: QItem, formula: Formula, events1: List, events2: List,
+                                 is_sequence: bool, vectorized: bool):
+    """
+    Calculates the selectivity of a given condition between the given events of two arguments. The events of both
+    arguments must be given as the same list if they are of the same type.
+    """
+    if formula is None:
+        return 1.0
+    if vectorized:
+        selectivity = get_vectorized_selectivity(arg1, arg2, formula, events1, events2, is_sequence)
+        if selectivity is not None:
+            return selectivity
+
     count = 0
     match_count = 0
-
     if arg1 == arg2:
-        for event in stream:
-            if event.eventType == arg1.event_type:
-                count += 1
-                if formula.eval({arg1.name: event.event}):
-                    match_count += 1
+        for event in events1:
+            count += 1
+            if formula.eval({arg1.name: event.payload}):
+                match_count += 1
     else:
-        events1 = []
-        events2 = []
-        for event in stream:
-            if event.eventType == arg1.event_type:
-                events1.append(event)
-            elif event.eventType == arg2.event_type:
-                events2.append(event)
         for event1 in events1:
             for event2 in events2:
-                if (not is_sequence) or event1.date < event2.date:
+                if event1 is event2:
+                    continue
+                if (not is_sequence) or event1.timestamp < event2.timestamp:
                     count += 1
-                    if formula.eval({arg1.name: event1.event, arg2.name: event2.event}):
+                    if formula.eval({arg1.name: event1.payload, arg2.name: event2.payload}):
                         match_count += 1
-    return match_count / count
+    return match_count / count if count > 0 else 1.0
+
+
+def get_sample_size(confidence: float = 0.95, error: float = 0.05):
+    """
+    Returns the number of samples required for estimating a selectivity with the given maximal absolute error at the
+    given confidence level. The worst-case selectivity of 0.5 is assumed, e.g., 385 samples for 0.95 and 0.05.
+    """
+    if not 0 < confidence < 1 or not 0 < error < 1:
+        raise Exception("Confidence and error must be between 0 and 1")
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return ceil(z * z * 0.25 / (error * error))
+
+
+def estimate_condition_selectivity(arg1: QItem, arg2: QItem, formula: Formula, stream: Stream or List,
+                                   is_sequence: bool, sample_size: int = None, confidence: float = 0.95,
+                                   error: float = 0.05, window: timedelta = None, random_generator: Random = None):
+    """
+    Estimates the selectivity of a given condition between two event types by evaluating it on a uniform random sample
+    of the event pairs of the given stream (or of the single events if both arguments are the same) instead of all of
+    them. Unless specified explicitly, the sample size is derived from the required confidence and error.
+    If a window is given, only the pairs of events occurring within the window from each other are considered, as
+    these are the only ones the condition is ever evaluated on during pattern detection.
+    """
+    if formula is None:
+        return 1.0
+    if sample_size is None:
+        sample_size = get_sample_size(confidence, error)
+    reservoir = _ReservoirSampler(sample_size, random_generator if random_generator is not None else Random())
+
+    if arg1 == arg2:
+        for event in stream:
+            if event.event_type == arg1.event_type:
+                reservoir.add_items(1, lambda _: event)
+        samples = reservoir.get_samples()
+        match_count = sum(1 for event in samples if formula.eval({arg1.name: event.payload}))
+        return match_count / len(samples) if len(samples) > 0 else 1.0
+
+    first_events, second_events = _EventBuffer(window), _EventBuffer(window)
+    for event in stream:
+        first_events.remove_expired_events(event.timestamp)
+        second_events.remove_expired_events(event.timestamp)
+        # pairs in which the new event is the second one
+        first_partners = first_events.get_events(event.timestamp if is_sequence else None) \
+            if event.event_type == arg2.event_type else []
+        # pairs in which the new event is the first one - the earlier events cannot follow it in a sequence
+        second_partners = second_events.get_events() \
+            if event.event_type == arg1.event_type and not is_sequence else []
+        reservoir.add_items(len(first_partners) + len(second_partners),
+                            lambda i: (first_partners[i], event) if i < len(first_partners)
+                            else (event, second_partners[i - len(first_partners)]))
+        if event.event_type == arg1.event_type:
+            first_events.add_event(event)
+        if event.event_type == arg2.event_type:
+            second_events.add_event(event)
+    samples = reservoir.get_samples()
+    match_count = sum(1 for event1, event2 in samples
+                      if formula.eval({arg1.name: event1.payload, arg2.name: event2.payload}))
+    return match_count / len(samples) if len(samples) > 0 else 1.0
+
+
+class _EventBuffer:
+    """
+    Stores the events of a single type in the order of their arrival, optionally discarding the ones older than a given
+    time window.
+    """
+    def __init__(self, window: timedelta = None):
+        self.__window = window
+        self.__events = []
+        self.__timestamps = []
+        self.__start = 0
+
+    def add_event(self, event):
+        self.__events.append(event)
+        self.__timestamps.append(event.timestamp)
+
+    def remove_expired_events(self, current_timestamp):
+        if self.__window is None:
+            return
+        self.__start = bisect_left(self.__timestamps, current_timestamp - self.__window, self.__start)
+        if self.__start > len(self.__events) // 2:
+            # compact the buffer once most of it is expired
+            del self.__events[:self.__start]
+            del self.__timestamps[:self.__start]
+            self.__start = 0
+
+    def get_events(self, before_timestamp=None):
+        """
+        Returns a view over the buffered events, or only over the ones preceding the given timestamp.
+        """
+        end = len(self.__events) if before_timestamp is None \
+            else bisect_left(self.__timestamps, before_timestamp, self.__start)
+        return _ListView(self.__events, self.__start, end)
+
+
+class _ListView:
+    """
+    A read-only view over a contiguous range of a list, avoiding copying it.
+    """
+    def __init__(self, items: list, start: int, end: int):
+        self.__items = items
+        self.__start = start
+        self.__end = end
+
+    def __len__(self):
+        return self.__end - self.__start
+
+    def __getitem__(self, index: int):
+        return self.__items[self.__start + index]
+
+
+class _ReservoirSampler:
+    """
+    Maintains a uniform random sample of a fixed size over a sequence of items of unknown length using reservoir
+    sampling with geometric skips ("Algorithm L"). The items are offered in blocks, and only the items entering the
+    sample are materialized, such that offering a block takes time independent of its length.
+    """
+    def __init__(self, sample_size: int, random_generator: Random):
+        if sample_size < 1:
+            raise Exception("Sample size must be positive")
+        self.__sample_size = sample_size
+        self.__random = random_generator
+        self.__samples = []
+        self.__items_count = 0
+        self.__weight = None
+        self.__next_index = None
+
+    def add_items(self, items_num: int, get_item: callable):
+        """
+        Offers a block of items_num items to the sample, get_item(i) returning the i-th item of the block.
+        """
+        block_start = self.__items_count
+        self.__items_count += items_num
+        i = 0
+        while i < items_num and len(self.__samples) < self.__sample_size:
+            self.__samples.append(get_item(i))
+            i += 1
+            if len(self.__samples) == self.__sample_size:
+                self.__weight = exp(log(self.__random_fraction()) / self.__sample_size)
+                self.__next_index = block_start + i - 1
+                self.__skip()
+        if self.__next_index is None:
+            return
+        while self.__next_index < self.__items_count:
+            self.__samples[self.__random.randrange(self.__sample_size)] = get_item(self.__next_index - block_start)
+            self.__weight *= exp(log(self.__random_fraction()) / self.__sample_size)
+            self.__skip()
+
+    def get_samples(self):
+        return self.__samples
+
+    def __skip(self):
+        self.__next_index += floor(log(self.__random_fraction()) / log(1 - self.__weight)) + 1
+
+    def __random_fraction(self):
+        """
+        Returns a random number in the open interval (0, 1).
+        """
+        fraction = self.__random.random()
+        while fraction == 0.0:
+            fraction = self.__random.random()
+        return fraction
 
 
 def get_occurrences_dict(pattern: Pattern, stream: Stream):
@@ -45,42 +234,203 @@ def get_occurrences_dict(pattern: Pattern, stream: Stream):
     given event stream.
     """
     ret = {}
-    types = {qitem.eventType for qitem in pattern.structure.args}
+    types = {qitem.event_type for qitem in pattern.get_primitive_items()}
     for event in stream:
-        if event.eventType in types:
-            if event.eventType in ret.keys():
-                ret[event.eventType] += 1
+        if event.event_type in types:
+            if event.event_type in ret.keys():
+                ret[event.event_type] += 1
             else:
-                ret[event.eventType] = 1
+                ret[event.event_type] = 1
     return ret
 
 
-def calculate_selectivity_matrix(pattern: Pattern, stream: Stream):
+def calculate_statistics(pattern: Pattern, stream: Stream, vectorized: bool = True):
+    """
+    Returns the selectivity matrix and the arrival rates of the given pattern in the given event stream as a
+    (selectivity matrix, arrival rates) tuple, as expected by Pattern.set_statistics for
+    StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES.
+    The stream is only scanned once - the events are bucketed by their types, and all statistics are calculated from
+    the buckets.
+    """
+    buckets = _EventTypeBuckets(pattern, stream)
+    return (_calculate_selectivity_matrix_from_buckets(pattern, buckets, vectorized),
+            _calculate_arrival_rates_from_buckets(pattern, buckets))
+
+
+def calculate_selectivity_matrix(pattern: Pattern, stream: Stream, vectorized: bool = True):
     """
     Returns a matrix containing the selectivity between each pair of events from the given pattern in the
     given event stream.
     """
-    args = pattern.structure.args
+    return _calculate_selectivity_matrix_from_buckets(pattern, _EventTypeBuckets(pattern, stream), vectorized)
+
+
+def estimate_selectivity_matrix(pattern: Pattern, stream: Stream, sample_size: int = None, confidence: float = 0.95,
+                                error: float = 0.05, window_aware: bool = False, seed: int = None):
+    """
+    Returns a matrix containing the selectivity between each pair of events from the given pattern estimated on random
+    samples of the given event stream (see estimate_condition_selectivity). If window_aware is set, only the events
+    occurring within the time window of the pattern are paired.
+    """
+    args = pattern.get_primitive_items()
+    window = pattern.window if window_aware and pattern.window != timedelta.max else None
+    is_sequence = pattern.structure.get_top_operator() == SeqOperator
+    random_generator = Random(seed)
+    # the stream is only scanned once, and each estimation only iterates over the events of the pattern
+    pattern_events = _EventTypeBuckets(pattern, stream).pattern_events
+    return _calculate_matrix(pattern, lambda i, j, formula: estimate_condition_selectivity(
+        args[i], args[j], formula, pattern_events, is_sequence, sample_size, confidence, error, window,
+        random_generator))
+
+
+def get_arrival_rates(pattern: Pattern, stream: Stream):
+    """
+    Returns a list containing the arrival rates of the event types defined by the given pattern, measured according to
+    their appearances in given event stream.
+    """
+    return _calculate_arrival_rates_from_buckets(pattern, _EventTypeBuckets(pattern, stream))
+
+
+class _EventTypeBuckets:
+    """
+    Scans an event stream once (without consuming it) and stores the events of each event type of a given pattern in
+    a separate list, along with the time interval covered by the stream.
+    """
+    def __init__(self, pattern: Pattern, stream: Stream):
+        types = {arg.event_type for arg in pattern.get_primitive_items()}
+        self.events_by_type = {event_type: [] for event_type in types}
+        self.pattern_events = []
+        self.first_timestamp = self.last_timestamp = None
+        for event in stream.duplicate():
+            if self.first_timestamp is None:
+                self.first_timestamp = event.timestamp
+            self.last_timestamp = event.timestamp
+            if event.event_type in self.events_by_type:
+                self.events_by_type[event.event_type].append(event)
+                self.pattern_events.append(event)
+
+
+def _calculate_matrix(pattern: Pattern, calculate_selectivity: callable):
+    """
+    Returns a symmetric matrix whose (i, j) entry is calculated by calculate_selectivity(i, j, formula) for i <= j,
+    where formula is the part of the pattern condition referring to the i-th and the j-th events. The earlier event is
+    passed first, as in a sequence pattern it is the one expected to occur first.
+    """
+    args = pattern.get_primitive_items()
     args_num = len(args)
-    selectivity_matrix = [[0.0 for _ in range(args_num)] for _ in range(args_num)]
+    selectivity_matrix = [[1.0 for _ in range(args_num)] for _ in range(args_num)]
+    if pattern.condition is None:
+        return selectivity_matrix
     for i in range(args_num):
         for j in range(i + 1):
-            new_sel = get_condition_selectivity(args[i], args[j],
-                                                pattern.condition.get_formula_of({args[i].name, args[j].name}),
-                                                stream.duplicate(), pattern.structure.get_top_operator() == SeqOperator)
+            new_sel = calculate_selectivity(j, i, pattern.get_primitive_condition_of({args[i].name, args[j].name}))
             selectivity_matrix[i][j] = selectivity_matrix[j][i] = new_sel
-
     return selectivity_matrix
 
 
-def get_arrival_rates(pattern: Pattern, stream: Stream):
+def _calculate_selectivity_matrix_from_buckets(pattern: Pattern, buckets: _EventTypeBuckets, vectorized: bool):
+    args = pattern.get_primitive_items()
+    is_sequence = pattern.structure.get_top_operator() == SeqOperator
+    return _calculate_matrix(pattern, lambda i, j, formula: _get_selectivity_from_events(
+        args[i], args[j], formula, buckets.events_by_type[args[i].event_type],
+        buckets.events_by_type[args[j].event_type], is_sequence, vectorized))
+
+
+def _calculate_arrival_rates_from_buckets(pattern: Pattern, buckets: _EventTypeBuckets):
+    args = pattern.get_primitive_items()
+    if buckets.first_timestamp is None or buckets.last_timestamp == buckets.first_timestamp:
+        # no rate can be measured over an empty time interval
+        return [0.0 for _ in args]
+    time_interval = (buckets.last_timestamp - buckets.first_timestamp).total_seconds()
+    return [len(buckets.events_by_type[arg.event_type]) / time_interval for arg in args]
+
+
+def get_predicate_costs(pattern: Pattern):
     """
-    Returns a list containing the arrival rates of the event types defined by the given pattern, measured according to
-    their appearances in given event stream.
+    Returns a matrix whose (i, j) entry is the number of atomic conditions referring to both the i-th and the j-th
+    events of the given pattern and to no other event (on the diagonal, the number of conditions referring to the i-th
+    event only). It can be used as a predicate cost matrix assuming that all atomic conditions are equally expensive.
+    """
+    args_num = len(pattern.get_primitive_items())
+    if pattern.condition is None:
+        return [[0.0 for _ in range(args_num)] for _ in range(args_num)]
+    return _get_exclusive_costs(_calculate_matrix(pattern,
+                                                  lambda i, j, formula: float(get_atomic_formulas_num(formula))))
+
+
+def calculate_predicate_costs(pattern: Pattern, stream: Stream, sample_size: int = 100):
+    """
+    Returns a predicate cost matrix (see get_predicate_costs) measured on the given stream: the (i, j) entry is the
+    average time of evaluating the conditions referring exclusively to the i-th and the j-th events, measured on
+    bindings of up to sample_size events of each type. The costs are normalized such that an atomic condition costs 1
+    on average. The conditions of events not occurring in the stream are assigned the average cost.
+    """
+    costs = get_predicate_costs(pattern)
+    if sum(map(sum, costs)) == 0:
+        return costs
+    args = pattern.get_primitive_items()
+    buckets = _EventTypeBuckets(pattern, stream)
+    times = _get_exclusive_costs(_calculate_matrix(pattern, lambda i, j, formula: _measure_condition_time(
+        args[i], args[j], formula, buckets.events_by_type[args[i].event_type][:sample_size],
+        buckets.events_by_type[args[j].event_type][:sample_size])))
+
+    args_num = len(args)
+    measured = [(i, j) for i in range(args_num) for j in range(args_num) if costs[i][j] > 0 and times[i][j] is not None]
+    total_time = sum(times[i][j] for i, j in measured)
+    if total_time == 0:
+        return costs
+    factor = sum(costs[i][j] for i, j in measured) / total_time
+    for i, j in measured:
+        costs[i][j] = times[i][j] * factor
+    return costs
+
+
+def _measure_condition_time(arg1: QItem, arg2: QItem, formula: Formula, events1: List, events2: List):
+    """
+    Returns the average time of evaluating the given condition on pairs of the given events, or None if there are no
+    events to evaluate the condition on.
+    """
+    if formula is None:
+        return 0.0
+    if arg1 == arg2:
+        bindings = [{arg1.name: event.payload} for event in events1]
+    else:
+        bindings = [{arg1.name: event1.payload, arg2.name: event2.payload} for event1, event2 in zip(events1, events2)]
+    if len(bindings) == 0:
+        return None
+    start = perf_counter()
+    for binding in bindings:
+        formula.eval(binding)
+    return (perf_counter() - start) / len(bindings)
+
+
+def _get_exclusive_costs(matrix: List[List[float]]):
+    """
+    Given a matrix whose (i, j) entry refers to the whole condition between the i-th and the j-th events, subtracts the
+    parts referring to a single event (stored on the diagonal). Entries derived from a None value are None.
+    """
+    args_num = len(matrix)
+    result = [[matrix[i][j] for j in range(args_num)] for i in range(args_num)]
+    for i in range(args_num):
+        for j in range(args_num):
+            if i == j:
+                continue
+            if None in (matrix[i][j], matrix[i][i], matrix[j][j]):
+                result[i][j] = None
+            else:
+                result[i][j] = max(0.0, matrix[i][j] - matrix[i][i] - matrix[j][j])
+    return result
+
+
+def get_atomic_formulas_num(formula: Formula):
+    """
+    Returns the number of the atomic formulas the given formula consists of.
     """
-    time_interval = (stream.last().date - stream.first().date).total_seconds()
-    counters = get_occurrences_dict(pattern, stream.duplicate())
-    return [counters[i.eventType] / time_interval for i in pattern.structure.args]
+    if isinstance(formula, AtomicFormula):
+        return 1
+    if isinstance(formula, BinaryLogicOpFormula):
+        return get_atomic_formulas_num(formula.left_formula) + get_atomic_formulas_num(formula.right_formula)
+    return 0
 
 
 def calculate_left_deep_tree_cost_function(order: List[int], selectivity_matrix: List[List[float]],
@@ -0,0 +1,116 @@
+"""
+This file contains a persistent catalog of pattern statistics, allowing to calculate the statistics required by the
+advanced tree builders once per pattern and dataset instead of on every engine startup.
+"""
+import hashlib
+import json
+import os
+
+from base.Formula import Formula, AtomicTerm, IdentifierTerm, BinaryOperationTerm, AtomicFormula, \
+    BinaryLogicOpFormula
+from base.Pattern import Pattern
+from misc.IOUtils import Stream
+from misc.Statistics import calculate_statistics
+from misc.StatisticsTypes import StatisticsTypes
+
+
+class StatisticsCatalog:
+    """
+    Stores the arrival rates and the selectivity matrices of patterns in a JSON file on disk. An entry is identified by
+    the structure of the pattern (its operators, event types and names), a fingerprint of its condition and the
+    identifier of the dataset the statistics were calculated on.
+    The time window of a pattern is not a part of the key, as it does not affect its statistics.
+    """
+    def __init__(self, catalog_path: str):
+        self.__catalog_path = catalog_path
+        self.__entries = {}
+        if os.path.exists(catalog_path):
+            with open(catalog_path) as catalog_file:
+                self.__entries = json.load(catalog_file)
+
+    def load_statistics(self, pattern: Pattern, dataset_id: str):
+        """
+        Attaches the statistics stored for the given pattern and dataset to the pattern.
+        Returns True if such statistics were found and False otherwise.
+        """
+        entry = self.__entries.get(self.__get_key(pattern, dataset_id))
+        if entry is None:
+            return False
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES,
+                               (entry["selectivity_matrix"], entry["arrival_rates"]))
+        return True
+
+    def store_statistics(self, pattern: Pattern, dataset_id: str, statistics: tuple):
+        """
+        Stores the given (selectivity matrix, arrival rates) tuple for the given pattern and dataset and writes the
+        catalog to disk.
+        """
+        selectivity_matrix, arrival_rates = statistics
+        self.__entries[self.__get_key(pattern, dataset_id)] = {
+            "structure": str(pattern.structure),
+            "dataset_id": dataset_id,
+            "selectivity_matrix": selectivity_matrix,
+            "arrival_rates": arrival_rates,
+        }
+        self.__save()
+
+    def get_statistics(self, pattern: Pattern, dataset_id: str, stream: Stream):
+        """
+        Attaches the statistics of the given pattern on the given dataset to the pattern. If the catalog contains no
+        such statistics, they are calculated on the given stream (which is not consumed) and stored.
+        """
+        if self.load_statistics(pattern, dataset_id):
+            return
+        statistics = calculate_statistics(pattern, stream)
+        self.store_statistics(pattern, dataset_id, statistics)
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES, statistics)
+
+    def __get_key(self, pattern: Pattern, dataset_id: str):
+        key = "%s|%s|%s" % (pattern.structure, get_condition_fingerprint(pattern.condition), dataset_id)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def __save(self):
+        """
+        Writes the catalog to a temporary file first, such that an interrupted write never corrupts the catalog.
+        """
+        temp_path = self.__catalog_path + ".tmp"
+        with open(temp_path, "w") as catalog_file:
+            json.dump(self.__entries, catalog_file)
+        os.replace(temp_path, self.__catalog_path)
+
+
+def get_condition_fingerprint(condition: Formula):
+    """
+    Returns a string identifying the given condition. Unlike the string representation of a formula, the fingerprint
+    is stable across executions: the relation operators are identified by the formula types, and the attribute
+    extraction functions by their code, constants and captured variables.
+    """
+    if condition is None:
+        return "None"
+    if isinstance(condition, AtomicFormula):
+        return "%s(%s,%s)" % (type(condition).__name__, _get_term_fingerprint(condition.left_term),
+                              _get_term_fingerprint(condition.right_term))
+    if isinstance(condition, BinaryLogicOpFormula):
+        return "%s(%s,%s)" % (type(condition).__name__, get_condition_fingerprint(condition.left_formula),
+                              get_condition_fingerprint(condition.right_formula))
+    return type(condition).__name__
+
+
+def _get_term_fingerprint(term):
+    if isinstance(term, AtomicTerm):
+        return repr(term.value)
+    if isinstance(term, IdentifierTerm):
+        return "%s.%s" % (term.name, _get_function_fingerprint(term.getattr_func))
+    if isinstance(term, BinaryOperationTerm):
+        return "%s(%s,%s)" % (type(term).__name__, _get_term_fingerprint(term.lhs), _get_term_fingerprint(term.rhs))
+    return type(term).__name__
+
+
+def _get_function_fingerprint(func: callable):
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return getattr(func, "__qualname__", type(func).__name__)
+    # nested code objects are represented by their bytecode, as their string representation contains their address
+    consts = tuple(const.co_code if hasattr(const, "co_code") else const for const in code.co_consts)
+    closure = tuple(cell.cell_contents for cell in func.__closure__) if func.__closure__ is not None else ()
+    return hashlib.sha256(repr((code.co_code, consts, code.co_names, closure)).encode()).hexdigest()[:16]
@@ -0,0 +1,146 @@
+from collections import deque
+from datetime import timedelta
+
+from base.Event import Event
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator
+from misc.StatisticsTypes import StatisticsTypes
+
+
+class StatisticsCollector:
+    """
+    Collects the statistics required by the advanced tree builders from a live stream of events: the arrival rates of
+    the event types of a pattern and the selectivities of the conditions between each pair of its events.
+    Only the events received during the last statistics_window are taken into account. Arrival rates are measured over
+    all these events, while selectivities are estimated on the most recent max_samples_per_type events of each type.
+    Every recalculation blends the new estimates with the previous ones, giving a weight of decay_factor to the latter.
+    """
+    def __init__(self, pattern: Pattern, statistics_window: timedelta, max_samples_per_type: int = 100,
+                 decay_factor: float = 0.5):
+        self.__args = pattern.get_primitive_items()
+        self.__is_sequence = pattern.structure.get_top_operator() == SeqOperator
+        self.__statistics_window = statistics_window
+        self.__decay_factor = decay_factor
+        event_types = {arg.event_type for arg in self.__args}
+        self.__arrival_timestamps = {event_type: deque() for event_type in event_types}
+        self.__samples = {event_type: deque(maxlen=max_samples_per_type) for event_type in event_types}
+        self.__first_timestamp = None
+        self.__last_timestamp = None
+
+        args_num = len(self.__args)
+        self.__conditions = [[None for _ in range(args_num)] for _ in range(args_num)]
+        if pattern.condition is not None:
+            for i in range(args_num):
+                for j in range(i + 1):
+                    self.__conditions[i][j] = self.__conditions[j][i] = \
+                        pattern.get_primitive_condition_of({self.__args[i].name, self.__args[j].name})
+        self.__selectivity_matrix = None
+        self.__arrival_rates = None
+
+    def handle_event(self, event: Event):
+        """
+        Registers the arrival of a new event.
+        """
+        if self.__first_timestamp is None:
+            self.__first_timestamp = event.timestamp
+        self.__last_timestamp = event.timestamp
+        if event.event_type not in self.__arrival_timestamps:
+            return
+        self.__arrival_timestamps[event.event_type].append(event.timestamp)
+        self.__samples[event.event_type].append(event)
+
+    def get_statistics(self):
+        """
+        Recalculates the statistics according to the events observed during the last statistics window and returns
+        them as a (selectivity matrix, arrival rates) tuple.
+        """
+        self.__remove_expired_events()
+        arrival_rates = self.__calculate_arrival_rates()
+        selectivity_matrix = self.__calculate_selectivity_matrix()
+        if self.__arrival_rates is None:
+            self.__arrival_rates, self.__selectivity_matrix = arrival_rates, selectivity_matrix
+        else:
+            self.__arrival_rates = [self.__decay(self.__arrival_rates[i], arrival_rates[i])
+                                    for i in range(len(arrival_rates))]
+            self.__selectivity_matrix = [[self.__decay(self.__selectivity_matrix[i][j], selectivity_matrix[i][j])
+                                          for j in range(len(arrival_rates))] for i in range(len(arrival_rates))]
+        return self.__selectivity_matrix, self.__arrival_rates
+
+    def apply_statistics(self, pattern: Pattern):
+        """
+        Recalculates the statistics and attaches them to the given pattern, making them available to any tree builder.
+        """
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES, self.get_statistics())
+
+    def __decay(self, old_value: float, new_value: float):
+        return self.__decay_factor * old_value + (1 - self.__decay_factor) * new_value
+
+    def __remove_expired_events(self):
+        """
+        Removes the events which are no longer within the statistics window.
+        """
+        if self.__last_timestamp is None:
+            return
+        expiration_timestamp = self.__last_timestamp - self.__statistics_window
+        for event_type in self.__arrival_timestamps.keys():
+            arrival_timestamps = self.__arrival_timestamps[event_type]
+            while len(arrival_timestamps) > 0 and arrival_timestamps[0] < expiration_timestamp:
+                arrival_timestamps.popleft()
+            samples = self.__samples[event_type]
+            while len(samples) > 0 and samples[0].timestamp < expiration_timestamp:
+                samples.popleft()
+
+    def __calculate_arrival_rates(self):
+        """
+        Calculates the arrival rate (in events per second) of each event type according to the current window.
+        """
+        if self.__first_timestamp is None:
+            return [0.0 for _ in self.__args]
+        elapsed_time = min(self.__last_timestamp - self.__first_timestamp, self.__statistics_window)
+        elapsed_seconds = max(elapsed_time.total_seconds(), 1.0)
+        return [len(self.__arrival_timestamps[arg.event_type]) / elapsed_seconds for arg in self.__args]
+
+    def __calculate_selectivity_matrix(self):
+        """
+        Estimates the selectivity of the condition between each pair of pattern events on the sampled events.
+        """
+        args_num = len(self.__args)
+        selectivity_matrix = [[1.0 for _ in range(args_num)] for _ in range(args_num)]
+        for i in range(args_num):
+            for j in range(i + 1):
+                if self.__conditions[i][j] is None:
+                    continue
+                selectivity = self.__estimate_selectivity(j, i)
+                if selectivity is not None:
+                    selectivity_matrix[i][j] = selectivity_matrix[j][i] = selectivity
+                elif self.__selectivity_matrix is not None:
+                    # no samples are available - keep the previous estimate
+                    selectivity_matrix[i][j] = selectivity_matrix[j][i] = self.__selectivity_matrix[i][j]
+        return selectivity_matrix
+
+    def __estimate_selectivity(self, first_index: int, second_index: int):
+        """
+        Returns the fraction of the sampled events (or pairs of events) satisfying the condition between the pattern
+        events at the given indices, or None if no samples are available.
+        """
+        condition = self.__conditions[first_index][second_index]
+        first_arg, second_arg = self.__args[first_index], self.__args[second_index]
+        first_samples = self.__samples[first_arg.event_type]
+        count = match_count = 0
+        if first_index == second_index:
+            for event in first_samples:
+                count += 1
+                if condition.eval({first_arg.name: event.payload}):
+                    match_count += 1
+        else:
+            second_samples = self.__samples[second_arg.event_type]
+            for first_event in first_samples:
+                for second_event in second_samples:
+                    if first_event is second_event:
+                        continue
+                    if self.__is_sequence and first_event.timestamp > second_event.timestamp:
+                        continue
+                    count += 1
+                    if condition.eval({first_arg.name: first_event.payload, second_arg.name: second_event.payload}):
+                        match_count += 1
+        return match_count / count if count > 0 else None
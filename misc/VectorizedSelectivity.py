@@ -0,0 +1,166 @@
+"""
+This file contains a NumPy-based implementation of the selectivity calculation. Instead of evaluating a condition on
+each pair of events separately, the attributes referenced by the condition are extracted into columns, and the
+condition is evaluated over the broadcasted grid of all pairs at once, chunk by chunk.
+NumPy is an optional dependency - if it is not installed, or the condition cannot be vectorized, the functions of this
+file return None and the caller is expected to fall back to the pure Python evaluation.
+"""
+from typing import List
+
+from base.Formula import Formula, Term, AtomicTerm, IdentifierTerm, BinaryOperationTerm, AtomicFormula, AndFormula, \
+    TrueFormula
+from base.PatternStructure import QItem
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the maximal number of event pairs evaluated at once
+DEFAULT_MAX_CHUNK_SIZE = 1000000
+
+
+class _NotVectorizableException(Exception):
+    pass
+
+
+def is_vectorization_available():
+    """
+    Returns True if NumPy is installed.
+    """
+    return np is not None
+
+
+def get_vectorized_selectivity(arg1: QItem, arg2: QItem, formula: Formula, events1: List, events2: List,
+                               is_sequence: bool, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE):
+    """
+    Calculates the selectivity of a given condition between the given events of two pattern arguments, or between the
+    given events and themselves if both arguments are the same. The semantics are identical to the ones of
+    misc.Statistics.get_condition_selectivity.
+    Returns None if NumPy is not installed or the condition contains terms or values which cannot be vectorized.
+    """
+    if np is None:
+        return None
+    try:
+        with np.errstate(all="raise"):
+            if arg1 == arg2:
+                return _get_single_argument_selectivity(arg1, formula, events1, max_chunk_size)
+            return _get_argument_pair_selectivity(arg1, arg2, formula, events1, events2, is_sequence, max_chunk_size)
+    except (_NotVectorizableException, FloatingPointError, TypeError, ValueError):
+        # overflows, divisions by zero and non-numeric values are left for the pure Python evaluation
+        return None
+
+
+def _get_single_argument_selectivity(arg: QItem, formula: Formula, events: List, max_chunk_size: int):
+    if len(events) == 0:
+        return 1.0
+    extractor = _ColumnExtractor({arg.name: events})
+    match_count = 0
+    for start in range(0, len(events), max_chunk_size):
+        chunk_size = min(max_chunk_size, len(events) - start)
+        columns = _ChunkColumns(extractor, {arg.name: (slice(start, start + chunk_size), (chunk_size,))})
+        result = _evaluate_formula(formula, columns)
+        match_count += int(np.count_nonzero(np.broadcast_to(result, (chunk_size,))))
+    return match_count / len(events)
+
+
+def _get_argument_pair_selectivity(arg1: QItem, arg2: QItem, formula: Formula, events1: List, events2: List,
+                                    is_sequence: bool, max_chunk_size: int):
+    if len(events1) == 0 or len(events2) == 0:
+        return 1.0
+    same_events = events1 is events2
+    rows_num = max(1, min(len(events1), max_chunk_size // len(events2)))
+    cols_num = max(1, min(len(events2), max_chunk_size // rows_num))
+    timestamps1 = _get_timestamps(events1) if is_sequence else None
+    timestamps2 = _get_timestamps(events2) if is_sequence else None
+
+    extractor = _ColumnExtractor({arg1.name: events1, arg2.name: events2})
+    count = match_count = 0
+    for row_start in range(0, len(events1), rows_num):
+        rows = slice(row_start, min(row_start + rows_num, len(events1)))
+        for col_start in range(0, len(events2), cols_num):
+            cols = slice(col_start, min(col_start + cols_num, len(events2)))
+            shape = (rows.stop - rows.start, cols.stop - cols.start)
+            columns = _ChunkColumns(extractor, {arg1.name: (rows, (shape[0], 1)), arg2.name: (cols, (1, shape[1]))})
+            result = np.broadcast_to(_evaluate_formula(formula, columns), shape)
+            mask = np.ones(shape, dtype=bool)
+            if same_events:
+                # an event cannot be paired with itself
+                mask &= np.arange(rows.start, rows.stop).reshape(-1, 1) != np.arange(cols.start, cols.stop)
+            if is_sequence:
+                mask &= timestamps1[rows].reshape(-1, 1) < timestamps2[cols]
+            count += int(np.count_nonzero(mask))
+            match_count += int(np.count_nonzero(result & mask))
+    return match_count / count if count > 0 else 1.0
+
+
+def _get_timestamps(events: List):
+    return np.array([event.timestamp for event in events], dtype="datetime64[us]")
+
+
+def _evaluate_formula(formula: Formula, columns):
+    """
+    Evaluates the given formula over the columns of the events, returning a boolean array (or a scalar).
+    """
+    if isinstance(formula, AtomicFormula):
+        result = formula.relation_op(_evaluate_term(formula.left_term, columns),
+                                     _evaluate_term(formula.right_term, columns))
+        if not isinstance(result, (np.ndarray, np.bool_, bool)):
+            raise _NotVectorizableException()
+        return result
+    if isinstance(formula, AndFormula):
+        return np.logical_and(_evaluate_formula(formula.left_formula, columns),
+                              _evaluate_formula(formula.right_formula, columns))
+    if isinstance(formula, TrueFormula):
+        return True
+    raise _NotVectorizableException()
+
+
+def _evaluate_term(term: Term, columns):
+    """
+    Evaluates the given term over the columns of the events. The binary operations of the terms are applied to the
+    NumPy arrays as is, as they only consist of arithmetic operators.
+    """
+    if isinstance(term, AtomicTerm):
+        if not isinstance(term.value, (int, float)):
+            raise _NotVectorizableException()
+        return term.value
+    if isinstance(term, IdentifierTerm):
+        return columns.get_column(term)
+    if isinstance(term, BinaryOperationTerm):
+        return term.binary_op(_evaluate_term(term.lhs, columns), _evaluate_term(term.rhs, columns))
+    raise _NotVectorizableException()
+
+
+class _ColumnExtractor:
+    """
+    Lazily extracts the values of the attributes referenced by the identifier terms of a condition from the events
+    bound to each name. Each attribute is only extracted once.
+    """
+    def __init__(self, events_by_name: dict):
+        self.__events_by_name = events_by_name
+        self.__columns = {}
+
+    def get_column(self, term: IdentifierTerm):
+        key = (term.name, term.getattr_func)
+        if key not in self.__columns:
+            if term.name not in self.__events_by_name:
+                raise _NotVectorizableException()
+            column = np.array([term.getattr_func(event.payload) for event in self.__events_by_name[term.name]])
+            if column.dtype.kind not in "biuf":
+                raise _NotVectorizableException()
+            self.__columns[key] = column
+        return self.__columns[key]
+
+
+class _ChunkColumns:
+    """
+    Provides the parts of the extracted columns belonging to a single chunk, reshaped for broadcasting.
+    """
+    def __init__(self, extractor: _ColumnExtractor, chunks_by_name: dict):
+        self.__extractor = extractor
+        self.__chunks_by_name = chunks_by_name
+
+    def get_column(self, term: IdentifierTerm):
+        chunk_slice, shape = self.__chunks_by_name[term.name]
+        return self.__extractor.get_column(term)[chunk_slice].reshape(shape)
@@ -0,0 +1,164 @@
+"""
+Utilities shared by the unit tests: creating synthetic stock events and collecting the matches detected on them.
+"""
+from itertools import product
+from random import Random
+
+from base.Event import Event
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, NegationOperator
+from evaluation.EvaluationMechanism import EvaluationMechanism
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.IOUtils import Stream
+from misc.Stocks import MetastockDataFormatter
+
+
+def get_price(x):
+    return x["Peak Price"]
+
+
+def create_event(ticker: str, minute: int, price: float):
+    """
+    Creates a stock event occurring at the given minute of a fixed hour, such that the minute identifies the event.
+    """
+    return Event("%s,2008020109%02d,%s,%s,%s,%s,100" % (ticker, minute, price, price, price, price),
+                 MetastockDataFormatter())
+
+
+def create_events(seed: int, events_num: int = 40, tickers=("AAPL", "GOOG", "MSFT", "AMZN")):
+    """
+    Creates a random event for each of the first given number of minutes.
+    """
+    random_generator = Random(seed)
+    return [create_event(random_generator.choice(tickers), minute, random_generator.randint(1, 20))
+            for minute in range(events_num)]
+
+
+def create_stream(events):
+    stream = Stream()
+    for event in events:
+        stream.add_item(event)
+    stream.close()
+    return stream
+
+
+def create_random_statistics(args_num: int, seed: int):
+    """
+    Returns a random selectivity matrix and random arrival rates for the given number of pattern arguments.
+    """
+    random_generator = Random(seed)
+    selectivity_matrix = [[1.0 for _ in range(args_num)] for _ in range(args_num)]
+    for i in range(args_num):
+        for j in range(i + 1):
+            selectivity_matrix[i][j] = selectivity_matrix[j][i] = random_generator.uniform(0.05, 1.0)
+    arrival_rates = [random_generator.uniform(0.01, 1.0) for _ in range(args_num)]
+    return selectivity_matrix, arrival_rates
+
+
+def get_all_trees(items: tuple):
+    """
+    Returns all the bushy tree structures over the given items.
+    """
+    if len(items) == 1:
+        return [items[0]]
+    trees = []
+    for mask in range(1, 2 ** (len(items) - 1)):
+        first = tuple(items[i] for i in range(len(items)) if mask & (1 << i))
+        second = tuple(items[i] for i in range(len(items)) if not mask & (1 << i))
+        trees.extend((tree1, tree2) for tree1 in get_all_trees(first) for tree2 in get_all_trees(second))
+    return trees
+
+
+def describe_match(events):
+    """
+    Returns a comparable representation of a match consisting of the given events, which does not depend on the order
+    of the events in the match.
+    """
+    return tuple((event.event_type, event.timestamp.minute) for event in sorted(events, key=lambda e: e.timestamp))
+
+
+def get_matches(pattern: Pattern, events, tree_structure=None, storage_params: TreeStorageParameters = None):
+    """
+    Returns the sorted descriptions of the matches detected by a tree-based evaluation mechanism, using the tree
+    following the pattern order by default.
+    """
+    if tree_structure is None:
+        tree_structure = TrivialLeftDeepTreeBuilder().create_tree_structure(pattern)
+    return get_eval_mechanism_matches(TreeBasedEvaluationMechanism(pattern, tree_structure, storage_params), events)
+
+
+def get_eval_mechanism_matches(eval_mechanism: EvaluationMechanism, events):
+    """
+    Returns the sorted descriptions of the matches detected by the given evaluation mechanism.
+    """
+    matches = Stream()
+    eval_mechanism.eval(create_stream(events), matches)
+    return sorted(describe_match(match.events) for match in matches)
+
+
+def get_items(structure):
+    """
+    Returns the primitive events of the given structure, excluding the negated ones.
+    """
+    if isinstance(structure, (SeqOperator, AndOperator)):
+        return [item for arg in structure.args for item in get_items(arg)]
+    return [] if isinstance(structure, NegationOperator) else [structure]
+
+
+def is_valid(structure, pattern: Pattern, assignment: dict, events_by_type: dict):
+    """
+    Verifies the order and the negations of the given (nested) structure on the given assignment of events to names.
+    """
+    if not isinstance(structure, (SeqOperator, AndOperator)):
+        return True
+    args = structure.args
+    spans = [None if isinstance(arg, NegationOperator) else
+             (min(assignment[item.name].timestamp for item in get_items(arg)),
+              max(assignment[item.name].timestamp for item in get_items(arg))) for arg in args]
+    positive_spans = [span for span in spans if span is not None]
+    is_sequence = isinstance(structure, SeqOperator)
+    if is_sequence and any(positive_spans[i][1] > positive_spans[i + 1][0] for i in range(len(positive_spans) - 1)):
+        return False
+    for i, arg in enumerate(args):
+        if isinstance(arg, NegationOperator):
+            if is_sequence:
+                previous_spans = [span for span in spans[:i] if span is not None]
+                next_spans = [span for span in spans[i + 1:] if span is not None]
+                end = next_spans[0][0] if next_spans else None
+                start = previous_spans[-1][1] if previous_spans else end - pattern.window
+                end = end if end is not None else start + pattern.window
+            else:
+                start, end = min(span[0] for span in positive_spans), max(span[1] for span in positive_spans)
+            binding = {name: event.payload for name, event in assignment.items()}
+            condition = pattern.condition.get_formula_of(set(binding.keys()) | {arg.arg.name})
+            if any(start < e.timestamp < end and condition.eval(dict(binding, **{arg.arg.name: e.payload}))
+                   for e in events_by_type.get(arg.arg.event_type, [])):
+                return False
+        elif not is_valid(arg, pattern, assignment, events_by_type):
+            return False
+    return True
+
+
+def get_expected_matches(pattern: Pattern, events):
+    """
+    Returns the sorted descriptions of the matches of the given (possibly nested) pattern by enumerating all the
+    combinations of its positive events and verifying the order and the negations of each of them.
+    """
+    items = get_items(pattern.structure)
+    events_by_type = {}
+    for event in events:
+        events_by_type.setdefault(event.event_type, []).append(event)
+    matches = []
+    for combination in product(*(events_by_type.get(item.event_type, []) for item in items)):
+        timestamps = [e.timestamp for e in combination]
+        if max(timestamps) - min(timestamps) > pattern.window or len(set(map(id, combination))) < len(combination):
+            continue
+        assignment = {item.name: event for item, event in zip(items, combination)}
+        binding = {name: event.payload for name, event in assignment.items()}
+        if not pattern.condition.get_formula_of(set(binding.keys())).eval(binding):
+            continue
+        if is_valid(pattern.structure, pattern, assignment, events_by_type):
+            matches.append(describe_match(combination))
+    return sorted(matches)
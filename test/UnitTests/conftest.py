@@ -0,0 +1,7 @@
+"""
+Makes the modules shared by the unit tests (see UnitTestsUtils) importable regardless of the import mode of pytest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,140 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AndFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, OrOperator, NegationOperator, QItem
+from evaluation.AdaptiveEvaluationMechanism import AdaptiveTreeBasedEvaluationMechanism, AdaptiveEvaluationParameters
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from misc.ConsumptionPolicy import ConsumptionPolicy
+from misc.Statistics import calculate_bushy_tree_cost_function
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import get_price, create_events, get_matches, get_eval_mechanism_matches
+
+
+class AlternatingTreeBuilder(TrivialLeftDeepTreeBuilder):
+    """
+    Alternates between the pattern order and its reverse, such that every re-optimization attempt creates a new tree.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def _create_evaluation_order(self, pattern: Pattern):
+        self.calls += 1
+        if pattern.statistics_type == StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES:
+            # the statistics must refer to the events of the given pattern
+            selectivity_matrix, arrival_rates = pattern.statistics
+            args_num = len(pattern.get_primitive_items())
+            assert len(arrival_rates) == len(selectivity_matrix) == args_num
+        order = super()._create_evaluation_order(pattern)
+        return order if self.calls % 2 == 0 else list(reversed(order))
+
+
+class RecordingTreeBuilder(AlternatingTreeBuilder):
+    """
+    Records the statistics of every pattern it receives along with the tree structure created for it.
+    """
+    def __init__(self):
+        super().__init__()
+        self.created_structures = []
+
+    def create_tree_structure(self, pattern: Pattern):
+        tree_structure = super().create_tree_structure(pattern)
+        self.created_structures.append((pattern.statistics, tree_structure))
+        return tree_structure
+
+
+def create_disjunction_pattern():
+    disjuncts = [SeqOperator([QItem("AAPL", "a"), QItem("MSFT", "c"), QItem("AMZN", "d")]),
+                 AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")]),
+                 SeqOperator([QItem("AAPL", "a"), NegationOperator(QItem("GOOG", "b")), QItem("AMZN", "d")])]
+    condition = SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("c", get_price))
+    return Pattern(OrOperator(disjuncts), condition, timedelta(minutes=3))
+
+
+def get_disjunction_cost(tree_structure: tuple, created_structures: list, window: float):
+    return sum(calculate_bushy_tree_cost_function(disjunct_tree_structure, selectivity_matrix, arrival_rates, window)
+               for ((selectivity_matrix, arrival_rates), _), disjunct_tree_structure
+               in zip(created_structures, tree_structure))
+
+
+def create_pattern(negative_index: int = None, window: timedelta = timedelta(minutes=3),
+                   consumption_policy: ConsumptionPolicy = None):
+    args = [QItem("AAPL", "a"), QItem("MSFT", "c"), QItem("AMZN", "d")]
+    condition = SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("c", get_price))
+    if negative_index is not None:
+        args.insert(negative_index, NegationOperator(QItem("GOOG", "b")))
+        condition = AndFormula(condition, GreaterThanFormula(IdentifierTerm("b", get_price),
+                                                             IdentifierTerm("a", get_price)))
+    return Pattern(SeqOperator(args), condition, window, consumption_policy)
+
+
+class TestAdaptiveEvaluation(unittest.TestCase):
+    def assert_matches(self, pattern: Pattern):
+        total_matches_num = 0
+        for seed in range(3):
+            events = create_events(seed, 60)
+            expected = get_matches(pattern, events)
+            total_matches_num += len(expected)
+            eval_mechanism = AdaptiveTreeBasedEvaluationMechanism(
+                pattern, AlternatingTreeBuilder(), None,
+                AdaptiveEvaluationParameters(timedelta(minutes=2), timedelta(minutes=10), gain_threshold=float("-inf")))
+            self.assertEqual(get_eval_mechanism_matches(eval_mechanism, events), expected)
+            self.assertGreater(eval_mechanism.get_replacements_count(), 1)
+        self.assertGreater(total_matches_num, 0)
+
+    def test_negation_across_replacements(self):
+        # the negated events blocking the matches starting before and after a replacement may arrive on both sides of
+        # it, and the matches with a trailing negation are held until well after it
+        for negative_index in [None, 0, 1, 3]:
+            self.assert_matches(create_pattern(negative_index))
+
+    def test_consumption_policy(self):
+        # the default policy reports all the matches, as the sequential evaluation does
+        self.assert_matches(create_pattern(1, consumption_policy=ConsumptionPolicy()))
+
+    def test_disjunction(self):
+        # each argument is given the statistics of its own events, and the reverse order is created for an odd number
+        # of arguments at every re-optimization attempt
+        self.assert_matches(create_disjunction_pattern())
+
+    def test_disjunction_cost(self):
+        # the cost of a disjunction tree is the sum of the costs of the trees of its arguments, each calculated using
+        # the statistics of its own events
+        pattern = create_disjunction_pattern()
+        disjuncts_num = len(pattern.structure.args)
+        window = pattern.window.total_seconds()
+        replacements_count = rejections_count = 0
+        for seed in range(3):
+            tree_builder = RecordingTreeBuilder()
+            eval_mechanism = AdaptiveTreeBasedEvaluationMechanism(
+                pattern, tree_builder, None,
+                AdaptiveEvaluationParameters(timedelta(minutes=2), timedelta(minutes=10), gain_threshold=0))
+            get_eval_mechanism_matches(eval_mechanism, create_events(seed, 60))
+            tree_structure = TrivialLeftDeepTreeBuilder().create_tree_structure(pattern)
+            expected_replacements_count = 0
+            for i in range(0, len(tree_builder.created_structures), disjuncts_num):
+                created_structures = tree_builder.created_structures[i:i + disjuncts_num]
+                new_tree_structure = tuple(disjunct_tree_structure for _, disjunct_tree_structure in created_structures)
+                if new_tree_structure == tree_structure:
+                    continue
+                if get_disjunction_cost(new_tree_structure, created_structures, window) <= \
+                        get_disjunction_cost(tree_structure, created_structures, window):
+                    tree_structure = new_tree_structure
+                    expected_replacements_count += 1
+                else:
+                    rejections_count += 1
+            self.assertEqual(eval_mechanism.get_replacements_count(), expected_replacements_count)
+            replacements_count += expected_replacements_count
+        self.assertGreater(replacements_count, 0)
+        self.assertGreater(rejections_count, 0)
+
+    def test_pattern_is_not_modified(self):
+        pattern = create_pattern()
+        eval_mechanism = AdaptiveTreeBasedEvaluationMechanism(
+            pattern, AlternatingTreeBuilder(), None,
+            AdaptiveEvaluationParameters(timedelta(minutes=2), timedelta(minutes=10), gain_threshold=float("-inf")))
+        get_eval_mechanism_matches(eval_mechanism, create_events(0, 60))
+        self.assertGreater(eval_mechanism.get_replacements_count(), 0)
+        self.assertEqual(pattern.statistics_type, StatisticsTypes.NO_STATISTICS)
+        self.assertIsNone(pattern.statistics)
@@ -0,0 +1,109 @@
+import unittest
+from datetime import timedelta
+from random import Random
+
+from base.Formula import SmallerThanFormula, IdentifierTerm, TrueFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, QItem
+from evaluation.AdaptiveEvaluationMechanism import AdaptiveTreeBasedEvaluationMechanism, AdaptiveEvaluationParameters
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from evaluation.ParallelEvaluationMechanism import OperatorParallelEvaluationMechanism
+from evaluation.ParallelEvaluationMechanismFactory import ParallelEvaluationMechanismFactory, \
+    KeyPartitionedExecutionParameters, TimeSlicedExecutionParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.ConsumptionPolicy import ConsumptionPolicy, SelectionStrategies
+from UnitTestsUtils import get_price, create_event, get_matches
+
+
+class TestConsumptionPolicy(unittest.TestCase):
+    def setUp(self):
+        self.window = timedelta(minutes=10)
+        self.structure = SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), QItem("MSFT", "c")])
+        self.condition = SmallerThanFormula(IdentifierTerm("b", get_price), IdentifierTerm("c", get_price))
+        self.events = [create_event("AAPL", 1, 1), create_event("GOOG", 2, 10), create_event("GOOG", 3, 1),
+                       create_event("MSFT", 4, 5), create_event("MSFT", 5, 20)]
+
+    def get_policy_matches(self, policy: ConsumptionPolicy, events=None):
+        pattern = Pattern(self.structure, self.condition, self.window, policy)
+        return get_matches(pattern, self.events if events is None else events)
+
+    def test_match_any(self):
+        expected = [(("AAPL", 1), ("GOOG", 2), ("MSFT", 5)), (("AAPL", 1), ("GOOG", 3), ("MSFT", 4)),
+                    (("AAPL", 1), ("GOOG", 3), ("MSFT", 5))]
+        self.assertEqual(self.get_policy_matches(None), expected)
+        self.assertEqual(self.get_policy_matches(ConsumptionPolicy()), expected)
+
+    def test_match_single(self):
+        self.assertEqual(self.get_policy_matches(ConsumptionPolicy(SelectionStrategies.MATCH_SINGLE)),
+                         [(("AAPL", 1), ("GOOG", 3), ("MSFT", 4))])
+
+    def test_match_next(self):
+        # the AAPL event is combined with the first GOOG event only, which is then combined with the first MSFT event
+        # it satisfies the condition with
+        self.assertEqual(self.get_policy_matches(ConsumptionPolicy(SelectionStrategies.MATCH_NEXT)),
+                         [(("AAPL", 1), ("GOOG", 2), ("MSFT", 5))])
+
+    def test_tree_structures(self):
+        # the partial match extended first at each node depends on the order in which the events are joined
+        for tree_structure in [((0, 1), 2), (0, (1, 2)), ((1, 2), 0), ((2, 0), 1)]:
+            pattern = Pattern(self.structure, self.condition, self.window,
+                              ConsumptionPolicy(SelectionStrategies.MATCH_SINGLE))
+            self.assertEqual(get_matches(pattern, self.events, tree_structure),
+                             [(("AAPL", 1), ("GOOG", 3), ("MSFT", 4))])
+            pattern = Pattern(self.structure, self.condition, self.window,
+                              ConsumptionPolicy(SelectionStrategies.MATCH_NEXT))
+            if tree_structure == ((0, 1), 2):
+                self.assertEqual(get_matches(pattern, self.events, tree_structure),
+                                 [(("AAPL", 1), ("GOOG", 2), ("MSFT", 5))])
+            else:
+                self.assertRaisesRegex(NotImplementedError, "MATCH_NEXT", TreeBasedEvaluationMechanism, pattern,
+                                       tree_structure, None)
+
+    def test_match_single_events_are_disjoint(self):
+        self.structure = AndOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), QItem("MSFT", "c")])
+        random_generator = Random(0)
+        events = [create_event(random_generator.choice(["AAPL", "GOOG", "MSFT"]), minute,
+                               random_generator.randint(1, 20)) for minute in range(40)]
+        all_matches = self.get_policy_matches(None, events)
+        matches = self.get_policy_matches(ConsumptionPolicy(SelectionStrategies.MATCH_SINGLE), events)
+        self.assertGreater(len(matches), 1)
+        self.assertTrue(set(matches).issubset(all_matches))
+        events_in_matches = [event for match in matches for event in match]
+        self.assertEqual(len(events_in_matches), len(set(events_in_matches)))
+
+    def test_strict_contiguity(self):
+        self.structure = SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b")])
+        self.condition = TrueFormula()
+        events = [create_event("AAPL", 1, 1), create_event("MSFT", 2, 1), create_event("GOOG", 3, 1),
+                  create_event("AAPL", 4, 1), create_event("GOOG", 5, 1)]
+        self.assertEqual(len(self.get_policy_matches(None, events)), 3)
+        self.assertEqual(self.get_policy_matches(ConsumptionPolicy(strict_contiguity=True), events),
+                         [(("AAPL", 4), ("GOOG", 5))])
+
+    def test_unsupported_strict_contiguity(self):
+        structure = SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")])])
+        pattern = Pattern(structure, TrueFormula(), self.window, ConsumptionPolicy(strict_contiguity=True))
+        self.assertRaises(NotImplementedError, TreeBasedEvaluationMechanism, pattern, (0, 1), None)
+
+    def test_unsupported_distributed_evaluation(self):
+        # the policy cannot be applied by workers or trees evaluating a part of the stream independently
+        for policy in [ConsumptionPolicy(SelectionStrategies.MATCH_SINGLE), ConsumptionPolicy(strict_contiguity=True)]:
+            pattern = Pattern(self.structure, self.condition, self.window, policy)
+
+            def create_eval_mechanism():
+                return TreeBasedEvaluationMechanism(pattern, (0, (1, 2)), None)
+
+            for params in [KeyPartitionedExecutionParameters(lambda x: x["Stock Ticker"], 2),
+                           TimeSlicedExecutionParameters(2)]:
+                with self.assertRaisesRegex(Exception, "Consumption policies"):
+                    ParallelEvaluationMechanismFactory.build_parallel_eval_mechanism(params, create_eval_mechanism,
+                                                                                     pattern)
+            with self.assertRaisesRegex(Exception, "Consumption policies"):
+                OperatorParallelEvaluationMechanism(create_eval_mechanism(), 1, 10)
+            with self.assertRaisesRegex(Exception, "Consumption policies"):
+                AdaptiveTreeBasedEvaluationMechanism(pattern, TrivialLeftDeepTreeBuilder(), None,
+                                                     AdaptiveEvaluationParameters(timedelta(minutes=1),
+                                                                                  timedelta(minutes=10)))
+        # the default policy is supported
+        pattern = Pattern(self.structure, self.condition, self.window, ConsumptionPolicy())
+        OperatorParallelEvaluationMechanism(TreeBasedEvaluationMechanism(pattern, (0, (1, 2)), None), 1, 10)
@@ -0,0 +1,97 @@
+import unittest
+from datetime import timedelta
+from itertools import permutations
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AtomicTerm, AndFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, QItem
+from evaluation.BushyTreeBuilders import DynamicProgrammingBushyTreeBuilder
+from evaluation.CostModel import ExtendedCostModel, ExtendedCostModelParameters
+from evaluation.LeftDeepTreeBuilders import DynamicProgrammingLeftDeepTreeBuilder
+from evaluation.Storage import TreeStorageParameters
+from misc.Statistics import get_predicate_costs, calculate_predicate_costs
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import get_price, create_event, create_stream, create_random_statistics, get_all_trees
+
+
+def get_price_slowly(x):
+    sum(range(10000))
+    return x["Peak Price"]
+
+
+def create_pattern(operator, args_num: int, statistics=None):
+    args = [QItem("T%d" % i, "e%d" % i) for i in range(args_num)]
+    # a sortable condition between each pair of consecutive events
+    condition = SmallerThanFormula(IdentifierTerm("e0", get_price), IdentifierTerm("e1", get_price))
+    for i in range(1, args_num - 1):
+        condition = AndFormula(condition, SmallerThanFormula(IdentifierTerm("e%d" % i, get_price),
+                                                             IdentifierTerm("e%d" % (i + 1), get_price)))
+    pattern = Pattern(operator(args), condition, timedelta(minutes=1))
+    if statistics is not None:
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES, statistics)
+    return pattern
+
+
+class TestPredicateCosts(unittest.TestCase):
+    def setUp(self):
+        self.condition = AndFormula(
+            AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("b", get_price)),
+                       GreaterThanFormula(IdentifierTerm("a", get_price), AtomicTerm(5))),
+            SmallerThanFormula(IdentifierTerm("c", get_price_slowly), IdentifierTerm("d", get_price_slowly)))
+        self.pattern = Pattern(AndOperator([QItem("A", "a"), QItem("B", "b"), QItem("C", "c"), QItem("D", "d")]),
+                               self.condition, timedelta(minutes=1))
+
+    def test_default_predicate_costs(self):
+        self.assertEqual(get_predicate_costs(self.pattern), [[1.0, 1.0, 0.0, 0.0],
+                                                             [1.0, 0.0, 0.0, 0.0],
+                                                             [0.0, 0.0, 0.0, 1.0],
+                                                             [0.0, 0.0, 1.0, 0.0]])
+
+    def test_measured_predicate_costs(self):
+        events = [create_event(ticker, minute, minute) for minute in range(20) for ticker in "ABCD"]
+        costs = calculate_predicate_costs(self.pattern, create_stream(events), sample_size=10)
+        self.assertGreater(costs[2][3], costs[0][1])
+        self.assertEqual(costs[2][3], costs[3][2])
+        self.assertEqual(costs[0][2], 0.0)
+        # normalized such that an atomic condition costs 1 on average
+        self.assertAlmostEqual(sum(map(sum, costs)), sum(map(sum, get_predicate_costs(self.pattern))))
+
+
+class TestExtendedCostModel(unittest.TestCase):
+    def test_sorted_storage_is_cheaper(self):
+        for operator in [SeqOperator, AndOperator]:
+            pattern = create_pattern(operator, 4, create_random_statistics(4, 0))
+            unsorted_model = ExtendedCostModel(pattern, TreeStorageParameters(sort_storage=False))
+            sorted_model = ExtendedCostModel(pattern, TreeStorageParameters(sort_storage=True))
+            for tree in [(((0, 1), 2), 3), ((0, 1), (2, 3))]:
+                self.assertLess(sorted_model.get_tree_cost(tree), unsorted_model.get_tree_cost(tree))
+
+    def test_expensive_predicate_is_evaluated_late(self):
+        args_num = 4
+        statistics = ([[1.0] * args_num for _ in range(args_num)], [1.0] * args_num)
+        predicate_costs = [[0.0] * args_num for _ in range(args_num)]
+        predicate_costs[0][1] = predicate_costs[1][0] = 1000.0
+        pattern = create_pattern(AndOperator, args_num, statistics)
+        builder = DynamicProgrammingLeftDeepTreeBuilder(ExtendedCostModelParameters(predicate_costs))
+        order = builder._create_evaluation_order(pattern)
+        self.assertIn(order[-1], (0, 1))
+
+    def test_dynamic_programming_is_optimal(self):
+        for operator in [SeqOperator, AndOperator]:
+            for sort_storage in [False, True]:
+                for args_num in range(1, 6):
+                    all_trees = get_all_trees(tuple(range(args_num)))
+                    for seed in range(3):
+                        selectivity_matrix, arrival_rates = create_random_statistics(args_num, seed)
+                        pattern = create_pattern(operator, args_num, (selectivity_matrix, arrival_rates))
+                        storage_params = TreeStorageParameters(sort_storage=sort_storage)
+                        cost_model = ExtendedCostModel(pattern, storage_params)
+                        order = DynamicProgrammingLeftDeepTreeBuilder.find_order_by_cost_model(
+                            cost_model, selectivity_matrix, arrival_rates, 60)
+                        self.assertAlmostEqual(cost_model.get_order_cost(order),
+                                               min(cost_model.get_order_cost(list(p))
+                                                   for p in permutations(range(args_num))))
+                        tree = DynamicProgrammingBushyTreeBuilder(ExtendedCostModelParameters(),
+                                                                  storage_params).create_tree_structure(pattern)
+                        self.assertAlmostEqual(cost_model.get_tree_cost(tree),
+                                               min(cost_model.get_tree_cost(t) for t in all_trees))
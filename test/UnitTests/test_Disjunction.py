@@ -0,0 +1,95 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AtomicTerm, AndFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, OrOperator, NegationOperator, QItem
+from evaluation.BushyTreeBuilders import DynamicProgrammingBushyTreeBuilder, ZStreamTreeBuilder, ZStreamOrdTreeBuilder
+from evaluation.CostModel import ExtendedCostModelParameters
+from evaluation.IterativeImprovement import IterativeImprovementType
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder, AscendingFrequencyTreeBuilder, \
+    GreedyLeftDeepTreeBuilder, IterativeImprovementLeftDeepTreeBuilder, DynamicProgrammingLeftDeepTreeBuilder
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.Statistics import calculate_statistics, get_occurrences_dict, MissingStatisticsException
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import get_price, create_events, create_stream, get_matches
+
+
+def create_condition():
+    return AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("b", get_price)),
+                      GreaterThanFormula(IdentifierTerm("a", get_price), AtomicTerm(5)))
+
+
+class TestDisjunction(unittest.TestCase):
+    def setUp(self):
+        self.disjuncts = [SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b")]),
+                          AndOperator([QItem("AAPL", "a"), QItem("MSFT", "c")]),
+                          SeqOperator([QItem("AAPL", "a"), NegationOperator(QItem("AMZN", "d")), QItem("GOOG", "b")]),
+                          QItem("AMZN", "d")]
+        self.window = timedelta(minutes=5)
+
+    def test_matches_union_of_disjuncts(self):
+        pattern = Pattern(OrOperator(self.disjuncts), create_condition(), self.window)
+        for seed in range(3):
+            events = create_events(seed)
+            for storage_params in [None, TreeStorageParameters(sort_storage=True)]:
+                expected = sorted(match for disjunct in pattern.get_disjunct_patterns()
+                                  for match in get_matches(disjunct, events, storage_params=storage_params))
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(get_matches(pattern, events, storage_params=storage_params), expected)
+
+    def test_leaves_are_shared(self):
+        pattern = Pattern(OrOperator(self.disjuncts), create_condition(), self.window)
+        eval_mechanism = TreeBasedEvaluationMechanism(
+            pattern, TrivialLeftDeepTreeBuilder().create_tree_structure(pattern), None)
+        # a single leaf per event type and name receives the events
+        self.assertEqual(sorted(leaf.get_event_type() for leaf in eval_mechanism.get_tree().get_leaves()),
+                         ["AAPL", "AMZN", "GOOG", "MSFT"])
+
+    def test_tree_structure(self):
+        pattern = Pattern(OrOperator(self.disjuncts), create_condition(), self.window)
+        self.assertEqual(TrivialLeftDeepTreeBuilder().create_tree_structure(pattern), ((0, 1), (0, 1), ((0, 1), 2), 0))
+        no_statistics_pattern = Pattern(OrOperator([QItem("AAPL", "a"), QItem("GOOG", "b")]), create_condition())
+        self.assertRaises(MissingStatisticsException, DynamicProgrammingBushyTreeBuilder().create_tree_structure,
+                          no_statistics_pattern)
+
+    def test_disjunct_statistics(self):
+        pattern = Pattern(OrOperator(self.disjuncts), create_condition(), self.window)
+        events = create_events(0)
+        # the statistics refer to the events a, b, c and d in the order of their first appearance
+        selectivity_matrix, arrival_rates = calculate_statistics(pattern, create_stream(events))
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES,
+                               (selectivity_matrix, arrival_rates))
+        disjunct_statistics = [disjunct.statistics for disjunct in pattern.get_disjunct_patterns()]
+        self.assertEqual(disjunct_statistics[0], ([row[:2] for row in selectivity_matrix[:2]], arrival_rates[:2]))
+        self.assertEqual(disjunct_statistics[1], ([[selectivity_matrix[i][j] for j in (0, 2)] for i in (0, 2)],
+                                                  [arrival_rates[0], arrival_rates[2]]))
+        self.assertEqual(disjunct_statistics[2], ([[selectivity_matrix[i][j] for j in (0, 3, 1)] for i in (0, 3, 1)],
+                                                  [arrival_rates[i] for i in (0, 3, 1)]))
+        self.assertEqual(disjunct_statistics[3], ([[selectivity_matrix[3][3]]], [arrival_rates[3]]))
+        pattern.set_statistics(StatisticsTypes.ARRIVAL_RATES, arrival_rates)
+        self.assertEqual([disjunct.statistics for disjunct in pattern.get_disjunct_patterns()],
+                         [statistics[1] for statistics in disjunct_statistics])
+
+    def test_tree_builders(self):
+        pattern = Pattern(OrOperator(self.disjuncts), create_condition(), self.window)
+        events = create_events(0)
+        expected = get_matches(pattern, events)
+        self.assertGreater(len(expected), 0)
+        pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES,
+                               calculate_statistics(pattern, create_stream(events)))
+        builders = [GreedyLeftDeepTreeBuilder(),
+                    IterativeImprovementLeftDeepTreeBuilder(20, IterativeImprovementType.SWAP_BASED),
+                    DynamicProgrammingLeftDeepTreeBuilder(),
+                    DynamicProgrammingLeftDeepTreeBuilder(ExtendedCostModelParameters()),
+                    DynamicProgrammingBushyTreeBuilder(),
+                    DynamicProgrammingBushyTreeBuilder(ExtendedCostModelParameters()),
+                    ZStreamTreeBuilder(), ZStreamOrdTreeBuilder()]
+        for builder in builders:
+            tree_structure = builder.create_tree_structure(pattern)
+            self.assertEqual(len(tree_structure), len(self.disjuncts))
+            self.assertEqual(get_matches(pattern, events, tree_structure), expected)
+        pattern.set_statistics(StatisticsTypes.FREQUENCY_DICT, get_occurrences_dict(pattern, create_stream(events)))
+        self.assertEqual(get_matches(pattern, events, AscendingFrequencyTreeBuilder().create_tree_structure(pattern)),
+                         expected)
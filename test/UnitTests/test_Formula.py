@@ -1,4 +1,6 @@
+import pickle
 import unittest
+from base.Event import EventPayload
 from base.Formula import *
 
 
@@ -99,6 +101,78 @@ class TestFormula(unittest.TestCase):
 
         self.assertIsNotNone(simplified_Formula)
 
+    def test_residualFormula(self):
+        term_id_x = IdentifierTerm("x", lambda x: x)
+        term_id_y = IdentifierTerm("y", lambda x: x)
+        term_id_z = IdentifierTerm("z", lambda x: x)
+        formula_x_gt_5 = GreaterThanFormula(term_id_x, AtomicTerm(5))
+        formula_x_st_y = SmallerThanFormula(term_id_x, term_id_y)
+        formula_y_st_z = SmallerThanFormula(term_id_y, term_id_z)
+        formula = AndFormula(AndFormula(formula_x_gt_5, formula_x_st_y), formula_y_st_z)
+
+        # only the conditions referring to both x and y are left
+        residual = formula.get_residual_formula_of({"x", "y"}, [{"x"}, {"y"}])
+        self.assertEqual(repr(residual), repr(formula_x_st_y))
+        residual = formula.get_residual_formula_of({"x", "y", "z"}, [{"x", "y"}, {"z"}])
+        self.assertEqual(repr(residual), repr(formula_y_st_z))
+        residual = formula.get_residual_formula_of({"x", "y", "z"}, [{"x"}, {"y", "z"}])
+        self.assertEqual(repr(residual), repr(formula_x_st_y))
+        self.assertIsNone(formula.get_residual_formula_of({"x", "y"}, [{"x", "y"}]))
+        self.assertIsNone(formula_x_gt_5.get_residual_formula_of({"x"}, [{"x"}]))
+
+
+    def test_conjunctionEvaluation(self):
+        evaluated = []
+
+        def create_formula(name: str, value: int):
+            def getter(x):
+                evaluated.append(name)
+                return x
+            return EqFormula(IdentifierTerm(name, getter), AtomicTerm(value))
+
+        formula_x = create_formula("x", 1)
+        formula_y = create_formula("y", 1)
+        formula_z = create_formula("z", 1)
+        formula = AndFormula(AndFormula(formula_x, formula_y), formula_z)
+        self.assertEqual(formula.get_conjuncts(), [formula_x, formula_y, formula_z])
+
+        # the evaluation stops at the first failing conjunct
+        self.assertFalse(formula.eval({"x": 1, "y": 2, "z": 1}))
+        self.assertEqual(evaluated, ["x", "y"])
+        self.assertTrue(formula.eval({"x": 1, "y": 1, "z": 1}))
+
+        # the conjunct failing most often is moved to the front
+        for _ in range(AndFormula.REORDER_INTERVAL):
+            formula.eval({"x": 1, "y": 1, "z": 2})
+        self.assertEqual(formula.get_conjuncts()[0], formula_z)
+        del evaluated[:]
+        self.assertFalse(formula.eval({"x": 1, "y": 1, "z": 2}))
+        self.assertEqual(evaluated, ["z"])
+
+
+    def test_memoizedAttributes(self):
+        calls = []
+
+        def getter(x):
+            calls.append(x["price"])
+            return x["price"]
+
+        payload = EventPayload({"price": 7})
+        formula = AndFormula(GreaterThanFormula(IdentifierTerm("x", getter), AtomicTerm(5)),
+                             SmallerThanFormula(IdentifierTerm("x", getter), AtomicTerm(10)))
+        self.assertTrue(formula.eval({"x": payload}))
+        self.assertTrue(formula.eval({"x": payload}))
+        self.assertEqual(calls, [7])
+        # plain dictionaries are not memoized
+        self.assertTrue(formula.eval({"x": {"price": 7}}))
+        self.assertEqual(calls, [7, 7, 7])
+        # the memoized values are not pickled along with the payload
+        unpickled_payload = pickle.loads(pickle.dumps(payload))
+        self.assertEqual(unpickled_payload, {"price": 7})
+        self.assertEqual(str(unpickled_payload), str({"price": 7}))
+        self.assertTrue(formula.eval({"x": unpickled_payload}))
+        self.assertEqual(calls, [7, 7, 7, 7])
+
+
 if __name__ == "__main__":
     unittest.main()
-    
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from misc.IOUtils import file_input
+from misc.Stocks import MetastockDataFormatter
+
+
+class TestFileInput(unittest.TestCase):
+    def setUp(self):
+        self.lines = ["AAPL,200802010900,1,1,1,1,100\n", "GOOG,200802010901,2,2,2,2,100\n"]
+
+    def write_file(self, lines):
+        file_descriptor, file_path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, "w") as f:
+            f.writelines(lines)
+        self.addCleanup(os.remove, file_path)
+        return file_path
+
+    def test_pipelined(self):
+        file_path = self.write_file(self.lines)
+        for pipelined in [False, True]:
+            events = file_input(file_path, MetastockDataFormatter(), pipelined)
+            self.assertEqual([event.event_type for event in events], ["AAPL", "GOOG"])
+
+    def test_pipelined_parsing_error(self):
+        # the events parsed before the malformed line are received, followed by the parsing error
+        file_path = self.write_file(self.lines + ["MSFT,malformed,3,3,3,3,100\n"])
+        events = file_input(file_path, MetastockDataFormatter(), pipelined=True)
+        self.assertEqual([next(events).event_type for _ in range(len(self.lines))], ["AAPL", "GOOG"])
+        self.assertRaises(ValueError, next, events)
+
+    def test_pipelined_missing_file(self):
+        events = file_input(os.path.join(tempfile.gettempdir(), "missing_events_file.txt"), MetastockDataFormatter(),
+                            pipelined=True)
+        self.assertRaises(FileNotFoundError, list, events)
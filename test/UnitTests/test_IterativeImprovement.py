@@ -0,0 +1,72 @@
+import random
+import unittest
+from datetime import timedelta
+from itertools import permutations
+
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, QItem
+
+from evaluation.IterativeImprovement import LeftDeepCostModel, IterativeImprovementAlgorithmBuilder, \
+    IterativeImprovementType
+from evaluation.LeftDeepTreeBuilders import IterativeImprovementLeftDeepTreeBuilder, IterativeImprovementInitType, \
+    _run_local_search
+from misc.Statistics import calculate_left_deep_tree_cost_function
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import create_random_statistics
+
+
+class TestLocalSearch(unittest.TestCase):
+    def test_incremental_cost(self):
+        selectivity_matrix, arrival_rates = create_random_statistics(8, 0)
+        order = list(range(8))
+        cost_model = LeftDeepCostModel(order, selectivity_matrix, arrival_rates, 60)
+        random_generator = random.Random(0)
+        for _ in range(50):
+            i = random_generator.randint(0, 7)
+            j = random_generator.randint(i, 7)
+            order[i], order[j] = order[j], order[i]
+            delta, new_pm_sizes = cost_model.get_move_delta(i, j)
+            cost_model.apply_move(i, new_pm_sizes, delta)
+            self.assertAlmostEqual(cost_model.cost, calculate_left_deep_tree_cost_function(
+                order, selectivity_matrix, arrival_rates, 60))
+
+    def test_search_algorithms(self):
+        random.seed(0)
+        for ii_type in [IterativeImprovementType.SIMULATED_ANNEALING, IterativeImprovementType.TABU_SEARCH]:
+            algorithm = IterativeImprovementAlgorithmBuilder.create_ii_algorithm(ii_type)
+            for args_num in range(1, 7):
+                selectivity_matrix, arrival_rates = create_random_statistics(args_num, args_num)
+                initial_order = list(range(args_num))
+                order = algorithm.execute(200, initial_order, selectivity_matrix, arrival_rates, 60)
+                self.assertEqual(sorted(order), initial_order)
+                optimal_cost = min(calculate_left_deep_tree_cost_function(list(p), selectivity_matrix, arrival_rates,
+                                                                          60)
+                                   for p in permutations(range(args_num)))
+                self.assertAlmostEqual(calculate_left_deep_tree_cost_function(order, selectivity_matrix,
+                                                                              arrival_rates, 60), optimal_cost)
+
+
+class TestLocalSearchRestarts(unittest.TestCase):
+    def setUp(self):
+        selectivity_matrix, arrival_rates = create_random_statistics(9, 0)
+        self.pattern = Pattern(SeqOperator([QItem(str(i), str(i)) for i in range(9)]), None, timedelta(minutes=1))
+        self.pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES,
+                                    (selectivity_matrix, arrival_rates))
+
+    def test_reproducible_restarts(self):
+        orders = [IterativeImprovementLeftDeepTreeBuilder(50, restarts_num=4, workers_num=workers_num, seed=7)
+                  .create_tree_structure(self.pattern) for workers_num in [1, 2, 2]]
+        self.assertEqual(orders[0], orders[1])
+        self.assertEqual(orders[1], orders[2])
+
+    def test_best_restart_is_selected(self):
+        selectivity_matrix, arrival_rates = self.pattern.statistics
+        single_costs = []
+        for seed in range(7, 11):
+            order = _run_local_search(50, IterativeImprovementType.SWAP_BASED, IterativeImprovementInitType.RANDOM,
+                                      selectivity_matrix, arrival_rates, 60, seed)
+            single_costs.append(calculate_left_deep_tree_cost_function(order, selectivity_matrix, arrival_rates, 60))
+        builder = IterativeImprovementLeftDeepTreeBuilder(50, restarts_num=4, workers_num=1, seed=7)
+        order = builder._create_evaluation_order(self.pattern)
+        self.assertEqual(calculate_left_deep_tree_cost_function(order, selectivity_matrix, arrival_rates, 60),
+                         min(single_costs))
@@ -0,0 +1,119 @@
+import unittest
+from datetime import timedelta
+from itertools import combinations
+
+from base.Formula import EqFormula, SmallerThanFormula, IdentifierTerm, AtomicTerm, AndFormula, TrueFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, KleeneClosureOperator, QItem
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from UnitTestsUtils import get_price, create_event, create_events, describe_match, get_matches
+
+
+def is_rising(payloads):
+    return all(payloads[i]["Peak Price"] < payloads[i + 1]["Peak Price"] for i in range(len(payloads) - 1))
+
+
+def get_first_price(payloads):
+    return payloads[0]["Peak Price"]
+
+
+def get_expected_matches(events, window: timedelta, max_size: int = None):
+    """
+    Returns the matches of SEQ(a, KC(b), c), where b is a rising run, a is cheaper than the first b and the match
+    occurs within the window, by enumerating all the event combinations.
+    """
+    a_events = [e for e in events if e.event_type == "AAPL"]
+    b_events = [e for e in events if e.event_type == "GOOG"]
+    c_events = [e for e in events if e.event_type == "MSFT"]
+    matches = []
+    for size in range(1, len(b_events) + 1 if max_size is None else max_size + 1):
+        for run in combinations(b_events, size):
+            if not is_rising([e.payload for e in run]):
+                continue
+            for a in a_events:
+                for c in c_events:
+                    if a.timestamp <= run[0].timestamp and run[-1].timestamp <= c.timestamp and \
+                            c.timestamp - a.timestamp <= window and get_price(a.payload) < get_price(run[0].payload):
+                        matches.append(describe_match((a,) + run + (c,)))
+    return sorted(matches)
+
+
+class TestKleeneClosure(unittest.TestCase):
+    def create_pattern(self, window: timedelta, max_size: int = None):
+        condition = AndFormula(EqFormula(IdentifierTerm("b", is_rising), AtomicTerm(True)),
+                               SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("b", get_first_price)))
+        return Pattern(SeqOperator([QItem("AAPL", "a"), KleeneClosureOperator(QItem("GOOG", "b"), max_size=max_size),
+                                    QItem("MSFT", "c")]), condition, window)
+
+    def test_matches_all_runs(self):
+        window = timedelta(minutes=8)
+        for seed in range(3):
+            events = create_events(seed, 24, ("AAPL", "GOOG", "MSFT"))
+            expected = get_expected_matches(events, window)
+            self.assertGreater(len(expected), 0)
+            for tree_structure in [((0, 1), 2), (0, (1, 2)), ((2, 1), 0)]:
+                for storage_params in [None, TreeStorageParameters(sort_storage=True)]:
+                    self.assertEqual(get_matches(self.create_pattern(window), events, tree_structure,
+                                                 storage_params), expected)
+
+    def test_size_bound(self):
+        window = timedelta(minutes=10)
+        events = create_events(0, 24, ("AAPL", "GOOG", "MSFT"))
+        self.assertEqual(get_matches(self.create_pattern(window, max_size=2), events),
+                         get_expected_matches(events, window, max_size=2))
+
+    def test_closure_in_conjunction(self):
+        pattern = Pattern(AndOperator([QItem("AAPL", "a"), KleeneClosureOperator(QItem("GOOG", "b"), min_size=2)]),
+                          TrueFormula(), timedelta(minutes=2))
+        events = [create_event("GOOG", 0, 1), create_event("GOOG", 1, 1), create_event("AAPL", 2, 1),
+                  create_event("GOOG", 3, 1)]
+        # {b0, b1} with a2, {b1, b3} with a2
+        self.assertEqual(len(get_matches(pattern, events)), 2)
+
+    def test_closure_only(self):
+        pattern = Pattern(SeqOperator([KleeneClosureOperator(QItem("GOOG", "b"), max_size=2)]), TrueFormula(),
+                          timedelta(minutes=2))
+        events = [create_event("GOOG", 0, 1), create_event("AAPL", 1, 1), create_event("GOOG", 2, 1),
+                  create_event("GOOG", 5, 1)]
+        self.assertEqual(get_matches(pattern, events), [(("GOOG", 0),), (("GOOG", 0), ("GOOG", 2)), (("GOOG", 2),),
+                                                        (("GOOG", 5),)])
+
+    def test_subsets_are_not_stored(self):
+        pattern = self.create_pattern(timedelta.max)
+        eval_mechanism = TreeBasedEvaluationMechanism(pattern, ((0, 1), 2), None)
+        for minute in range(12):
+            eval_mechanism.handle_event(create_event("GOOG", minute, minute))
+        closure_node = [leaf for leaf in eval_mechanism.get_tree().get_leaves() if leaf.get_event_type() == "GOOG"][0]
+        self.assertEqual(len(closure_node._partial_matches), 12)
+        self.assertEqual(len(list(closure_node.get_partial_matches(None))), 2 ** 12 - 1)
+        # the enumerated runs are cached as bitmasks over the stored events rather than as partial matches
+        cached_runs = [run for runs in closure_node._partial_matches._masks_by_event for run in runs]
+        self.assertEqual(len(cached_runs), 2 ** 12 - 1)
+        self.assertTrue(all(isinstance(run, int) for run in cached_runs))
+
+    def test_subsets_are_enumerated_once(self):
+        evaluations = []
+
+        def is_counted_rising(payloads):
+            evaluations.append(payloads)
+            return is_rising(payloads)
+
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), KleeneClosureOperator(QItem("GOOG", "b")),
+                                       QItem("MSFT", "c")]),
+                          EqFormula(IdentifierTerm("b", is_counted_rising), AtomicTerm(True)), timedelta.max)
+        eval_mechanism = TreeBasedEvaluationMechanism(pattern, (0, (1, 2)), None)
+        for minute in range(8):
+            eval_mechanism.handle_event(create_event("GOOG", minute, minute))
+        # no MSFT event has arrived yet, hence the runs cannot be combined and are not enumerated
+        self.assertEqual(len(evaluations), 0)
+        eval_mechanism.handle_event(create_event("MSFT", 8, 1))
+        self.assertEqual(len(evaluations), 2 ** 8 - 1)
+        # the following events only evaluate the condition on the runs ending at the new GOOG events
+        eval_mechanism.handle_event(create_event("MSFT", 9, 1))
+        eval_mechanism.handle_event(create_event("GOOG", 10, 10))
+        self.assertEqual(len(evaluations), 2 ** 9 - 1)
+
+    def test_size_bounds_in_representation(self):
+        self.assertNotEqual(repr(KleeneClosureOperator(QItem("GOOG", "b"), max_size=2)),
+                            repr(KleeneClosureOperator(QItem("GOOG", "b"), max_size=3)))
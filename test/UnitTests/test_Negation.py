@@ -0,0 +1,59 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AndFormula, TrueFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, NegationOperator, QItem
+from evaluation.Nodes.NegationNode import NegationNode
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from UnitTestsUtils import get_price, create_event, create_events, get_matches, get_expected_matches
+
+
+def create_pattern(operator, negative_index: int, window: timedelta = timedelta(minutes=10)):
+    args = [QItem("AAPL", "a"), QItem("MSFT", "c"), QItem("AMZN", "d")]
+    args.insert(negative_index, NegationOperator(QItem("GOOG", "b")))
+    # the negated event only blocks the matches if it is more expensive than a
+    condition = AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("c", get_price)),
+                           GreaterThanFormula(IdentifierTerm("b", get_price), IdentifierTerm("a", get_price)))
+    return Pattern(operator(args), condition, window)
+
+
+class TestNegation(unittest.TestCase):
+    def test_sequence_negation(self):
+        for negative_index in range(4):
+            pattern = create_pattern(SeqOperator, negative_index)
+            for seed in range(3):
+                events = create_events(seed)
+                expected = get_expected_matches(pattern, events)
+                for tree_structure in [(((0, 1), 2), 3), ((0, 3), (1, 2)), (((3, 2), 1), 0)]:
+                    for storage_params in [None, TreeStorageParameters(sort_storage=True)]:
+                        self.assertEqual(get_matches(pattern, events, tree_structure, storage_params), expected)
+
+    def test_conjunction_negation(self):
+        pattern = create_pattern(AndOperator, 1)
+        for seed in range(3):
+            events = create_events(seed)
+            expected = get_expected_matches(pattern, events)
+            self.assertGreater(len(expected), 0)
+            for tree_structure in [(((0, 1), 2), 3), ((0, 2), (1, 3))]:
+                self.assertEqual(get_matches(pattern, events, tree_structure), expected)
+
+    def test_negation_node_placement(self):
+        # the interval of b is defined by a and c, hence the partial matches are pruned before joining d
+        eval_mechanism = TreeBasedEvaluationMechanism(create_pattern(SeqOperator, 1), (((0, 1), 2), 3), None)
+        negation_node, _ = eval_mechanism.get_tree().get_subtrees_at_depth(1)
+        self.assertIsInstance(negation_node, NegationNode)
+        self.assertEqual([event_def[0] for event_def in negation_node.get_event_definitions()], [0, 2])
+
+    def test_trailing_negation_is_held(self):
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), NegationOperator(QItem("GOOG", "b"))]), TrueFormula(),
+                          timedelta(minutes=2))
+        eval_mechanism = TreeBasedEvaluationMechanism(pattern, (0, 1), None)
+        self.assertEqual(eval_mechanism.handle_event(create_event("AAPL", 0, 1)), [])
+        self.assertEqual(eval_mechanism.handle_event(create_event("AAPL", 1, 1)), [])
+        # ends the interval of the first match and blocks the second one
+        self.assertEqual(len(eval_mechanism.handle_event(create_event("GOOG", 2, 1))), 1)
+        self.assertEqual(eval_mechanism.handle_event(create_event("MSFT", 5, 1)), [])
+        self.assertEqual(eval_mechanism.handle_event(create_event("AAPL", 6, 1)), [])
+        self.assertEqual(len(eval_mechanism.flush_pending_matches()), 1)
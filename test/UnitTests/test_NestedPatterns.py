@@ -0,0 +1,92 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AtomicTerm, AndFormula, TrueFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, NegationOperator, KleeneClosureOperator, QItem
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from evaluation.Nodes.InternalNode import SeqNode, AndNode
+from evaluation.Storage import TreeStorageParameters
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from UnitTestsUtils import get_price, create_events, get_matches, get_expected_matches
+
+
+def create_condition():
+    return AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("c", get_price)),
+                      SmallerThanFormula(IdentifierTerm("x", get_price), IdentifierTerm("b", get_price)))
+
+
+class TestNestedPatterns(unittest.TestCase):
+    def setUp(self):
+        self.window = timedelta(minutes=12)
+
+    def assert_matches(self, structure, tree_structures):
+        pattern = Pattern(structure, create_condition(), self.window)
+        total_matches_num = 0
+        for seed in range(3):
+            events = create_events(seed, tickers=("AAPL", "GOOG", "MSFT", "AMZN", "IBM"))
+            expected = get_expected_matches(pattern, events)
+            total_matches_num += len(expected)
+            for tree_structure in tree_structures:
+                for storage_params in [None, TreeStorageParameters(sort_storage=True)]:
+                    self.assertEqual(get_matches(pattern, events, tree_structure, storage_params), expected)
+        self.assertGreater(total_matches_num, 0)
+
+    def test_conjunction_in_sequence(self):
+        structure = SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")]),
+                                 QItem("AMZN", "d")])
+        self.assert_matches(structure, [((0, 1), 2), (0, (1, 2)), ((2, 0), 1)])
+
+    def test_sequence_in_conjunction(self):
+        structure = AndOperator([QItem("AAPL", "a"), SeqOperator([QItem("GOOG", "b"), QItem("MSFT", "c")]),
+                                 QItem("AMZN", "d")])
+        self.assert_matches(structure, [((0, 1), 2), ((2, 1), 0)])
+
+    def test_deep_nesting(self):
+        structure = SeqOperator([AndOperator([QItem("AAPL", "a"), SeqOperator([QItem("GOOG", "b"),
+                                                                               QItem("MSFT", "c")])]),
+                                 QItem("AMZN", "d")])
+        self.assert_matches(structure, [(0, 1), (1, 0)])
+
+    def test_nested_negation(self):
+        # the interval of the negated event starts at the latest event of the nested conjunction
+        structure = SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")]),
+                                 NegationOperator(QItem("IBM", "x")), QItem("AMZN", "d")])
+        self.assert_matches(structure, [(((0, 1), 2), 3), ((3, 2), (0, 1))])
+        structure = SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c"),
+                                                                  NegationOperator(QItem("IBM", "x"))])])
+        self.assert_matches(structure, [(0, 1), (1, 0)])
+
+    def test_nested_trailing_negation(self):
+        # the partial matches of the nested sequence are held until a time window after their latest event, by which
+        # time the events preceding them in the enclosing sequence may have expired
+        structure = SeqOperator([QItem("AAPL", "a"), SeqOperator([QItem("GOOG", "b"),
+                                                                  NegationOperator(QItem("MSFT", "c"))]),
+                                 QItem("AMZN", "d")])
+        condition = AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("d", get_price)),
+                               GreaterThanFormula(IdentifierTerm("c", get_price), AtomicTerm(18)))
+        pattern = Pattern(structure, condition, timedelta(minutes=10))
+        for seed in range(3):
+            events = create_events(seed, 60)
+            expected = get_expected_matches(pattern, events)
+            self.assertGreater(len(expected), 0)
+            for tree_structure in [((0, 1), 2), (0, (1, 2)), ((2, 1), 0)]:
+                for storage_params in [None, TreeStorageParameters(sort_storage=True)]:
+                    self.assertEqual(get_matches(pattern, events, tree_structure, storage_params), expected)
+
+    def test_node_types(self):
+        structure = SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")]),
+                                 QItem("AMZN", "d")])
+        eval_mechanism = TreeBasedEvaluationMechanism(Pattern(structure, TrueFormula(), self.window), ((0, 1), 2),
+                                                      None)
+        tree = eval_mechanism.get_tree()
+        self.assertIsInstance(tree.get_subtrees_at_depth(0)[0], SeqNode)
+        _, conjunction_node = tree.get_subtrees_at_depth(2)[:2]
+        self.assertIsInstance(conjunction_node, AndNode)
+        self.assertEqual([event_def[0] for event_def in conjunction_node.get_event_definitions()], [1, 2])
+
+    def test_unsupported_nested_closure(self):
+        structure = SeqOperator([QItem("AAPL", "a"), KleeneClosureOperator(AndOperator([QItem("GOOG", "b"),
+                                                                                        QItem("MSFT", "c")]))])
+        self.assertRaises(NotImplementedError, TreeBasedEvaluationMechanism,
+                          Pattern(structure, TrueFormula(), self.window), (0, 1), None)
@@ -0,0 +1,167 @@
+import asyncio
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AtomicTerm, AndFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, NegationOperator, QItem
+from CEP import CEP
+from evaluation.ParallelEvaluationMechanism import PartitionedEvaluationMechanism
+from evaluation.ParallelEvaluationMechanismFactory import ParallelEvaluationMechanismFactory, \
+    ParallelExecutionParameters, KeyPartitionedExecutionParameters, TimeSlicedExecutionParameters, \
+    OperatorParallelExecutionParameters
+from evaluation.LeftDeepTreeBuilders import TrivialLeftDeepTreeBuilder
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from misc.ConsumptionPolicy import ConsumptionPolicy, SelectionStrategies
+from UnitTestsUtils import get_price, create_events, get_matches, get_eval_mechanism_matches, describe_match
+
+
+def create_pattern(negative_index: int = None, window: timedelta = timedelta(minutes=10),
+                   consumption_policy: ConsumptionPolicy = None, types=("AAPL", "GOOG", "MSFT", "AMZN")):
+    args = [QItem(types[0], "a"), QItem(types[2], "c"), QItem(types[3], "d")]
+    condition = SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("c", get_price))
+    if negative_index is not None:
+        args.insert(negative_index, NegationOperator(QItem(types[1], "b")))
+        condition = AndFormula(condition, GreaterThanFormula(IdentifierTerm("b", get_price),
+                                                             IdentifierTerm("a", get_price)))
+    return Pattern(SeqOperator(args), condition, window, consumption_policy)
+
+
+def get_parallel_matches(pattern: Pattern, events, parallel_execution_params, tree_structure=None):
+    if tree_structure is None:
+        tree_structure = TrivialLeftDeepTreeBuilder().create_tree_structure(pattern)
+    eval_mechanism = ParallelEvaluationMechanismFactory.build_parallel_eval_mechanism(
+        parallel_execution_params, lambda: TreeBasedEvaluationMechanism(pattern, tree_structure, None), pattern)
+    return get_eval_mechanism_matches(eval_mechanism, events)
+
+
+def get_async_matches(pattern: Pattern, events):
+    async def get_events():
+        for event in events:
+            yield event
+
+    async def collect_matches():
+        return [match async for match in CEP([pattern]).run_async(get_events())]
+
+    return sorted(describe_match(match.events) for match in asyncio.run(collect_matches()))
+
+
+class EvaluationEquivalenceTestCase(unittest.TestCase):
+    """
+    Compares the matches detected by an evaluation mechanism to the ones of the sequential tree-based evaluation on
+    small synthetic streams.
+    """
+    def assert_equivalent(self, pattern: Pattern, get_tested_matches: callable):
+        total_matches_num = 0
+        for seed in range(3):
+            events = create_events(seed, 60)
+            expected = get_matches(pattern, events)
+            total_matches_num += len(expected)
+            self.assertEqual(get_tested_matches(pattern, events), expected)
+        self.assertGreater(total_matches_num, 0)
+
+    def assert_equivalent_with_negation(self, get_tested_matches: callable, **pattern_args):
+        # the negated event may precede the match, occur within it or follow it
+        for negative_index in [None, 0, 1, 3]:
+            self.assert_equivalent(create_pattern(negative_index, **pattern_args), get_tested_matches)
+
+
+class TestTimeSlicedEvaluation(EvaluationEquivalenceTestCase):
+    def test_negation(self):
+        # the slices are much shorter than the time window, such that the blocking events of a match are often located
+        # in other slices
+        self.assert_equivalent_with_negation(
+            lambda pattern, events: get_parallel_matches(pattern, events, TimeSlicedExecutionParameters(2, 12)))
+
+    def test_consumption_policy(self):
+        # the default policy reports all the matches, as the sequential evaluation does
+        self.assert_equivalent(create_pattern(1, consumption_policy=ConsumptionPolicy()),
+                               lambda pattern, events: get_parallel_matches(pattern, events,
+                                                                            TimeSlicedExecutionParameters(2, 4)))
+
+
+class TestOperatorParallelEvaluation(EvaluationEquivalenceTestCase):
+    def test_negation(self):
+        for parallel_depth in [1, 2]:
+            self.assert_equivalent_with_negation(
+                lambda pattern, events: get_parallel_matches(
+                    pattern, events, OperatorParallelExecutionParameters(parallel_depth, batch_size=7)))
+
+    def test_nested_negation(self):
+        # the partial matches of the nested sequence are held by a negation node evaluated by a worker
+        structure = SeqOperator([QItem("AAPL", "a"), SeqOperator([QItem("GOOG", "b"),
+                                                                  NegationOperator(QItem("MSFT", "c"))]),
+                                 QItem("AMZN", "d")])
+        condition = AndFormula(SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("d", get_price)),
+                               GreaterThanFormula(IdentifierTerm("c", get_price), AtomicTerm(18)))
+        pattern = Pattern(structure, condition, timedelta(minutes=10))
+        for parallel_depth in [1, 2]:
+            for tree_structure in [((0, 1), 2), (0, (1, 2))]:
+                self.assert_equivalent(pattern, lambda pattern, events: get_parallel_matches(
+                    pattern, events, OperatorParallelExecutionParameters(parallel_depth, batch_size=7),
+                    tree_structure))
+
+    def test_bushy_tree(self):
+        pattern = create_pattern(1)
+        self.assert_equivalent(pattern, lambda pattern, events: get_parallel_matches(
+            pattern, events, OperatorParallelExecutionParameters(1, batch_size=7), ((0, 1), (2, 3))))
+
+    def test_consumption_policy(self):
+        self.assert_equivalent(create_pattern(3, consumption_policy=ConsumptionPolicy()),
+                               lambda pattern, events: get_parallel_matches(
+                                   pattern, events, OperatorParallelExecutionParameters(1, batch_size=7)))
+
+
+class TestAsyncEvaluation(EvaluationEquivalenceTestCase):
+    def test_negation(self):
+        self.assert_equivalent_with_negation(get_async_matches)
+
+    def test_consumption_policy(self):
+        # unlike the distributed modes, the asynchronous evaluation supports all the policies
+        pattern = create_pattern(1, consumption_policy=ConsumptionPolicy(SelectionStrategies.MATCH_SINGLE))
+        self.assert_equivalent(pattern, get_async_matches)
+
+    def test_parallel_execution(self):
+        # the events are evaluated in the calling thread rather than shipped to worker processes
+        for params in [KeyPartitionedExecutionParameters(lambda x: x["Stock Ticker"], 2),
+                       TimeSlicedExecutionParameters(2), OperatorParallelExecutionParameters()]:
+            cep = CEP([create_pattern()], parallel_execution_params=params)
+            self.assertRaises(Exception, cep.run_async, [])
+
+
+class TestKeyPartitionedEvaluation(EvaluationEquivalenceTestCase):
+    def test_negation(self):
+        # all the events of the pattern belong to the same partition
+        params = KeyPartitionedExecutionParameters(lambda x: x["Stock Ticker"] != "AMZN", 2, batch_size=5)
+        self.assert_equivalent_with_negation(lambda pattern, events: get_parallel_matches(pattern, events, params),
+                                             types=("AAPL", "GOOG", "MSFT", "AAPL"))
+
+    def test_consumption_policy(self):
+        params = KeyPartitionedExecutionParameters(lambda x: x["Stock Ticker"] != "AMZN", 2, batch_size=5)
+        self.assert_equivalent(create_pattern(1, consumption_policy=ConsumptionPolicy(),
+                                              types=("AAPL", "GOOG", "MSFT", "AAPL")),
+                               lambda pattern, events: get_parallel_matches(pattern, events, params))
+
+    def test_bounded_input_queues(self):
+        # every event is shipped separately and a single batch may be queued for each worker, such that the workers
+        # are repeatedly waited for
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), QItem("AAPL", "b")]),
+                          SmallerThanFormula(IdentifierTerm("a", get_price), IdentifierTerm("b", get_price)),
+                          timedelta(minutes=10))
+        tree_structure = TrivialLeftDeepTreeBuilder().create_tree_structure(pattern)
+        events = create_events(0, 60)
+        expected = get_matches(pattern, events)
+        self.assertGreater(len(expected), 0)
+        eval_mechanism = PartitionedEvaluationMechanism(
+            [TreeBasedEvaluationMechanism(pattern, tree_structure, None) for _ in range(2)],
+            lambda x: x["Stock Ticker"], batch_size=1, max_pending_batches=1)
+        self.assertEqual(get_eval_mechanism_matches(eval_mechanism, events), expected)
+
+
+class TestParallelEvaluationMechanismFactory(unittest.TestCase):
+    def test_unknown_mode(self):
+        pattern = create_pattern()
+        with self.assertRaisesRegex(Exception, "Unknown parallel execution mode"):
+            ParallelEvaluationMechanismFactory.build_parallel_eval_mechanism(
+                ParallelExecutionParameters(None, 2), lambda: TreeBasedEvaluationMechanism(pattern, ((0, 1), 2), None),
+                pattern)
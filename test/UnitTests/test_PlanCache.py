@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, IdentifierTerm
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, QItem
+from evaluation.BushyTreeBuilders import DynamicProgrammingBushyTreeBuilder
+from evaluation.EvaluationMechanismFactory import EvaluationMechanismFactory, EvaluationMechanismTypes
+from evaluation.PlanCache import PlanCache
+from misc.StatisticsTypes import StatisticsTypes
+
+
+class CountingTreeBuilder(DynamicProgrammingBushyTreeBuilder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def create_tree_structure(self, pattern: Pattern):
+        self.calls += 1
+        return super().create_tree_structure(pattern)
+
+
+def create_pattern(first_arrival_rate: float = 0.5, window: timedelta = timedelta(minutes=5)):
+    pattern = Pattern(
+        SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), QItem("MSFT", "c")]),
+        SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                           IdentifierTerm("b", lambda x: x["Peak Price"])),
+        window
+    )
+    selectivity_matrix = [[1.0, 0.1, 1.0], [0.1, 1.0, 1.0], [1.0, 1.0, 1.0]]
+    pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES,
+                           (selectivity_matrix, [first_arrival_rate, 0.2, 0.01]))
+    return pattern
+
+
+class TestPlanCache(unittest.TestCase):
+    def test_hits_and_quantization(self):
+        cache, builder = PlanCache(), CountingTreeBuilder()
+        tree_structure = cache.get_tree_structure(create_pattern(), builder, "dp")
+        self.assertEqual(cache.get_tree_structure(create_pattern(), builder, "dp"), tree_structure)
+        # a negligible change in the statistics
+        self.assertEqual(cache.get_tree_structure(create_pattern(0.50001), builder, "dp"), tree_structure)
+        self.assertEqual(builder.calls, 1)
+        self.assertEqual((cache.get_hits(), cache.get_misses()), (2, 1))
+        cache.get_tree_structure(create_pattern(0.6), builder, "dp")
+        cache.get_tree_structure(create_pattern(window=timedelta(minutes=6)), builder, "dp")
+        cache.get_tree_structure(create_pattern(), builder, "other builder")
+        self.assertEqual(builder.calls, 4)
+
+    def test_lru_eviction(self):
+        cache, builder = PlanCache(max_size=2), CountingTreeBuilder()
+        cache.get_tree_structure(create_pattern(0.1), builder, "dp")
+        cache.get_tree_structure(create_pattern(0.2), builder, "dp")
+        cache.get_tree_structure(create_pattern(0.1), builder, "dp")
+        cache.get_tree_structure(create_pattern(0.3), builder, "dp")
+        self.assertEqual(len(cache), 2)
+        cache.get_tree_structure(create_pattern(0.1), builder, "dp")
+        self.assertEqual(builder.calls, 3)
+        cache.get_tree_structure(create_pattern(0.2), builder, "dp")
+        self.assertEqual(builder.calls, 4)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "plans.json")
+            tree_structure = PlanCache(persistence_path=path).get_tree_structure(create_pattern(),
+                                                                                 CountingTreeBuilder(), "dp")
+            builder = CountingTreeBuilder()
+            self.assertEqual(PlanCache(persistence_path=path).get_tree_structure(create_pattern(), builder, "dp"),
+                             tree_structure)
+            self.assertEqual(builder.calls, 0)
+
+    def test_factory(self):
+        cache = PlanCache()
+        EvaluationMechanismFactory.set_plan_cache(cache)
+        try:
+            for _ in range(2):
+                EvaluationMechanismFactory.build_single_pattern_eval_mechanism(
+                    EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_BUSHY_TREE, None, create_pattern(), None)
+        finally:
+            EvaluationMechanismFactory.set_plan_cache(None)
+        self.assertEqual((cache.get_hits(), cache.get_misses()), (1, 1))
@@ -0,0 +1,75 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import GreaterThanFormula, SmallerThanFormula, IdentifierTerm, AtomicTerm, AndFormula, TrueFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, QItem, NegationOperator
+from evaluation.TreeBasedEvaluationMechanism import TreeBasedEvaluationMechanism
+from UnitTestsUtils import create_events, get_matches, get_expected_matches
+
+
+class CountingGetter:
+    """
+    An attribute getter counting its invocations.
+    """
+    def __init__(self):
+        self.calls_num = 0
+
+    def __call__(self, x):
+        self.calls_num += 1
+        return x["Peak Price"]
+
+
+def create_condition(getter: callable):
+    return AndFormula(AndFormula(GreaterThanFormula(IdentifierTerm("a", getter), AtomicTerm(5)),
+                                 SmallerThanFormula(IdentifierTerm("a", getter), IdentifierTerm("b", getter))),
+                      SmallerThanFormula(IdentifierTerm("b", getter), IdentifierTerm("c", getter)))
+
+
+class TestPredicatePushdown(unittest.TestCase):
+    def setUp(self):
+        self.window = timedelta(minutes=12)
+        self.structure = SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), QItem("MSFT", "c")])
+
+    def test_conditions_placement(self):
+        getter = CountingGetter()
+        pattern = Pattern(self.structure, create_condition(getter), self.window)
+        tree = TreeBasedEvaluationMechanism(pattern, ((0, 1), 2), None).get_tree()
+        root = tree.get_subtrees_at_depth(0)[0]
+        join_node, leaf_c = tree.get_subtrees_at_depth(1)
+        leaf_a, leaf_b = tree.get_subtrees_at_depth(2)[:2]
+        # each atomic condition is assigned to the lowest node containing all of its events
+        self.assertEqual(repr(root._condition), "b < c")
+        self.assertEqual(repr(join_node._condition), "a < b")
+        self.assertEqual(repr(leaf_a._condition), "a > 5")
+        self.assertIsInstance(leaf_b._condition, TrueFormula)
+        self.assertIsInstance(leaf_c._condition, TrueFormula)
+
+    def test_conditions_evaluated_once(self):
+        getter = CountingGetter()
+        pattern = Pattern(self.structure, create_condition(getter), self.window)
+        eval_mechanism = TreeBasedEvaluationMechanism(pattern, ((0, 1), 2), None)
+        events = [event for event in create_events(0, tickers=("AAPL", "GOOG", "MSFT", "AMZN", "IBM"))
+                  if event.event_type in ("AAPL", "GOOG")]
+        for event in events:
+            eval_mechanism.handle_event(event)
+        # the price of each AAPL event is extracted by "a > 5", and the price of each GOOG event with an accepted AAPL
+        # event before it is extracted by "a < b" - once per event, as the extracted values are memoized
+        aapl_events = [event for event in events if event.event_type == "AAPL"]
+        accepted_aapl_events = [event for event in aapl_events if event.payload["Peak Price"] > 5]
+        joined_goog_events = [b for b in events if b.event_type == "GOOG" and
+                              any(a.timestamp <= b.timestamp <= a.timestamp + self.window for a in accepted_aapl_events)]
+        self.assertGreater(len(joined_goog_events), 0)
+        self.assertEqual(getter.calls_num, len(aapl_events) + len(joined_goog_events))
+
+    def test_matches(self):
+        structure = SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), NegationOperator(QItem("IBM", "x")),
+                                 QItem("MSFT", "c")])
+        condition = AndFormula(create_condition(lambda x: x["Peak Price"]),
+                               SmallerThanFormula(IdentifierTerm("x", lambda x: x["Peak Price"]), AtomicTerm(10)))
+        pattern = Pattern(structure, condition, self.window)
+        for seed in range(3):
+            events = create_events(seed, tickers=("AAPL", "GOOG", "MSFT", "AMZN", "IBM"))
+            expected = get_expected_matches(pattern, events)
+            for tree_structure in [((0, 1), 3), (0, (1, 3)), ((3, 1), 0)]:
+                self.assertEqual(get_matches(pattern, events, tree_structure), expected)
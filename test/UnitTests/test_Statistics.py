@@ -0,0 +1,176 @@
+import unittest
+from datetime import timedelta
+from random import Random
+
+from base.Formula import SmallerThanFormula, GreaterThanFormula, IdentifierTerm, AtomicTerm, MulTerm, DivTerm, \
+    AndFormula
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, AndOperator, NegationOperator, KleeneClosureOperator, QItem
+from misc.Statistics import get_condition_selectivity, estimate_condition_selectivity, get_sample_size, \
+    estimate_selectivity_matrix, calculate_selectivity_matrix, calculate_statistics, get_arrival_rates
+from misc.VectorizedSelectivity import get_vectorized_selectivity, is_vectorization_available
+from UnitTestsUtils import create_event, create_stream
+
+
+class TestSelectivityEstimation(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b = QItem("AAPL", "a"), QItem("GOOG", "b")
+        self.formula = SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                          IdentifierTerm("b", lambda x: x["Peak Price"]))
+        self.events = []
+        for minute in range(60):
+            self.events.append(create_event("AAPL", minute, minute))
+            self.events.append(create_event("GOOG", minute, 30))
+
+    def test_sample_size(self):
+        self.assertEqual(get_sample_size(0.95, 0.05), 385)
+        self.assertGreater(get_sample_size(0.99, 0.05), get_sample_size(0.95, 0.05))
+        self.assertGreater(get_sample_size(0.95, 0.01), get_sample_size(0.95, 0.05))
+
+    def test_exact_when_sample_covers_all_pairs(self):
+        exact = get_condition_selectivity(self.a, self.b, self.formula, create_stream(self.events), True)
+        estimated = estimate_condition_selectivity(self.a, self.b, self.formula, create_stream(self.events), True,
+                                                   sample_size=60 * 60, random_generator=Random(0))
+        self.assertAlmostEqual(exact, estimated)
+
+    def test_estimate_within_error(self):
+        exact = get_condition_selectivity(self.a, self.b, self.formula, create_stream(self.events), False)
+        estimated = estimate_condition_selectivity(self.a, self.b, self.formula, create_stream(self.events), False,
+                                                   confidence=0.99, error=0.05, random_generator=Random(0))
+        self.assertAlmostEqual(exact, estimated, delta=0.05)
+
+    def test_window_aware_estimate(self):
+        events = [create_event("AAPL", 0, 1), create_event("AAPL", 10, 100), create_event("GOOG", 11, 50)]
+        self.assertEqual(estimate_condition_selectivity(self.a, self.b, self.formula, create_stream(events), True,
+                                                        sample_size=10), 0.5)
+        # only the second AAPL event is within the window of the GOOG event
+        self.assertEqual(estimate_condition_selectivity(self.a, self.b, self.formula, create_stream(events), True,
+                                                        sample_size=10, window=timedelta(minutes=5)), 0.0)
+
+    def test_estimate_selectivity_matrix(self):
+        pattern = Pattern(AndOperator([self.a, self.b]), self.formula, timedelta(minutes=5))
+        stream = create_stream(self.events)
+        exact = calculate_selectivity_matrix(pattern, stream)
+        estimated = estimate_selectivity_matrix(pattern, stream, sample_size=100000, seed=0)
+        self.assertEqual(exact, estimated)
+        self.assertEqual(estimated[0][0], 1.0)
+
+
+@unittest.skipUnless(is_vectorization_available(), "NumPy is not installed")
+class TestVectorizedSelectivity(unittest.TestCase):
+    def setUp(self):
+        self.events = [create_event("AAPL" if minute % 3 else "GOOG", minute, (minute * 7) % 11)
+                       for minute in range(60)]
+        self.a, self.b = QItem("AAPL", "a"), QItem("GOOG", "b")
+        self.formula = AndFormula(
+            SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                               MulTerm(IdentifierTerm("b", lambda x: x["Peak Price"]), AtomicTerm(2))),
+            GreaterThanFormula(IdentifierTerm("a", lambda x: x["Opening Price"]), AtomicTerm(2)))
+
+    def __assert_same_selectivity(self, arg1, arg2, formula, is_sequence):
+        events1 = [event for event in self.events if event.event_type == arg1.event_type]
+        events2 = events1 if arg1.event_type == arg2.event_type else \
+            [event for event in self.events if event.event_type == arg2.event_type]
+        expected = get_condition_selectivity(arg1, arg2, formula, create_stream(self.events), is_sequence,
+                                             vectorized=False)
+        for max_chunk_size in [1, 7, 1000]:
+            self.assertEqual(get_vectorized_selectivity(arg1, arg2, formula, events1, events2, is_sequence,
+                                                        max_chunk_size), expected)
+
+    def test_argument_pair(self):
+        self.__assert_same_selectivity(self.a, self.b, self.formula, False)
+        self.__assert_same_selectivity(self.a, self.b, self.formula, True)
+
+    def test_same_event_type(self):
+        formula = SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                     IdentifierTerm("c", lambda x: x["Peak Price"]))
+        self.__assert_same_selectivity(self.a, QItem("AAPL", "c"), formula, True)
+        self.__assert_same_selectivity(self.a, QItem("AAPL", "c"), formula, False)
+
+    def test_single_argument(self):
+        formula = GreaterThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), AtomicTerm(4))
+        self.__assert_same_selectivity(self.a, self.a, formula, False)
+
+    def test_fallback(self):
+        # a division by zero is left for the pure Python evaluation
+        formula = SmallerThanFormula(DivTerm(AtomicTerm(1), IdentifierTerm("a", lambda x: x["Peak Price"])),
+                                     IdentifierTerm("b", lambda x: x["Peak Price"]))
+        events = [create_event("AAPL", 0, 0), create_event("GOOG", 1, 1)]
+        self.assertIsNone(get_vectorized_selectivity(self.a, self.b, formula, events[:1], events[1:], True))
+        formula = SmallerThanFormula(IdentifierTerm("a", lambda x: x["Stock Ticker"]),
+                                     IdentifierTerm("b", lambda x: x["Stock Ticker"]))
+        self.assertIsNone(get_vectorized_selectivity(self.a, self.b, formula, events[:1], events[1:], True))
+
+
+class TestStatisticsCalculation(unittest.TestCase):
+    def test_single_pass_statistics(self):
+        pattern = Pattern(
+            SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b"), QItem("AAPL", "c")]),
+            AndFormula(SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                          IdentifierTerm("b", lambda x: x["Peak Price"])),
+                       SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]),
+                                          IdentifierTerm("c", lambda x: x["Peak Price"]))),
+            timedelta(minutes=5)
+        )
+        stream = create_stream([create_event("AAPL", 0, 1), create_event("GOOG", 1, 2), create_event("AAPL", 2, 3),
+                                create_event("MSFT", 3, 0), create_event("AAPL", 4, 1)])
+        selectivity_matrix, arrival_rates = calculate_statistics(pattern, stream, vectorized=False)
+        self.assertEqual(selectivity_matrix, calculate_selectivity_matrix(pattern, stream, vectorized=False))
+        self.assertEqual(arrival_rates, get_arrival_rates(pattern, stream))
+        self.assertEqual(arrival_rates, [3 / 240, 1 / 240, 3 / 240])
+        # a-b: only the first AAPL event precedes the GOOG event, b-c: one of the two following AAPL events is higher
+        self.assertEqual(selectivity_matrix[0][1], 1.0)
+        self.assertEqual(selectivity_matrix[1][2], 0.5)
+        # a-c: no condition
+        self.assertEqual(selectivity_matrix[0][2], 1.0)
+        # the stream is not consumed
+        self.assertEqual(stream.count(), 6)
+
+    def test_empty_time_interval(self):
+        # arrival rates cannot be measured over a stream whose events all occur at the same time, or over an empty one
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b")]), None, timedelta(minutes=5))
+        for events in [[create_event("AAPL", 0, 1), create_event("GOOG", 0, 2)], []]:
+            stream = create_stream(events)
+            self.assertEqual(get_arrival_rates(pattern, stream), [0.0, 0.0])
+            self.assertEqual(calculate_statistics(pattern, stream)[1], [0.0, 0.0])
+
+    def test_negated_events(self):
+        # the statistics of a negated argument are those of the event it negates
+        pattern = Pattern(
+            SeqOperator([QItem("AAPL", "a"), NegationOperator(QItem("MSFT", "x")), QItem("GOOG", "b")]),
+            SmallerThanFormula(IdentifierTerm("x", lambda x: x["Peak Price"]),
+                               IdentifierTerm("b", lambda x: x["Peak Price"])),
+            timedelta(minutes=5)
+        )
+        stream = create_stream([create_event("AAPL", 0, 1), create_event("MSFT", 1, 3), create_event("GOOG", 2, 2),
+                                create_event("MSFT", 3, 1), create_event("GOOG", 4, 2)])
+        selectivity_matrix, arrival_rates = calculate_statistics(pattern, stream, vectorized=False)
+        self.assertEqual(arrival_rates, [1 / 240, 2 / 240, 2 / 240])
+        # x-b: only the second MSFT event is cheaper than a GOOG event following it
+        self.assertAlmostEqual(selectivity_matrix[1][2], 1 / 3)
+        self.assertEqual(selectivity_matrix[0][1], 1.0)
+
+    def test_kleene_closure(self):
+        # the statistics of a Kleene closure are those of its event, and the conditions on the closure are ignored
+        pattern = Pattern(
+            SeqOperator([QItem("AAPL", "a"), KleeneClosureOperator(QItem("GOOG", "b")), QItem("MSFT", "c")]),
+            AndFormula(SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                          IdentifierTerm("b", lambda x: x[0]["Peak Price"])),
+                       SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                          IdentifierTerm("c", lambda x: x["Peak Price"]))),
+            timedelta(minutes=5)
+        )
+        stream = create_stream([create_event("AAPL", 0, 2), create_event("GOOG", 1, 3), create_event("MSFT", 2, 1),
+                                create_event("GOOG", 3, 1), create_event("MSFT", 4, 3)])
+        selectivity_matrix, arrival_rates = calculate_statistics(pattern, stream, vectorized=False)
+        self.assertEqual(arrival_rates, [1 / 240, 2 / 240, 2 / 240])
+        self.assertEqual(selectivity_matrix[0][1], 1.0)
+        self.assertEqual(selectivity_matrix[0][2], 0.5)
+
+    def test_unsupported_nested_operators(self):
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), AndOperator([QItem("GOOG", "b"), QItem("MSFT", "c")])]),
+                          SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                             IdentifierTerm("b", lambda x: x["Peak Price"])),
+                          timedelta(minutes=5))
+        stream = create_stream([create_event("AAPL", 0, 1), create_event("GOOG", 1, 2)])
+        self.assertRaisesRegex(NotImplementedError, "nested operators", calculate_statistics, pattern, stream)
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, IdentifierTerm
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, QItem
+from misc.StatisticsCatalog import StatisticsCatalog, get_condition_fingerprint
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import create_event, create_stream
+
+
+def create_pattern(attribute: str = "Peak Price"):
+    return Pattern(
+        SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b")]),
+        SmallerThanFormula(IdentifierTerm("a", lambda x: x[attribute]), IdentifierTerm("b", lambda x: x[attribute])),
+        timedelta(minutes=5)
+    )
+
+
+def create_events():
+    return [create_event(ticker, minute, price)
+            for minute, ticker, price in [(0, "AAPL", 1), (1, "GOOG", 2), (2, "AAPL", 3), (3, "GOOG", 2)]]
+
+
+class TestStatisticsCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.catalog_path = os.path.join(self.directory.name, "statistics.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_fingerprint(self):
+        self.assertEqual(get_condition_fingerprint(create_pattern().condition),
+                         get_condition_fingerprint(create_pattern().condition))
+        self.assertNotEqual(get_condition_fingerprint(create_pattern().condition),
+                            get_condition_fingerprint(create_pattern("Opening Price").condition))
+
+    def test_calculate_store_and_reload(self):
+        pattern = create_pattern()
+        StatisticsCatalog(self.catalog_path).get_statistics(pattern, "test", create_stream(create_events()))
+        self.assertEqual(pattern.statistics_type, StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES)
+
+        reloaded_pattern = create_pattern()
+        catalog = StatisticsCatalog(self.catalog_path)
+        self.assertTrue(catalog.load_statistics(reloaded_pattern, "test"))
+        self.assertEqual(reloaded_pattern.statistics_type, StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES)
+        self.assertEqual(list(reloaded_pattern.statistics), list(pattern.statistics))
+
+    def test_key(self):
+        catalog = StatisticsCatalog(self.catalog_path)
+        catalog.store_statistics(create_pattern(), "test", ([[1.0, 0.5], [0.5, 1.0]], [0.1, 0.2]))
+        self.assertFalse(catalog.load_statistics(create_pattern(), "other dataset"))
+        self.assertFalse(catalog.load_statistics(create_pattern("Opening Price"), "test"))
+        self.assertTrue(catalog.load_statistics(create_pattern(), "test"))
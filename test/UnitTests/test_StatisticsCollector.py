@@ -0,0 +1,88 @@
+import unittest
+from datetime import timedelta
+
+from base.Formula import SmallerThanFormula, IdentifierTerm
+from base.Pattern import Pattern
+from base.PatternStructure import SeqOperator, NegationOperator, KleeneClosureOperator, QItem
+from misc.StatisticsCollector import StatisticsCollector
+from misc.StatisticsTypes import StatisticsTypes
+from UnitTestsUtils import create_event
+
+
+class TestStatisticsCollector(unittest.TestCase):
+    def setUp(self):
+        self.pattern = Pattern(
+            SeqOperator([QItem("AAPL", "a"), QItem("GOOG", "b")]),
+            SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                               IdentifierTerm("b", lambda x: x["Peak Price"])),
+            timedelta(minutes=5)
+        )
+
+    def test_arrival_rates(self):
+        collector = StatisticsCollector(self.pattern, timedelta(minutes=10), decay_factor=0)
+        for minute in range(10):
+            collector.handle_event(create_event("AAPL", minute, 1))
+            if minute % 2 == 0:
+                collector.handle_event(create_event("GOOG", minute, 2))
+        _, arrival_rates = collector.get_statistics()
+        self.assertAlmostEqual(arrival_rates[0], 10 / 540)
+        self.assertAlmostEqual(arrival_rates[1], 5 / 540)
+
+    def test_selectivity(self):
+        collector = StatisticsCollector(self.pattern, timedelta(minutes=10), decay_factor=0)
+        collector.handle_event(create_event("AAPL", 0, 1))
+        collector.handle_event(create_event("AAPL", 1, 3))
+        collector.handle_event(create_event("GOOG", 2, 2))
+        selectivity_matrix, _ = collector.get_statistics()
+        self.assertEqual(selectivity_matrix[0][1], 0.5)
+        self.assertEqual(selectivity_matrix[1][0], 0.5)
+        self.assertEqual(selectivity_matrix[0][0], 1.0)
+
+    def test_sliding_window_and_decay(self):
+        collector = StatisticsCollector(self.pattern, timedelta(minutes=2), decay_factor=0.5)
+        collector.handle_event(create_event("AAPL", 0, 1))
+        collector.handle_event(create_event("GOOG", 1, 2))
+        selectivity_matrix, _ = collector.get_statistics()
+        self.assertEqual(selectivity_matrix[0][1], 1.0)
+        # the first events expire, and the new pair does not satisfy the condition
+        collector.handle_event(create_event("AAPL", 10, 3))
+        collector.handle_event(create_event("GOOG", 11, 2))
+        selectivity_matrix, _ = collector.get_statistics()
+        self.assertEqual(selectivity_matrix[0][1], 0.5)
+
+    def test_apply_statistics(self):
+        collector = StatisticsCollector(self.pattern, timedelta(minutes=10))
+        collector.handle_event(create_event("AAPL", 0, 1))
+        collector.apply_statistics(self.pattern)
+        self.assertEqual(self.pattern.statistics_type, StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES)
+        self.assertEqual(len(self.pattern.statistics[0]), 2)
+        self.assertEqual(len(self.pattern.statistics[1]), 2)
+
+    def test_negated_events(self):
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), NegationOperator(QItem("MSFT", "x")), QItem("GOOG", "b")]),
+                          self.pattern.condition, self.pattern.window)
+        collector = StatisticsCollector(pattern, timedelta(minutes=10), decay_factor=0)
+        for minute in range(10):
+            collector.handle_event(create_event("MSFT" if minute % 2 == 0 else "AAPL", minute, 1))
+        _, arrival_rates = collector.get_statistics()
+        self.assertAlmostEqual(arrival_rates[0], 5 / 540)
+        self.assertAlmostEqual(arrival_rates[1], 5 / 540)
+        self.assertEqual(arrival_rates[2], 0.0)
+
+    def test_kleene_closure(self):
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), KleeneClosureOperator(QItem("GOOG", "b"))]),
+                          SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]),
+                                             IdentifierTerm("b", lambda x: x[0]["Peak Price"])),
+                          self.pattern.window)
+        collector = StatisticsCollector(pattern, timedelta(minutes=10), decay_factor=0)
+        collector.handle_event(create_event("AAPL", 0, 3))
+        collector.handle_event(create_event("GOOG", 1, 2))
+        selectivity_matrix, arrival_rates = collector.get_statistics()
+        self.assertEqual(selectivity_matrix, [[1.0, 1.0], [1.0, 1.0]])
+        self.assertEqual(arrival_rates, [1 / 60, 1 / 60])
+
+    def test_unsupported_nested_operators(self):
+        pattern = Pattern(SeqOperator([QItem("AAPL", "a"), SeqOperator([QItem("GOOG", "b"), QItem("MSFT", "c")])]),
+                          self.pattern.condition, self.pattern.window)
+        self.assertRaisesRegex(NotImplementedError, "nested operators", StatisticsCollector, pattern,
+                               timedelta(minutes=10))
@@ -0,0 +1,39 @@
+import unittest
+from itertools import permutations
+
+from evaluation.BushyTreeBuilders import DynamicProgrammingBushyTreeBuilder
+from evaluation.LeftDeepTreeBuilders import DynamicProgrammingLeftDeepTreeBuilder
+from misc.Statistics import calculate_left_deep_tree_cost_function, calculate_bushy_tree_cost_function
+from UnitTestsUtils import create_random_statistics, get_all_trees
+
+
+def get_leaves(tree):
+    return [tree] if type(tree) == int else get_leaves(tree[0]) + get_leaves(tree[1])
+
+
+class TestDynamicProgrammingTreeBuilders(unittest.TestCase):
+    def test_left_deep_order_is_optimal(self):
+        window = 60
+        for args_num in range(1, 7):
+            for seed in range(5):
+                selectivity_matrix, arrival_rates = create_random_statistics(args_num, seed)
+                order = DynamicProgrammingLeftDeepTreeBuilder.find_order(selectivity_matrix, arrival_rates, window)
+                self.assertEqual(sorted(order), list(range(args_num)))
+                optimal_cost = min(calculate_left_deep_tree_cost_function(list(p), selectivity_matrix, arrival_rates,
+                                                                          window)
+                                   for p in permutations(range(args_num)))
+                self.assertAlmostEqual(calculate_left_deep_tree_cost_function(order, selectivity_matrix,
+                                                                              arrival_rates, window), optimal_cost)
+
+    def test_bushy_tree_is_optimal(self):
+        window = 60
+        for args_num in range(1, 6):
+            all_trees = get_all_trees(tuple(range(args_num)))
+            for seed in range(5):
+                selectivity_matrix, arrival_rates = create_random_statistics(args_num, seed)
+                tree = DynamicProgrammingBushyTreeBuilder._find_tree(selectivity_matrix, arrival_rates, window)
+                self.assertEqual(sorted(get_leaves(tree)), list(range(args_num)))
+                optimal_cost = min(calculate_bushy_tree_cost_function(t, selectivity_matrix, arrival_rates, window)
+                                   for t in all_trees)
+                self.assertAlmostEqual(calculate_bushy_tree_cost_function(tree, selectivity_matrix, arrival_rates,
+                                                                          window), optimal_cost)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from CEP import CEP
 from evaluation.EvaluationMechanismFactory import EvaluationMechanismTypes, \
     IterativeImprovementEvaluationMechanismParameters
@@ -7,11 +8,17 @@ from misc.Stocks import MetastockDataFormatter
 from misc.Utils import generate_matches
 from evaluation.LeftDeepTreeBuilders import *
 from evaluation.BushyTreeBuilders import *
-from datetime import timedelta
+from datetime import timedelta, datetime
 from base.Formula import GreaterThanFormula, SmallerThanFormula, SmallerThanEqFormula, GreaterThanEqFormula, MulTerm, EqFormula, IdentifierTerm, AtomicTerm, AndFormula, TrueFormula
 from base.PatternStructure import AndOperator, SeqOperator, QItem
 from base.Pattern import Pattern
 from evaluation.Storage import TreeStorageParameters
+from evaluation.ParallelEvaluationMechanismFactory import KeyPartitionedExecutionParameters, \
+    TimeSlicedExecutionParameters, OperatorParallelExecutionParameters
+from evaluation.AdaptiveEvaluationMechanism import AdaptiveEvaluationParameters
+from evaluation.IterativeImprovement import IterativeImprovementType, IterativeImprovementAlgorithmBuilder
+from misc.Statistics import calculate_left_deep_tree_cost_function
+import random
 
 nasdaqEventStreamShort = file_input("test/EventFiles/NASDAQ_SHORT.txt", MetastockDataFormatter())
 nasdaqEventStreamMedium = file_input("test/EventFiles/NASDAQ_MEDIUM.txt", MetastockDataFormatter())
@@ -78,6 +85,9 @@ def runTest(
     eval_mechanism_params=None,
     events=None,
     storage_params=None,
+    parallel_execution_params=None,
+    expected_test_name=None,
+    adaptive_params=None,
 ):
     if createTestFile:
         createTest(testName, patterns, events)
@@ -85,11 +95,14 @@ def runTest(
         events = nasdaqEventStream.duplicate()
     else:
         events = events.duplicate()
-    cep = CEP(patterns, eval_mechanism_type, eval_mechanism_params, storage_params=storage_params)
+    if expected_test_name is None:
+        expected_test_name = testName
+    cep = CEP(patterns, eval_mechanism_type, eval_mechanism_params, storage_params=storage_params,
+              parallel_execution_params=parallel_execution_params, adaptive_params=adaptive_params)
     running_time = cep.run(events)
     matches = cep.get_pattern_match_stream()
     file_output(matches, '%sMatches.txt' % testName)
-    expected_matches_path = "test/TestsExpected/%sMatches.txt" % testName
+    expected_matches_path = "test/TestsExpected/%sMatches.txt" % expected_test_name
     actual_matches_path = "test/Matches/%sMatches.txt" % testName
     print("Test %s result: %s, Time Passed: %s" % (testName,
           "Succeeded" if fileCompare(actual_matches_path, expected_matches_path) else "Failed", running_time))
@@ -663,6 +676,203 @@ def sortedStorageBenchMarkTest(createTestFile=False):
     runBenchMark("sortedStorageBenchMark - sorted storage", [pattern], storage_params=storage_params)
 
 
+def keyPartitionedPatternSearchTest(createTestFile=False):
+    """
+    The pattern of googleAscendPatternSearchTest and amazonInstablePatternSearchTest evaluated in parallel by worker
+    processes partitioned by stock ticker. The matches must be identical to the ones of the sequential evaluation.
+    """
+    googleAscendPattern = Pattern(
+        SeqOperator([QItem("GOOG", "a"), QItem("GOOG", "b"), QItem("GOOG", "c")]),
+        AndFormula(
+            SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+            SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+        ),
+        timedelta(minutes=3),
+    )
+    parallel_execution_params = KeyPartitionedExecutionParameters(lambda x: x["Stock Ticker"], workers_num=3,
+                                                                  batch_size=100)
+    runTest('keyPartitionedGoogleAscend', [googleAscendPattern], createTestFile,
+            parallel_execution_params=parallel_execution_params, expected_test_name='googleAscend')
+
+    amazonInstablePattern = Pattern(
+        SeqOperator([QItem("AMZN", "x1"), QItem("AMZN", "x2"), QItem("AMZN", "x3")]),
+        AndFormula(
+            SmallerThanEqFormula(IdentifierTerm("x1", lambda x: x["Lowest Price"]), AtomicTerm(75)),
+            AndFormula(
+                GreaterThanEqFormula(IdentifierTerm("x2", lambda x: x["Peak Price"]), AtomicTerm(78)),
+                SmallerThanEqFormula(IdentifierTerm("x3", lambda x: x["Lowest Price"]), IdentifierTerm("x1", lambda x: x["Lowest Price"]))
+            )
+        ),
+        timedelta(days=1)
+    )
+    runTest('keyPartitionedAmazonInstable', [amazonInstablePattern], createTestFile,
+            parallel_execution_params=parallel_execution_params, expected_test_name='amazonInstable')
+
+
+def timeSlicedPatternSearchTest(createTestFile=False):
+    """
+    The pattern of msftDrivRacePatternSearchTest evaluated in parallel over time slices of the input stream.
+    The matches must be identical to the ones of the sequential evaluation.
+    """
+    msftDrivRacePattern = Pattern(
+        SeqOperator([QItem("MSFT", "a"), QItem("DRIV", "b"), QItem("MSFT", "c"), QItem("DRIV", "d"), QItem("MSFT", "e")]),
+        AndFormula(
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+            ),
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("c", lambda x: x["Peak Price"]), IdentifierTerm("d", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("d", lambda x: x["Peak Price"]), IdentifierTerm("e", lambda x: x["Peak Price"]))
+            )
+        ),
+        timedelta(minutes=10)
+    )
+    runTest('timeSlicedMsftDrivRace', [msftDrivRacePattern], createTestFile,
+            parallel_execution_params=TimeSlicedExecutionParameters(workers_num=2, slices_num=7),
+            expected_test_name='msftDrivRace')
+
+
+def operatorParallelPatternSearchTest(createTestFile=False):
+    """
+    The pattern of dpBPatternSearchTest evaluated by a bushy tree whose subtrees are placed in separate worker processes.
+    The matches must be identical to the ones of the sequential evaluation.
+    """
+    pattern = Pattern(
+        SeqOperator([QItem("MSFT", "a"), QItem("DRIV", "b"), QItem("ORLY", "c"), QItem("CBRL", "d")]),
+        AndFormula(
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+            ),
+            SmallerThanFormula(IdentifierTerm("c", lambda x: x["Peak Price"]), IdentifierTerm("d", lambda x: x["Peak Price"]))
+        ),
+        timedelta(minutes=3)
+    )
+    selectivityMatrix = [[1.0, 0.9457796098355941, 1.0, 1.0], [0.9457796098355941, 1.0, 0.15989723367389616, 1.0], [1.0, 0.15989723367389616, 1.0, 0.9992557393942864], [1.0, 1.0, 0.9992557393942864, 1.0]]
+    arrivalRates = [0.016597077244258872, 0.01454418928322895, 0.013917884481558803, 0.012421711899791231]
+    pattern.set_statistics(StatisticsTypes.SELECTIVITY_MATRIX_AND_ARRIVAL_RATES, (selectivityMatrix, arrivalRates))
+    runTest('operatorParallelDpB1', [pattern], createTestFile,
+            eval_mechanism_type=EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_BUSHY_TREE, events=nasdaqEventStream,
+            parallel_execution_params=OperatorParallelExecutionParameters(parallel_depth=1),
+            expected_test_name='dpB1')
+
+
+def asyncPatternSearchTest(createTestFile=False):
+    """
+    The pattern of googleAscendPatternSearchTest evaluated using the asynchronous API over an asynchronous event feed.
+    The matches must be identical to the ones of the blocking API.
+    """
+    googleAscendPattern = Pattern(
+        SeqOperator([QItem("GOOG", "a"), QItem("GOOG", "b"), QItem("GOOG", "c")]),
+        AndFormula(
+            SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+            SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+        ),
+        timedelta(minutes=3),
+    )
+    testName = "asyncGoogleAscend"
+    if createTestFile:
+        createTest(testName, [googleAscendPattern])
+
+    async def live_feed(events):
+        for event in events:
+            yield event
+
+    async def collect_matches(cep, events):
+        return [match async for match in cep.run_async(live_feed(events))]
+
+    cep = CEP([googleAscendPattern])
+    start = datetime.now()
+    matches = asyncio.run(collect_matches(cep, nasdaqEventStream.duplicate()))
+    running_time = (datetime.now() - start).total_seconds()
+    file_output(matches, '%sMatches.txt' % testName)
+    expected_matches_path = "test/TestsExpected/googleAscendMatches.txt"
+    actual_matches_path = "test/Matches/%sMatches.txt" % testName
+    print("Test %s result: %s, Time Passed: %s" % (testName,
+          "Succeeded" if fileCompare(actual_matches_path, expected_matches_path) else "Failed", running_time))
+    runTest.over_all_time += running_time
+    os.remove(actual_matches_path)
+
+
+def adaptivePatternSearchTest(createTestFile=False):
+    """
+    The pattern of dpLdPatternSearchTest evaluated without precalculated statistics. The evaluation tree is repeatedly
+    re-optimized according to the statistics collected during the evaluation, and the matches must be identical to the
+    ones detected using a fixed tree.
+    """
+    pattern = Pattern(
+        SeqOperator([QItem("MSFT", "a"), QItem("DRIV", "b"), QItem("ORLY", "c"), QItem("CBRL", "d")]),
+        AndFormula(
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+            ),
+            SmallerThanFormula(IdentifierTerm("c", lambda x: x["Peak Price"]), IdentifierTerm("d", lambda x: x["Peak Price"]))
+        ),
+        timedelta(minutes=3)
+    )
+    adaptive_params = AdaptiveEvaluationParameters(reoptimization_interval=timedelta(minutes=10),
+                                                   statistics_window=timedelta(minutes=30), gain_threshold=0)
+    runTest('adaptiveDpLd', [pattern], createTestFile,
+            eval_mechanism_type=EvaluationMechanismTypes.DYNAMIC_PROGRAMMING_LEFT_DEEP_TREE, events=nasdaqEventStream,
+            adaptive_params=adaptive_params, expected_test_name='dpLd1')
+
+
+def pipelinedIngestionBenchMark():
+    """
+    Compares the end-to-end wall time (file parsing and evaluation) on NASDAQ_MEDIUM between parsing the whole file
+    before the evaluation starts and parsing it by a pipelined ingestion thread concurrently with the evaluation.
+    """
+    pattern = Pattern(
+        SeqOperator([QItem("MSFT", "a"), QItem("DRIV", "b"), QItem("MSFT", "c"), QItem("DRIV", "d"), QItem("MSFT", "e")]),
+        AndFormula(
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("a", lambda x: x["Peak Price"]), IdentifierTerm("b", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("b", lambda x: x["Peak Price"]), IdentifierTerm("c", lambda x: x["Peak Price"]))
+            ),
+            AndFormula(
+                SmallerThanFormula(IdentifierTerm("c", lambda x: x["Peak Price"]), IdentifierTerm("d", lambda x: x["Peak Price"])),
+                SmallerThanFormula(IdentifierTerm("d", lambda x: x["Peak Price"]), IdentifierTerm("e", lambda x: x["Peak Price"]))
+            )
+        ),
+        timedelta(minutes=10)
+    )
+    for pipelined in [False, True]:
+        start = datetime.now()
+        events = file_input("test/EventFiles/NASDAQ_MEDIUM.txt", MetastockDataFormatter(), pipelined=pipelined)
+        cep = CEP([pattern])
+        cep.run(events)
+        running_time = (datetime.now() - start).total_seconds()
+        print("Bench Mark pipelinedIngestion - %s completed, Time Passed: %s" %
+              ("pipelined input" if pipelined else "sequential input", running_time))
+        runTest.over_all_time += running_time
+
+
+def localSearchBenchMark():
+    """
+    Compares the costs of the left-deep orders found by the local search algorithms with the optimal cost found by
+    the dynamic programming algorithm, on randomly generated statistics of 12 event types.
+    """
+    args_num, window, step_limit = 12, 600, 1000
+    random.seed(0)
+    selectivity_matrix = [[1.0 for _ in range(args_num)] for _ in range(args_num)]
+    for i in range(args_num):
+        for j in range(i):
+            selectivity_matrix[i][j] = selectivity_matrix[j][i] = random.uniform(0.01, 1.0)
+    arrival_rates = [random.uniform(0.001, 0.1) for _ in range(args_num)]
+    optimal_order = DynamicProgrammingLeftDeepTreeBuilder.find_order(selectivity_matrix, arrival_rates, window)
+    optimal_cost = calculate_left_deep_tree_cost_function(optimal_order, selectivity_matrix, arrival_rates, window)
+    for ii_type in IterativeImprovementType:
+        start = datetime.now()
+        order = IterativeImprovementAlgorithmBuilder.create_ii_algorithm(ii_type).execute(
+            step_limit, list(range(args_num)), selectivity_matrix, arrival_rates, window)
+        running_time = (datetime.now() - start).total_seconds()
+        cost = calculate_left_deep_tree_cost_function(order, selectivity_matrix, arrival_rates, window)
+        print("Bench Mark localSearch - %s completed, cost relative to optimum: %s, Time Passed: %s" %
+              (ii_type.name, cost / optimal_cost, running_time))
+
+
 # region Unit Tests
 from test.UnitTests.test_storage import run_storage_tests
 
@@ -707,12 +917,19 @@ dpLdPatternSearchTest()
 nonFrequencyTailoredPatternSearchTest()
 frequencyTailoredPatternSearchTest()
 sortedStorageTest()
+keyPartitionedPatternSearchTest()
+timeSlicedPatternSearchTest()
+operatorParallelPatternSearchTest()
+asyncPatternSearchTest()
+adaptivePatternSearchTest()
 
 # endregion
 
 # region - Bench Marks
 
 sortedStorageBenchMarkTest()
+pipelinedIngestionBenchMark()
+localSearchBenchMark()
 
 # endregion
 